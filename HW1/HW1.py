@@ -1,17 +1,26 @@
+import argparse
 import csv
-from bs4 import BeautifulSoup
+import threading
 import time
 import requests
-from random import randint
-from html.parser import HTMLParser
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from random import randint, uniform
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
 import json
+import os
+import sys
+from engines import ENGINES, get_engine
+from search_cache import MAX_BYTES, TTL, SearchCache, load_snapshot, save_snapshot, snapshots
 
 USER_AGENT = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/61.0.3163.100 Safari/537.36'}
 
-#DEFAULT SEARCH ENGINE DETAILS
-SEARCHING_URL = "https://www.duckduckgo.com/html/?q="
-SEARCH_SELECTOR = "a"
-SEARCH_ATTRS = {"class": "result__a"}
+#DEFAULT SEARCH ENGINE DETAILS (the other engines are in engines.py)
+ENGINE_NAME = "duckduckgo"
+SEARCHING_URL = ENGINES[ENGINE_NAME].search_url
+SEARCH_SELECTOR = ENGINES[ENGINE_NAME].selector
+SEARCH_ATTRS = ENGINES[ENGINE_NAME].attrs
 
 #INPUT FILE PATHS
 QUERIES_PATH = "HW1/100QueriesSet4.txt"
@@ -22,34 +31,203 @@ OUTPUT_JSON = "HW1/hw1.json"
 OUTPUT_CSV = "HW1/hw1.csv"
 OUTPUT_TXT = "HW1/hw1.txt"
 
+#SEARCH RESULT CACHE AND SNAPSHOTS (search_cache.py)
+CACHE_PATH = "HW1/search_cache.sqlite"
+SNAPSHOT_DIR = "HW1/snapshots"
+
+#BATCH SEARCH DEFAULTS (SearchEngine.search_many)
+WORKERS = 8
+RATE = 1.0  #requests per second, retries included
+BURST = 2
+REQUEST_TIMEOUT = 10  #seconds per request
+QUERY_TIMEOUT = 120  #seconds per query, retries and backoff included
+MAX_RETRIES = 5
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 60.0
+#202 is DuckDuckGo's "anomaly" page for clients it throttles
+THROTTLE_STATUSES = (202, 429, 503)
+
+
+class TokenBucket:
+    #rate tokens per second, at most burst saved up
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        #takes a token and returns 0 if one is free, else the seconds until one will be
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+def backoff_delay(attempt, retry_after=None):
+    #full jitter: uniform up to the exponential backoff, never less than the server's Retry-After
+    delay = uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def engine_name(search_url=None, engine=None):
+    #cache and snapshot name of the engine (by default DuckDuckGo) behind a search URL: the engine's
+    #name for its own URL, else the URL's host
+    engine = engine or get_engine(ENGINE_NAME)
+    if search_url is None or search_url == engine.search_url:
+        return engine.name
+    return urlsplit(search_url).netloc.replace(":", "_")
+
+
 class SearchEngine:
 
     @staticmethod
-    def search(query, sleep=True):
+    def query_url(query, search_url=None, engine=None):
+        return (engine or get_engine(ENGINE_NAME)).query_url(query, search_url)
+
+    @staticmethod
+    def search(query, sleep=True, search_url=None, cache=None, engine=None):
+        if cache is not None:
+            cached = cache.get(engine_name(search_url, engine), query)
+            if cached is not None:
+                print("Cached ", query)
+                return cached
         # Prevents loading too many pages too soon
         if sleep: 
             time.sleep(randint(10, 100))
-        #for adding + between words for the query
-        temp_url = '+'.join(query.split()) 
-        url = SEARCHING_URL + temp_url
-        soup = BeautifulSoup(requests.get(url, headers=USER_AGENT).text,"html.parser")
-        new_results = SearchEngine.scrape_search_result(soup)
+        url = SearchEngine.query_url(query, search_url, engine)
+        html = requests.get(url, headers=USER_AGENT).text
+        new_results = SearchEngine.parse_results(html, engine)
         print("Parsed ", query)
+        SearchEngine.cache_results(cache, search_url, query, html, new_results, engine)
         return new_results
-    
+
+    @staticmethod
+    def cache_results(cache, search_url, query, html, results, engine=None):
+        #a page without results is more likely a blocked or broken one than a real answer, so it is not kept
+        if cache is not None and results:
+            cache.put(engine_name(search_url, engine), query, html, results)
+
     @staticmethod
-    def scrape_search_result(soup):
-        raw_results = soup.find_all(SEARCH_SELECTOR,SEARCH_ATTRS)
-        results = []
-        result_count = 0
-        #implement a check to get only 10 results
-        for result in raw_results:
-            result_count +=1
-            if result_count > 10:
+    def search_many(queries, workers=WORKERS, rate=RATE, burst=BURST, timeout=REQUEST_TIMEOUT,
+                    query_timeout=QUERY_TIMEOUT, max_retries=MAX_RETRIES, search_url=None, stats=None, cache=None,
+                    engine=None):
+        #runs the queries on a thread pool instead of sleeping before each one: every request,
+        #retries included, takes a token from one shared bucket, and the workers share a session
+        #whose connection pool has a connection per worker. Returns {query: results} in input order;
+        #a query that still fails after max_retries or query_timeout gets []. Queries found in the cache
+        #are not searched again
+        stats = stats if stats is not None else Counter()
+        unique = list(dict.fromkeys(queries))
+        results = {}
+        if cache is not None:
+            name = engine_name(search_url, engine)
+            for query in unique:
+                cached = cache.get(name, query)
+                if cached is not None:
+                    results[query] = cached
+            stats["cached"] += len(results)
+        bucket = TokenBucket(rate, burst)
+        session = requests.Session()
+        session.headers.update(USER_AGENT)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        #every query counts into its own Counter, added to stats once it is done: += on a shared
+        #Counter from several threads can lose updates
+        query_stats = {query: Counter() for query in unique if query not in results}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {query: pool.submit(SearchEngine.search_with_retries, query, session, bucket, timeout,
+                                          query_timeout, max_retries, search_url, query_stats[query], cache, engine)
+                       for query in query_stats}
+            results.update({query: future.result() for query, future in futures.items()})
+        for counts in query_stats.values():
+            stats.update(counts)
+        session.close()
+        return {query: results[query] for query in unique}
+
+    @staticmethod
+    def search_with_retries(query, session, bucket, timeout, query_timeout, max_retries, search_url, stats, cache=None,
+                            engine=None):
+        url = SearchEngine.query_url(query, search_url, engine)
+        deadline = time.monotonic() + query_timeout
+        for attempt in range(max_retries + 1):
+            bucket.acquire()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            stats["requests"] += 1
+            retry_after = None
+            try:
+                response = session.get(url, timeout=min(timeout, remaining))
+                if response.status_code == 200:
+                    new_results = SearchEngine.parse_results(response.text, engine)
+                    print(f"Parsed  {query}")
+                    SearchEngine.cache_results(cache, search_url, query, response.text, new_results, engine)
+                    return new_results
+                if response.status_code not in THROTTLE_STATUSES:
+                    #not found, bad request, ...: retrying would not help
+                    stats["errors"] += 1
+                    break
+                stats["throttled"] += 1
+                retry_after = response.headers.get("Retry-After")
+            except requests.RequestException:
+                #timeouts and connection errors are retried like throttling
+                stats["errors"] += 1
+            delay = backoff_delay(attempt, retry_after)
+            if attempt == max_retries or time.monotonic() + delay >= deadline:
                 break
-            link = result.get('href')
-            results.append(link)
-        return results
+            stats["retries"] += 1
+            time.sleep(delay)
+        stats["failed"] += 1
+        print(f"Failed  {query}")
+        return []
+    
+    @staticmethod
+    def replay(queries, cache, search_url=None, reparse=False, engine=None):
+        #the cached results of the queries without any network call, as {query: results}, and the
+        #queries missing from the cache; reparse scrapes the cached HTML again instead
+        name = engine_name(search_url, engine)
+        results = {}
+        missing = []
+        for query in dict.fromkeys(queries):
+            if reparse:
+                html = cache.get_html(name, query)
+                cached = SearchEngine.parse_results(html, engine) if html is not None else None
+            else:
+                cached = cache.get(name, query)
+            if cached is None:
+                missing.append(query)
+            else:
+                results[query] = cached
+        return results, missing
+
+    @staticmethod
+    def parse_results(html, engine=None):
+        #the engine's parser: by default the streaming one, which stops after the last result it needs
+        return (engine or get_engine(ENGINE_NAME)).parse(html)
+
+    @staticmethod
+    def scrape_search_result(soup, engine=None):
+        return (engine or get_engine(ENGINE_NAME)).scrape(soup)
 
 def check_similar_results(result):
     if result.startswith("http://"):
@@ -62,25 +240,33 @@ def check_similar_results(result):
         result = result[:-1]
     return result
 
-def calculate_overlap_and_ranks():
+def calculate_overlap_and_ranks(search_engine_results=None, google_engine_results=None):
+    #compares with the json files unless given the results; google_engine_results can be any baseline
 
     overlaps_ranks_data = []    
-    search_engine_results = json.loads(open(OUTPUT_JSON).read())
-    google_engine_results = json.loads(open(GOOGLE_JSON).read())
+    if search_engine_results is None:
+        search_engine_results = json.loads(open(OUTPUT_JSON).read())
+    if google_engine_results is None:
+        google_engine_results = json.loads(open(GOOGLE_JSON).read())
 
     for query in search_engine_results.keys():
         search_engine_response = search_engine_results[query]
-        google_engine_response = google_engine_results[query]
+        google_engine_response = google_engine_results.get(query, [])
 
-        overlap = 0
+        #every URL normalized once and matched through a dict; a URL listed twice counts once, at its best rank
+        search_engine_ranks = {}
+        for j, result in enumerate(search_engine_response):
+            search_engine_ranks.setdefault(check_similar_results(result), j)
         google_rank = []
         search_engine_rank = []
-        for i in range(0, len(google_engine_response)):
-            for j in range(0, len(search_engine_response)):
-                if check_similar_results(google_engine_response[i]) == check_similar_results(search_engine_response[j]):
-                    overlap += 1
-                    google_rank.append(i)
-                    search_engine_rank.append(j)
+        matched = set()
+        for i, result in enumerate(google_engine_response):
+            result = check_similar_results(result)
+            if result in search_engine_ranks and result not in matched:
+                matched.add(result)
+                google_rank.append(i)
+                search_engine_rank.append(search_engine_ranks[result])
+        overlap = len(google_rank)
 
         overlap_rank_data = {
             "query": query,
@@ -134,47 +320,134 @@ def calculate_spearman_coefficient(overlaps_ranks_data):
 
     return statistics_data, (total_overlap / 100.0)*10, total_spearman / 100.0
 
+
+def report_drift(old_snapshot, results):
+    #how far results moved from an earlier snapshot of the same engine, with the snapshot as the baseline
+    data, _, _ = calculate_spearman_coefficient(calculate_overlap_and_ranks(results, old_snapshot["results"]))
+    changed = sum(1 for query, result in results.items() if old_snapshot["results"].get(query) != result)
+    print(f"Drift from the {old_snapshot['engine']} snapshot of {old_snapshot['created']}: "
+          f"{changed} of {len(results)} queries changed, "
+          f"average percentage overlap {sum(d['percentage_overlap'] for d in data) / max(len(data), 1):.1f}%, "
+          f"average spearman coefficient {sum(d['spearman_coefficient'] for d in data) / max(len(data), 1):.3f}")
+
+
+def describe_performance(title, average_percentage_overlap, average_spearman):
+    #the hw1.txt text comparing the engine called title with Google
+    description = f"Baseline search engine: Google\nAssigned search engine for comparison: {title}\n \n" \
+                  f"Average percentage overlap: {average_percentage_overlap}%\n" \
+                  f"Average spearman coefficient: {average_spearman}\n\n"
+
+    if average_spearman < 0:
+        description += f"The results show that {title} and Google rank search results very differently. From the above average percent overlap and average Spearman coefficient, it can be clearly seen that the similarity between the search results obtained by {title} and Google's results is very low. The average percentage overlap " \
+                       f"indicate that most of the results from {title} do not appear in Google's top rankings possibly due to the search engine algorithms" \
+                       f" and their page rankings system and the huge database google has. The negative average spearman coefficient also say that the rankings are more often in reverse order when compared to Google's."
+    return description
+
+
 #############Driver code############
-# reading the query list dataset
-with open(QUERIES_PATH) as file:
-    query_list = [line.rstrip() for line in file]
-print("Started parsing queries...")
-response_json = {}
-for query in query_list:
-    result = SearchEngine.search(query)
-    response_json[query] = result
-
-
-# to write the respon as a json file
-with open(OUTPUT_JSON, "w") as file:
-    json.dump(response_json, file)
-print("Generated json file ...")
-# to calculate overlap and ranks
-overlaps_ranks_data = calculate_overlap_and_ranks()
-
-# call for calculating spearman coefficient
-data, average_percentage_overlap, average_spearman = calculate_spearman_coefficient(overlaps_ranks_data)
-
-# to store the data in csv file
-with open(OUTPUT_CSV, "w") as file:
-    write = csv.writer(file)
-    write.writerow(["Queries", "Number of Overlapping Results", "Percentage Overlap", "Spearman Coefficient"])
-    for d in data:
-        write.writerow(
-            [d["queries"], d["overlapping_results"], d["percentage_overlap"], d["spearman_coefficient"]])
-
-print("Generated csv file ...")     
-# txt file for describing the performance
-description = f"Baseline search engine: Google\nAssigned search engine for comparison: DuckDuckGo\n \n" \
-              f"Average percentage overlap: {average_percentage_overlap}%\n" \
-              f"Average spearman coefficient: {average_spearman}\n\n" 
-
-if average_spearman < 0:
-    description += f"The results show that DuckDuckGo and Google rank search results very differently. From the above average percent overlap and average Spearman coefficient, it can be clearly seen that the similarity between the search results obtained by DuckDuckGo and Google's results is very low. The average percentage overlap " \
-                   f"indicate that most of the results from DuckDuckGo do not appear in Google's top rankings possibly due to the search engine algorithms" \
-                   f" and their page rankings system and the huge database google has. The negative average spearman coefficient also say that the rankings are more often in reverse order when compared to Google's."
-
-with open(OUTPUT_TXT,"w") as f:
-    f.write(description)
-
-####################################
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description=f"search the query set on {get_engine(ENGINE_NAME).title} (or --engine) "
+                                                 "and compare the results with Google's")
+    parser.add_argument("--serial", action="store_true",
+                        help="one query at a time with a 10-100 s sleep before each, as originally run")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="queries in flight at once")
+    parser.add_argument("--rate", type=float, default=RATE, help="requests per second, retries included")
+    parser.add_argument("--burst", type=int, default=BURST, help="requests that may be sent back to back")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="seconds per request")
+    parser.add_argument("--query-timeout", type=float, default=QUERY_TIMEOUT,
+                        help="seconds per query, retries and backoff included")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES, help="retries of a throttled or failed request")
+    parser.add_argument("--engine", default=ENGINE_NAME, choices=[name for name, engine in ENGINES.items() if engine.search_url],
+                        help="engine to search (engines.py)")
+    parser.add_argument("--search-url", help="search URL the query is appended to instead of the engine's, "
+                                             "e.g. mock_search_server.py's")
+    parser.add_argument("--cache", default=CACHE_PATH, help="sqlite file of cached result pages")
+    parser.add_argument("--no-cache", action="store_true", help="search every query and cache nothing")
+    parser.add_argument("--cache-ttl", type=float, default=TTL, help="seconds a cached result page is used for")
+    parser.add_argument("--cache-max-mb", type=float, default=MAX_BYTES / 2 ** 20, help="size the cache is kept under")
+    parser.add_argument("--replay", action="store_true",
+                        help="take every result from the cache, however old, with no network call")
+    parser.add_argument("--reparse", action="store_true", help="with --replay, scrape the cached HTML again")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="where the results of every search run are kept")
+    parser.add_argument("--drift", nargs="?", const="latest", metavar="SNAPSHOT",
+                        help="compare the results with a snapshot (default: the engine's latest)")
+    args = parser.parse_args()
+
+    # reading the query list dataset
+    with open(QUERIES_PATH) as file:
+        query_list = [line.rstrip() for line in file]
+    search_engine = get_engine(args.engine)
+    engine = engine_name(args.search_url, search_engine)
+    drift_snapshot = None
+    if args.drift:
+        #read before this run saves its own
+        earlier_snapshots = snapshots(args.snapshot_dir, engine)
+        drift_path = earlier_snapshots[-1] if args.drift == "latest" and earlier_snapshots else args.drift
+        if os.path.exists(drift_path):
+            drift_snapshot = load_snapshot(drift_path)
+        else:
+            print(f"No snapshot to compare with: {drift_path}")
+    if args.replay:
+        cache = SearchCache(args.cache, ttl=None, max_bytes=float("inf"))
+        response_json, missing = SearchEngine.replay(query_list, cache, args.search_url, args.reparse,
+                                                      search_engine)
+        cache.close()
+        if missing:
+            sys.exit(f"{len(missing)} queries are not in {args.cache}, e.g. {missing[0]!r}; run without --replay first")
+        print(f"Replayed {len(response_json)} queries from {args.cache}")
+    else:
+        cache = None if args.no_cache else SearchCache(args.cache, args.cache_ttl, args.cache_max_mb * 2 ** 20)
+        print("Started parsing queries...")
+        if args.serial:
+            response_json = {}
+            for query in query_list:
+                result = SearchEngine.search(query, search_url=args.search_url, cache=cache, engine=search_engine)
+                response_json[query] = result
+        else:
+            stats = Counter()
+            start = time.monotonic()
+            response_json = SearchEngine.search_many(query_list, args.workers, args.rate, args.burst, args.timeout,
+                                                     args.query_timeout, args.retries, args.search_url, stats, cache,
+                                                     search_engine)
+            print(f"Searched {len(response_json)} queries in {time.monotonic() - start:.1f} s: {stats['cached']} cached, "
+                  f"{stats['requests']} requests, {stats['throttled']} throttled, {stats['retries']} retries, "
+                  f"{stats['failed']} failed")
+        if cache is not None:
+            print(f"Cache: {cache.hits} hits, {cache.misses} misses, {cache.evicted} evicted, "
+                  f"{len(cache)} pages in {cache.size() / 2 ** 20:.1f} MB")
+            cache.close()
+        print("Saved snapshot", save_snapshot(args.snapshot_dir, engine, response_json,
+                                                      search_engine.query_url("", args.search_url)))
+    if drift_snapshot is not None:
+        report_drift(drift_snapshot, response_json)
+
+    # to write the respon as a json file
+    with open(OUTPUT_JSON, "w") as file:
+        json.dump(response_json, file)
+    print("Generated json file ...")
+    # to calculate overlap and ranks
+    overlaps_ranks_data = calculate_overlap_and_ranks()
+
+    # call for calculating spearman coefficient
+    data, average_percentage_overlap, average_spearman = calculate_spearman_coefficient(overlaps_ranks_data)
+
+    # to store the data in csv file
+    with open(OUTPUT_CSV, "w") as file:
+        write = csv.writer(file)
+        write.writerow(["Queries", "Number of Overlapping Results", "Percentage Overlap", "Spearman Coefficient"])
+        for d in data:
+            write.writerow(
+                [d["queries"], d["overlapping_results"], d["percentage_overlap"], d["spearman_coefficient"]])
+
+    print("Generated csv file ...")
+    # txt file for describing the performance
+    title = search_engine.title if args.search_url is None else f"{search_engine.title} ({args.search_url})"
+    description = describe_performance(title, average_percentage_overlap, average_spearman)
+
+    with open(OUTPUT_TXT,"w") as f:
+        f.write(description)
+
+
+if __name__ == '__main__':
+    main()
+####################################
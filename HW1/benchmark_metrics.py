@@ -0,0 +1,111 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from HW1 import calculate_overlap_and_ranks, calculate_spearman_coefficient, check_similar_results
+from metrics import compare_results
+
+#The original nested-loop overlap (every Google result against every engine result, both
+#normalized again for each comparison), calculate_overlap_and_ranks with its dict index, and the
+#vectorized metrics.py, on synthetic result lists: --queries queries of --depth results each,
+#drawn from a pool of URLs written in several ways (http/https, www. or not, trailing /), the
+#engine's lists sharing about --shared of the baseline's. The original loop is timed on the
+#first --loop-queries queries and extrapolated; all three must agree there (the lists have no
+#duplicates), and the dict index and metrics.py on every query.
+#
+#   python HW1/benchmark_metrics.py [--queries 100000] [--depth 100] [--loop-queries 100]
+
+
+def original_overlap_and_ranks(search_engine_results, google_engine_results):
+    #calculate_overlap_and_ranks before the dict index
+    overlaps_ranks_data = []
+    for query in search_engine_results.keys():
+        search_engine_response = search_engine_results[query]
+        google_engine_response = google_engine_results[query]
+        overlap = 0
+        google_rank = []
+        search_engine_rank = []
+        for i in range(0, len(google_engine_response)):
+            for j in range(0, len(search_engine_response)):
+                if check_similar_results(google_engine_response[i]) == check_similar_results(search_engine_response[j]):
+                    overlap += 1
+                    google_rank.append(i)
+                    search_engine_rank.append(j)
+        overlaps_ranks_data.append({"query": query, "google_rank": google_rank,
+                                    "search_engine_rank": search_engine_rank, "overlap": overlap})
+    return overlaps_ranks_data
+
+
+def make_results(queries, depth, shared, pool_size, seed):
+    rng = np.random.default_rng(seed)
+    variants = [f"{scheme}{www}site{n % 5000}.com/page/{n}{slash}"
+                for n in range(pool_size) for scheme, www, slash in [("https://", "www.", ""), ("http://", "", "/")]]
+    #each query gets depth distinct pages; the engine keeps a shuffled --shared of them, written
+    #the other way, and fills the rest with other pages
+    google, engine = {}, {}
+    for q in range(queries):
+        pages = rng.choice(pool_size, size=2 * depth, replace=False)
+        kept = pages[:depth][rng.random(depth) < shared]
+        engine_pages = np.concatenate((kept, pages[depth:2 * depth - len(kept)]))
+        rng.shuffle(engine_pages)
+        google[f"query {q}"] = [variants[2 * page] for page in pages[:depth]]
+        engine[f"query {q}"] = [variants[2 * page + 1] for page in engine_pages]
+    return engine, google
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="overlap and rank correlation: nested loop, dict index, numpy")
+    parser.add_argument("--queries", type=int, default=100000)
+    parser.add_argument("--depth", type=int, default=100, help="results per list")
+    parser.add_argument("--shared", type=float, default=0.4, help="share of the baseline's results the engine has")
+    parser.add_argument("--pool", type=int, default=1000000, help="distinct pages")
+    parser.add_argument("--loop-queries", type=int, default=100, help="queries the original loop is timed on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    (engine, google), seconds = timed(make_results, args.queries, args.depth, args.shared, args.pool, args.seed)
+    print(f"{args.queries} queries x {args.depth} results generated in {seconds:.1f} s")
+    sample = list(google)[:args.loop_queries]
+    engine_sample = {query: engine[query] for query in sample}
+
+    loop, loop_seconds = timed(original_overlap_and_ranks, engine_sample, google)
+    indexed, indexed_seconds = timed(calculate_overlap_and_ranks, engine, google)
+    (queries, metrics), numpy_seconds = timed(compare_results, engine, google, args.depth)
+    (data, _, _), spearman_seconds = timed(calculate_spearman_coefficient, indexed)
+    indexed_seconds += spearman_seconds
+
+    ok = True
+    for row, (old, new) in enumerate(zip(loop, indexed)):
+        if old != new:
+            ok = False
+            print("dict index differs from the original loop on", old["query"])
+    overlap = np.array([d["overlapping_results"] for d in data])
+    spearman = np.array([d["spearman_coefficient"] for d in data])
+    if not (np.array_equal(overlap, metrics["overlap"]) and np.allclose(spearman, metrics["spearman"])):
+        ok = False
+        print("metrics.py differs from calculate_overlap_and_ranks + calculate_spearman_coefficient")
+
+    loop_estimate = loop_seconds / len(sample) * args.queries
+    print(f"\n{'method':<40}{'seconds':>10}{'queries/s':>12}{'speedup':>9}")
+    print(f"{'original loop (est. from ' + str(len(sample)) + ')':<40}{loop_estimate:>10.1f}"
+          f"{args.queries / loop_estimate:>12.0f}{1:>8.0f}x")
+    print(f"{'dict index + spearman':<40}{indexed_seconds:>10.1f}{args.queries / indexed_seconds:>12.0f}"
+          f"{loop_estimate / indexed_seconds:>8.0f}x")
+    print(f"{'metrics.py (+ kendall, rbo)':<40}{numpy_seconds:>10.1f}{args.queries / numpy_seconds:>12.0f}"
+          f"{loop_estimate / numpy_seconds:>8.0f}x")
+    print(f"\nmean overlap {metrics['overlap'].mean():.1f}, spearman {metrics['spearman'].mean():.3f}, "
+          f"kendall {metrics['kendall'].mean():.3f}, rbo {metrics['rbo'].mean():.3f}")
+    print("results agree" if ok else "RESULTS DIFFER")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+from engines import Engine, get_engine
+from HW1 import QUERIES_PATH, engine_name
+from mock_search_server import MockSearchConfig
+from search_cache import SearchCache
+
+#Engine.parse with the BeautifulSoup tree ("bs4") against the streaming result_parser.py
+#("stream") on saved result pages: the cached pages of --engine (--cache, and --search-url if
+#they were scraped from another URL), the *.html files of --pages, or, by default,
+#mock_search_server.py's pages for the query set with --results results each. Every page is
+#parsed --repeat times by each parser, and both must give the same results.
+#
+#   python HW1/benchmark_parser.py [--engine duckduckgo] [--cache FILE [--search-url URL] | --pages DIR]
+#       [--results 30] [--repeat 5]
+
+
+def load_pages(args):
+    #[(name, html)] of the pages to parse
+    if args.pages:
+        paths = sorted(glob.glob(os.path.join(glob.escape(args.pages), "*.html")))
+        pages = []
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as file:
+                pages.append((os.path.basename(path), file.read()))
+        return pages
+    if args.cache:
+        cache = SearchCache(args.cache, ttl=None, max_bytes=float("inf"))
+        pages = cache.html_pages(engine_name(args.search_url, get_engine(args.engine)))
+        cache.close()
+        return pages
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.basename(QUERIES_PATH))) as file:
+        queries = [line.strip() for line in file if line.strip()]
+    config = MockSearchConfig(results=args.results)
+    return [(query, config.page(query)) for query in queries]
+
+
+def timed_parse(engine, pages, repeat):
+    #results of every page, and the best seconds of repeat runs over all the pages
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [engine.parse(html) for _, html in pages]
+        best = min(best, time.perf_counter() - start)
+    return results, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BeautifulSoup against the streaming result page parser")
+    parser.add_argument("--engine", default="duckduckgo", help="engine whose selector the pages are parsed with")
+    parser.add_argument("--cache", help="take the engine's pages from this search cache")
+    parser.add_argument("--search-url", help="with --cache, the URL the pages were scraped from")
+    parser.add_argument("--pages", help="take the pages from the *.html files of this directory")
+    parser.add_argument("--results", type=int, default=30, help="results per mock page")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per parser, the best one counts")
+    args = parser.parse_args()
+
+    engine = get_engine(args.engine)
+    pages = load_pages(args)
+    if not pages:
+        sys.exit("no pages to parse")
+    size = sum(len(html) for _, html in pages)
+    print(f"{len(pages)} pages of {engine.name}, {size / len(pages) / 1024:.1f} KB on average")
+
+    timings = {}
+    results = {}
+    for name in ("bs4", "stream"):
+        parsing = Engine(engine.name, engine.search_url, engine.selector, engine.attrs, parser=name)
+        results[name], timings[name] = timed_parse(parsing, pages, args.repeat)
+
+    print(f"\n{'parser':<10}{'ms/page':>10}{'pages/s':>10}{'speedup':>9}")
+    for name in ("bs4", "stream"):
+        seconds = timings[name]
+        print(f"{name:<10}{seconds / len(pages) * 1000:>10.2f}{len(pages) / seconds:>10.0f}"
+              f"{timings['bs4'] / seconds:>8.1f}x")
+
+    differ = [page for (page, _), old, new in zip(pages, results["bs4"], results["stream"]) if old != new]
+    for page in differ[:5]:
+        print("results differ on", page)
+    found = sum(map(len, results["stream"]))
+    print(f"\n{found} results, {found / len(pages):.1f} per page")
+    print("results agree" if not differ else f"RESULTS DIFFER on {len(differ)} pages")
+    sys.exit(0 if not differ else 1)
+
+
+if __name__ == '__main__':
+    main()
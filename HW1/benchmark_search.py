@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+from HW1 import QUERIES_PATH, SearchEngine
+from mock_search_server import MockSearchConfig, search_url, start_mock_search_server
+
+#SearchEngine.search one query at a time (without its 10-100 s sleep, whose 55 s mean is added
+#as an estimate) against SearchEngine.search_many, all on mock_search_server.py. search_many
+#runs once under the server's rate limit and once over it, where it has to back off and retry;
+#both must return exactly the serial results.
+#
+#   python HW1/benchmark_search.py [--queries 100] [--server-rate 10] [--latency 0.2]
+
+MEAN_SLEEP = 55  #mean of randint(10, 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serial against concurrent rate-limited search on a mock server")
+    parser.add_argument("--queries", type=int, default=100, help="queries of the query set to search")
+    parser.add_argument("--server-rate", type=float, default=10.0, help="requests per second the server serves")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean seconds per response")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--throttle-status", type=int, choices=[202, 429, 503], default=429)
+    args = parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.basename(QUERIES_PATH))) as file:
+        queries = [line.rstrip() for line in file][:args.queries]
+    config = MockSearchConfig(rate=args.server_rate, burst=int(args.server_rate), latency=args.latency,
+                              throttle_status=args.throttle_status)
+    server = start_mock_search_server(config)
+    url = search_url(server)
+    counts = server.RequestHandlerClass.counts
+
+    start = time.monotonic()
+    serial = {query: SearchEngine.search(query, sleep=False, search_url=url) for query in queries}
+    serial_seconds = time.monotonic() - start
+
+    runs = [("serial", serial_seconds, None, True)]
+    for name, rate in (("under the limit", 0.9 * args.server_rate), ("over the limit", 3 * args.server_rate)):
+        #the server's bucket refills while idle, so every run starts with its burst
+        time.sleep(config.burst / config.rate)
+        stats = Counter()
+        start = time.monotonic()
+        results = SearchEngine.search_many(queries, workers=args.workers, rate=rate, burst=config.burst,
+                                           search_url=url, stats=stats)
+        runs.append((f"{name} ({rate:g}/s)", time.monotonic() - start, stats, results == serial))
+    server.shutdown()
+
+    print(f"\n{len(queries)} queries, server: {args.server_rate:g} requests/s, {args.latency:g} s mean latency, "
+          f"{counts['throttled']} requests throttled in all")
+    print(f"{'run':<28}{'seconds':>9}{'requests':>10}{'throttled':>11}{'retries':>9}{'failed':>8}{'same results':>14}")
+    print(f"{'serial with sleeps (est.)':<28}{serial_seconds + MEAN_SLEEP * len(queries):>9.0f}")
+    for name, seconds, stats, same in runs:
+        stats = stats or Counter(requests=len(queries))
+        print(f"{name:<28}{seconds:>9.1f}{stats['requests']:>10}{stats['throttled']:>11}{stats['retries']:>9}"
+              f"{stats['failed']:>8}{'yes' if same else 'NO':>14}")
+    sys.exit(0 if all(same for _, _, _, same in runs) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from engines import ENGINES, get_engine
+from HW1 import BURST, QUERIES_PATH, RATE, WORKERS, CACHE_PATH, SearchEngine
+from metrics import RBO_P, compare_results
+from search_cache import SearchCache
+
+#Compares N search engines over one query set: every engine's results are loaded (an engine with
+#a results file, like Google, or --load NAME=FILE with a JSON file of {query: results} or a
+#snapshot), replayed from the search cache (--replay) or scraped, the engines scraped at the same
+#time, each under its own rate limit. For every pair of engines metrics.py gives each query's
+#overlap, Spearman, Kendall and RBO, and the averages are printed as N x N matrices with
+#bootstrap confidence intervals: --resamples resamples of the queries, drawn once as multinomial
+#counts and shared by every pair and metric, so all the resampled averages are one matrix
+#product. The metrics are symmetric, so each pair is compared once.
+#
+#   python HW1/compare_engines.py --engines google,duckduckgo,bing [--queries FILE] [--replay]
+#       [--load bing=bing.json] [--search-url duckduckgo=http://127.0.0.1:8001/html/?q=]
+#       [--depth 10] [--resamples 1000] [--output matrices.json]
+
+METRICS = ["percentage_overlap", "spearman", "kendall", "rbo"]
+BOOTSTRAP_BLOCK = 2 ** 24  #resample x query counts drawn at a time
+
+
+def name_value(text):
+    name, _, value = text.partition("=")
+    if not value:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    return name, value
+
+
+def load_results(path):
+    with open(path) as file:
+        data = json.load(file)
+    #a snapshot keeps the results under "results"
+    return data["results"] if isinstance(data.get("results"), dict) else data
+
+
+def gather_results(names, queries, args):
+    #{engine name: {query: results}}
+    loads = dict(args.load)
+    search_urls = dict(args.search_url)
+    results = {}
+    to_scrape = []
+    for name in names:
+        if name in loads:
+            results[name] = load_results(loads[name])
+            continue
+        engine = get_engine(name)
+        if engine.results_file is not None:
+            results[name] = engine.load()
+        else:
+            to_scrape.append(engine)
+    if not to_scrape:
+        return results
+    cache = None
+    if args.replay or not args.no_cache:
+        cache = SearchCache(args.cache, ttl=None, max_bytes=float("inf")) if args.replay else SearchCache(args.cache)
+    if args.replay:
+        for engine in to_scrape:
+            results[engine.name], missing = SearchEngine.replay(queries, cache, search_urls.get(engine.name), engine=engine)
+            if missing:
+                sys.exit(f"{len(missing)} queries of {engine.name} are not in {args.cache}, e.g. {missing[0]!r}")
+    else:
+        def scrape(engine):
+            stats = Counter()
+            found = SearchEngine.search_many(queries, args.workers, args.rate, args.burst,
+                                             search_url=search_urls.get(engine.name), stats=stats, cache=cache,
+                                             engine=engine)
+            print(f"{engine.name}: {stats['cached']} cached, {stats['requests']} requests, {stats['failed']} failed")
+            return found
+        with ThreadPoolExecutor(max_workers=len(to_scrape)) as pool:
+            for engine, found in zip(to_scrape, pool.map(scrape, to_scrape)):
+                results[engine.name] = found
+    if cache is not None:
+        cache.close()
+    return results
+
+
+def pairwise_metrics(names, results, queries, depth, p):
+    #{(i, j): {metric: array with a value per query}} of every pair of engines i < j
+    pairs = {}
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            _, metrics = compare_results(results[names[j]], results[names[i]], depth, p, queries)
+            pairs[i, j] = metrics
+    return pairs
+
+
+def bootstrap(values, resamples, confidence, seed):
+    #means, lower and upper bounds of the columns of a queries x columns array; every resample is
+    #a row of multinomial counts of the queries, so the resampled means are counts @ values / queries
+    queries = values.shape[0]
+    rng = np.random.default_rng(seed)
+    probabilities = np.full(queries, 1 / queries)
+    block = max(1, BOOTSTRAP_BLOCK // max(queries, 1))
+    means = np.empty((resamples, values.shape[1]))
+    for start in range(0, resamples, block):
+        counts = rng.multinomial(queries, probabilities, size=min(block, resamples - start))
+        means[start:start + len(counts)] = counts @ values / queries
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(means, [tail, 100 - tail], axis=0)
+    return values.mean(axis=0), low, high
+
+
+def matrices(names, pairs, resamples, confidence, seed):
+    #{metric: {"mean", "low", "high": N x N lists, None on the diagonal}}
+    n = len(names)
+    keys = list(pairs)
+    if keys:
+        values = np.column_stack([pairs[key][metric] for key in keys for metric in METRICS]).astype(np.float64)
+        mean, low, high = bootstrap(values, resamples, confidence, seed)
+    tables = {metric: {part: [[None] * n for _ in range(n)] for part in ("mean", "low", "high")} for metric in METRICS}
+    for k, (i, j) in enumerate(keys):
+        for m, metric in enumerate(METRICS):
+            column = k * len(METRICS) + m
+            for part, array in (("mean", mean), ("low", low), ("high", high)):
+                tables[metric][part][i][j] = tables[metric][part][j][i] = float(array[column])
+    return tables
+
+
+def print_matrix(names, metric, table, confidence):
+    cells = [[f"{table['mean'][i][j]:.3f} [{table['low'][i][j]:.3f}, {table['high'][i][j]:.3f}]"
+              if table["mean"][i][j] is not None else "-" for j in range(len(names))] for i in range(len(names))]
+    width = max(len(text) for text in names + [cell for row in cells for cell in row]) + 2
+    print(f"\n{metric} (mean [{confidence:.0%} CI])")
+    print(" " * width + "".join(f"{name:>{width}}" for name in names))
+    for name, row in zip(names, cells):
+        print(f"{name:<{width}}" + "".join(f"{cell:>{width}}" for cell in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pairwise overlap and rank correlation of several search engines")
+    parser.add_argument("--engines", default="google,duckduckgo",
+                        help=f"comma-separated engines, of {', '.join(ENGINES)}")
+    parser.add_argument("--queries", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          os.path.basename(QUERIES_PATH)),
+                        help="query file, one per line")
+    parser.add_argument("--load", action="append", default=[], type=name_value, metavar="NAME=FILE",
+                        help="take an engine's results from a JSON file of {query: results} or a snapshot; "
+                             "the engine need not be registered")
+    parser.add_argument("--search-url", action="append", default=[], type=name_value, metavar="NAME=URL",
+                        help="scrape an engine from another URL, e.g. mock_search_server.py's")
+    parser.add_argument("--replay", action="store_true", help="take the scraped engines' results from the cache")
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="queries in flight at once, per engine")
+    parser.add_argument("--rate", type=float, default=RATE, help="requests per second, per engine")
+    parser.add_argument("--burst", type=int, default=BURST)
+    parser.add_argument("--depth", type=int, default=10, help="results compared per query")
+    parser.add_argument("--rbo-p", type=float, default=RBO_P, help="persistence of rank-biased overlap")
+    parser.add_argument("--resamples", type=int, default=1000, help="bootstrap resamples")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the matrices as JSON")
+    args = parser.parse_args()
+
+    names = args.engines.split(",")
+    #an engine given by --load need not be registered
+    loaded = dict(args.load)
+    for name in names:
+        if name not in loaded:
+            get_engine(name)
+    with open(args.queries) as file:
+        queries = list(dict.fromkeys(line.strip() for line in file if line.strip()))
+
+    start = time.perf_counter()
+    results = gather_results(names, queries, args)
+    gathered = time.perf_counter() - start
+    coverage = {name: sum(1 for query in queries if results[name].get(query)) for name in names}
+    print(f"{len(queries)} queries; with results: " + ", ".join(f"{name} {coverage[name]}" for name in names))
+
+    start = time.perf_counter()
+    pairs = pairwise_metrics(names, results, queries, args.depth, args.rbo_p)
+    tables = matrices(names, pairs, args.resamples, args.confidence, args.seed)
+    computed = time.perf_counter() - start
+    for metric in METRICS:
+        print_matrix(names, metric, tables[metric], args.confidence)
+    print(f"\nResults gathered in {gathered:.1f} s, {len(pairs)} pairs compared with {args.resamples} resamples "
+          f"in {computed:.1f} s")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"engines": names, "queries": len(queries), "depth": args.depth, "rbo_p": args.rbo_p,
+                       "resamples": args.resamples, "confidence": args.confidence, "coverage": coverage,
+                       "metrics": tables}, file, indent=1)
+        print(f"Matrices saved as {args.output}")
+
+
+if __name__ == '__main__':
+    main()
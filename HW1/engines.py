@@ -0,0 +1,89 @@
+import json
+import os
+
+from bs4 import BeautifulSoup
+
+from result_parser import ResultParser
+
+#Registry of the search engines HW1 can scrape or load, by name. An engine has
+#   search_url    URL template: the query (words joined by +) replaces {query}, or is appended
+#                 when there is no {query}
+#   selector      tag and attributes (BeautifulSoup find_all) of the results on a result page;
+#                 a result's URL is the href of the tag, or of the first <a> inside it
+#   parser        how a result page is parsed: "stream" (result_parser.py, stops at the last result
+#                 it needs) or "bs4" (a whole BeautifulSoup tree, then scrape); both give the same
+#                 results, "bs4" is for selectors the stream parser does not support
+#   results_file  for an engine that is not scraped (Google), a JSON file of {query: results}
+#   title         the engine's name in reports, by default its name capitalized
+#The builtin engines are the four of the assignment plus Google's given results; others are added
+#with register_engine.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PER_QUERY = 10
+PARSERS = ("stream", "bs4")
+
+
+class Engine:
+
+    def __init__(self, name, search_url=None, selector="a", attrs=None, results_file=None, parser="stream", title=None):
+        if parser not in PARSERS:
+            raise ValueError(f"unknown parser {parser!r}, not one of {', '.join(PARSERS)}")
+        self.name = name
+        self.title = title or name.capitalize()
+        self.search_url = search_url
+        self.selector = selector
+        self.attrs = attrs or {}
+        self.results_file = results_file
+        self.parser = parser
+
+    def query_url(self, query, search_url=None):
+        template = search_url or self.search_url
+        #for adding + between words for the query
+        terms = '+'.join(query.split())
+        return template.replace("{query}", terms) if "{query}" in template else template + terms
+
+    def parse(self, html):
+        #the URLs of the first results of a result page
+        if self.parser == "stream":
+            return ResultParser(self.selector, self.attrs, RESULTS_PER_QUERY).parse(html)
+        return self.scrape(BeautifulSoup(html, "html.parser"))
+
+    def scrape(self, soup):
+        results = []
+        for result in soup.find_all(self.selector, self.attrs):
+            link = result.get("href")
+            if link is None:
+                anchor = result.find("a", href=True)
+                link = anchor.get("href") if anchor is not None else None
+            if link is not None:
+                results.append(link)
+            #implement a check to get only 10 results
+            if len(results) == RESULTS_PER_QUERY:
+                break
+        return results
+
+    def load(self):
+        with open(self.results_file) as file:
+            return json.load(file)
+
+
+ENGINES = {}
+
+
+def register_engine(engine):
+    ENGINES[engine.name] = engine
+    return engine
+
+
+def get_engine(name):
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise KeyError(f"unknown search engine {name!r}, not one of {', '.join(ENGINES)}") from None
+
+
+register_engine(Engine("duckduckgo", "https://www.duckduckgo.com/html/?q=", "a", {"class": "result__a"}, title="DuckDuckGo"))
+register_engine(Engine("bing", "https://www.bing.com/search?q=", "li", {"class": "b_algo"}))
+register_engine(Engine("yahoo", "https://search.yahoo.com/search?p=", "a", {"class": "ac-algo fz-l ac-21th lh-24"}, title="Yahoo!"))
+register_engine(Engine("ask", "https://www.ask.com/web?q=", "div", {"class": "PartialSearchResults-item-title"}))
+register_engine(Engine("google", results_file=os.path.join(HERE, "Google_Result4.json")))
@@ -0,0 +1,146 @@
+from itertools import repeat
+
+import numpy as np
+
+#Overlap and rank correlation of many queries' results at once. Every URL is normalized once
+#(check_similar_results), and each query's results are matched through a dict of the engine's
+#normalized URLs, so matching is exact (no hash collisions) and the same in every run. The
+#matched (query, baseline rank, engine rank) triples of all the queries go into arrays, and
+#every metric is computed from them with array operations. Matching costs about what
+#calculate_overlap_and_ranks does; the arrays pay off in Spearman, Kendall and RBO, which are
+#a few array operations for all the queries instead of a Python loop per query.
+#
+#A URL that comes back twice in one list counts once, at its best rank. The metrics of a query:
+#   overlap      results in both lists (top depth of each)
+#   spearman     1 - 6 sum(d^2) / (n (n^2 - 1)) over the ranks d of the n shared results, as in
+#                calculate_spearman_coefficient: 0 when n = 0, and for n = 1, 1 if the result has
+#                the same rank in both lists and 0 if not
+#   kendall      tau-a of the shared results' two orders, (concordant - discordant) / (n (n-1) / 2),
+#                with the n < 2 cases as for spearman
+#   rbo          extrapolated rank-biased overlap (Webber et al. 2010) of the two lists to depth k
+#                with persistence p: X_k/k p^k + (1-p)/p sum_{d=1..k} X_d/d p^d, X_d the overlap of
+#                the top d of each
+
+RBO_P = 0.9
+KENDALL_BLOCK = 2 ** 22  #pairs compared at a time
+NORMALIZE_CHUNK = 2 ** 16  #URLs normalized at a time
+
+
+def normalize_url(url):
+    #same as HW1.check_similar_results
+    if url.startswith("http://"):
+        url = url[7:]
+    elif url.startswith("https://"):
+        url = url[8:]
+    if url.startswith("www."):
+        url = url[4:]
+    if url.endswith("/"):
+        url = url[:-1]
+    return url
+
+
+def normalize_urls(urls):
+    #normalize_url of every URL. With the URLs one per line, each prefix and the trailing / is a
+    #str.replace over all of them, anchored on the newlines: https:// or http:// becomes a \0
+    #marker, www. is dropped after a marker or at the start of a line, then the markers go
+    text = "\n" + "\n".join(urls) + "\n"
+    if not urls or "\0" in text or text.count("\n") != len(urls) + 1:
+        return list(map(normalize_url, urls))
+    text = text.replace("\nhttps://", "\n\0").replace("\nhttp://", "\n\0")
+    text = text.replace("\n\0www.", "\n\0").replace("\nwww.", "\n\0").replace("\n\0", "\n")
+    return text.replace("/\n", "\n")[1:-1].split("\n")
+
+
+def normalized_lists(results, queries, depth):
+    #the normalized (check_similar_results) top depth results of every query, one after the other,
+    #and each query's number of results; the URLs go through normalize_urls a chunk at a time
+    lists = [results.get(query, [])[:depth] for query in queries]
+    urls = [url for urls in lists for url in urls]
+    normalized = []
+    for start in range(0, len(urls), NORMALIZE_CHUNK):
+        normalized.extend(normalize_urls(urls[start:start + NORMALIZE_CHUNK]))
+    return normalized, list(map(len, lists))
+
+
+def match(baseline_results, engine_results, queries, depth):
+    #(query, baseline rank, engine rank) arrays of every result in both lists, ordered by query and
+    #baseline rank. Each query's engine results go in a dict of normalized URL -> best rank, and
+    #the baseline's are popped from it, so a URL the baseline lists twice counts once, at its best
+    #rank, as in calculate_overlap_and_ranks. The engine rank of every baseline result, -1 if the
+    #engine does not have it, is collected with C-level calls and the matches picked out by numpy
+    baseline_urls, baseline_lengths = normalized_lists(baseline_results, queries, depth)
+    engine_urls, engine_lengths = normalized_lists(engine_results, queries, depth)
+    found = []
+    baseline_start = engine_start = 0
+    for baseline_length, engine_length in zip(baseline_lengths, engine_lengths):
+        #built from the last result to the first, so a URL listed twice keeps its best rank
+        engine_end = engine_start + engine_length
+        index = dict(zip(reversed(engine_urls[engine_start:engine_end]), range(engine_length - 1, -1, -1)))
+        baseline_end = baseline_start + baseline_length
+        found.extend(map(index.pop, baseline_urls[baseline_start:baseline_end], repeat(-1, baseline_length)))
+        baseline_start, engine_start = baseline_end, engine_end
+    engine_rank = np.array(found, dtype=np.int64)
+    lengths = np.array(baseline_lengths, dtype=np.int64)
+    query = np.repeat(np.arange(len(queries)), lengths)
+    baseline_rank = np.arange(len(engine_rank)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    matched = engine_rank >= 0
+    return query[matched], baseline_rank[matched], engine_rank[matched]
+
+
+def rank_metrics(query, baseline_rank, engine_rank, queries, depth, p=RBO_P):
+    #{metric: array with a value per query} of the matched results of queries queries
+    overlap = np.bincount(query, minlength=queries)
+
+    d_squared = np.bincount(query, weights=(baseline_rank - engine_rank) ** 2.0, minlength=queries)
+    n = overlap.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spearman = np.where(n >= 2, 1 - 6 * d_squared / (n * (n * n - 1)), 0.0)
+    single = overlap == 1
+    same_rank = np.bincount(query, weights=baseline_rank == engine_rank, minlength=queries)
+    spearman[single] = same_rank[single]
+
+    kendall = kendall_tau(query, engine_rank, overlap)
+    kendall[single] = same_rank[single]
+
+    #X_d: shared results within the top d of both lists, for d = 1..depth
+    seen_by = np.maximum(baseline_rank, engine_rank)
+    prefix = np.bincount(query * depth + seen_by, minlength=queries * depth).reshape(queries, depth).cumsum(axis=1)
+    d = np.arange(1, depth + 1)
+    agreement = prefix / d
+    rbo = agreement[:, -1] * p ** depth + (1 - p) / p * (agreement * p ** d).sum(axis=1)
+
+    return {
+        "overlap": overlap,
+        "percentage_overlap": overlap / depth * 100.0,
+        "spearman": spearman,
+        "kendall": kendall,
+        "rbo": rbo,
+    }
+
+
+def kendall_tau(query, engine_rank, overlap):
+    #the matches are in baseline rank order, so a pair i < j is concordant when the engine ranks
+    #j below i too. Each query's engine ranks go in a row, NaN padded to the largest overlap, and
+    #every pair of columns i < j is compared for a block of rows at a time
+    queries = len(overlap)
+    width = int(overlap.max(initial=0))
+    score = np.zeros(queries)
+    if width >= 2:
+        starts = np.concatenate(([0], np.cumsum(overlap)[:-1]))
+        orders = np.full((queries, width), np.nan)
+        orders[query, np.arange(len(query)) - starts[query]] = engine_rank
+        first, second = np.triu_indices(width, k=1)
+        rows = max(1, KENDALL_BLOCK // len(first))
+        for start in range(0, queries, rows):
+            block = orders[start:start + rows]
+            score[start:start + rows] = np.nansum(np.sign(block[:, second] - block[:, first]), axis=1)
+    pairs = overlap * (overlap - 1) / 2.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(overlap >= 2, score / pairs, 0.0)
+
+
+def compare_results(engine_results, baseline_results, depth=10, p=RBO_P, queries=None):
+    #Metrics of every query of the baseline (or of queries), as (queries, {metric: array})
+    queries = list(baseline_results) if queries is None else list(queries)
+    matched = match(baseline_results, engine_results, queries, depth)
+    return queries, rank_metrics(*matched, len(queries), depth, p)
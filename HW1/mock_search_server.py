@@ -0,0 +1,168 @@
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from HW1 import TokenBucket
+
+#A local stand-in for https://www.duckduckgo.com/html/ to run SearchEngine against without
+#being throttled by the real one:
+#
+#   /html/?q=<query>   a DuckDuckGo-style HTML result page with --results results (anchors of
+#                      class result__a, plus the result__url and result__snippet anchors of the
+#                      real page). For a query of the Google results file the results are some of
+#                      Google's (--overlap of them, as http/www variants) mixed with other URLs,
+#                      otherwise made-up URLs; the same query always gets the same page.
+#
+#Requests over --rate per second (--burst back to back) are throttled: answered with
+#--throttle-status (429 by default; 202 serves DuckDuckGo's anomaly page instead) and a
+#Retry-After of the seconds until the next one would be served. Every response waits --latency
+#seconds on average (exponentially distributed).
+#
+#   python HW1/mock_search_server.py [--port 8001] [--rate 5] [--burst 5] [--latency 0.2]
+#   python HW1/HW1.py --search-url "http://127.0.0.1:8001/html/?q="
+
+GOOGLE_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Google_Result4.json")
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>{query} at DuckDuckGo</title></head>
+<body><div id="links" class="results">
+{results}
+</div></body></html>"""
+
+RESULT = """<div class="result results_links results_links_deep web-result">
+  <div class="links_main links_deep result__body">
+    <h2 class="result__title"><a rel="nofollow" class="result__a" href="{url}">{title}</a></h2>
+    <div class="result__extras"><div class="result__extras__url">
+      <a class="result__url" href="{url}">{display}</a>
+    </div></div>
+    <a class="result__snippet" href="{url}">{snippet}</a>
+  </div>
+</div>"""
+
+ANOMALY_PAGE = """<!DOCTYPE html>
+<html><head><title>DuckDuckGo</title></head>
+<body><div class="anomaly-modal__title">Unfortunately, bots use DuckDuckGo too.</div>
+<form id="challenge-form" action="/anomaly.js"></form></body></html>"""
+
+
+class MockSearchConfig:
+
+    def __init__(self, results=15, overlap=0.4, rate=5.0, burst=5, latency=0.2, throttle_status=429, seed=0):
+        self.results = results
+        self.overlap = overlap
+        self.rate = rate
+        self.burst = burst
+        self.latency = latency
+        self.throttle_status = throttle_status
+        self.seed = seed
+        with open(GOOGLE_RESULTS) as f:
+            self.google = json.load(f)
+
+    def result_urls(self, query):
+        rng = random.Random(f"{self.seed}:{query}")
+        words = [word.lower() for word in query.split() if word.isalnum()] or ["query"]
+        urls = []
+        for google_url in self.google.get(query, []):
+            if rng.random() < self.overlap:
+                #the same page written the way another engine might: http/https, with or without www. and /
+                url = google_url.replace("https://", "http://", 1) if rng.random() < 0.3 else google_url
+                url = url.replace("://www.", "://", 1) if rng.random() < 0.3 else url
+                urls.append(url.rstrip("/") if rng.random() < 0.3 else url)
+        while len(urls) < self.results:
+            site = rng.choice(["wikipedia.org", "reddit.com", "answers.com", "quora.com", "example.com", "ask.com"])
+            urls.append(f"https://www.{site}/{'-'.join(rng.sample(words, min(3, len(words))))}/{rng.randrange(10 ** 6)}")
+        rng.shuffle(urls)
+        return urls[:self.results]
+
+    def page(self, query):
+        results = []
+        for url in self.result_urls(query):
+            results.append(RESULT.format(url=escape(url), title=escape(query.title()),
+                                         display=escape(url.split("://", 1)[-1]), snippet=escape(f"All about {query} ...")))
+        return PAGE.format(query=escape(query), results="\n".join(results))
+
+
+def make_handler(config):
+
+    class MockSearchHandler(BaseHTTPRequestHandler):
+        bucket = TokenBucket(config.rate, config.burst)
+        counts = Counter()
+        #the server answers every request on its own thread
+        counts_lock = threading.Lock()
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.rstrip("/") != "/html":
+                self.send_error(404)
+                return
+            query = " ".join(parse_qs(url.query).get("q", [""])[0].split())
+            if not query:
+                self.send_error(400)
+                return
+            wait = self.bucket.try_acquire()
+            if config.latency:
+                time.sleep(random.expovariate(1 / config.latency))
+            if wait:
+                with self.counts_lock:
+                    self.counts["throttled"] += 1
+                body = ANOMALY_PAGE if config.throttle_status == 202 else "Too Many Requests"
+                self.send_page(config.throttle_status, body, {"Retry-After": str(math.ceil(wait))})
+                return
+            with self.counts_lock:
+                self.counts["served"] += 1
+                self.counts[query] += 1
+            self.send_page(200, config.page(query))
+
+        def send_page(self, status, body, headers=()):
+            body = body.encode()
+            self.send_response(status)
+            for name, value in dict(headers).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "text/html; charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockSearchHandler
+
+
+def start_mock_search_server(config, host="127.0.0.1", port=0):
+    #Returns the running server; server.server_address has the actual port and
+    #server.RequestHandlerClass.counts the requests served and throttled
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def search_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/html/?q="
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="serve DuckDuckGo-style result pages with a rate limit")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--results", type=int, default=15, help="results per page")
+    parser.add_argument("--overlap", type=float, default=0.4, help="share of Google's results on the page")
+    parser.add_argument("--rate", type=float, default=5.0, help="requests per second served")
+    parser.add_argument("--burst", type=int, default=5, help="requests served back to back")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean seconds per response")
+    parser.add_argument("--throttle-status", type=int, choices=[202, 429, 503], default=429)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    config = MockSearchConfig(args.results, args.overlap, args.rate, args.burst, args.latency, args.throttle_status, args.seed)
+    server = start_mock_search_server(config, args.host, args.port)
+    print(f"Serving results on http://{args.host}:{server.server_address[1]}/html/?q=")
+    threading.Event().wait()
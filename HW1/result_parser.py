@@ -0,0 +1,129 @@
+from html.parser import HTMLParser
+
+#Engine.scrape without a BeautifulSoup tree: a stdlib HTMLParser that collects the URLs of the first
+#results (tags of the engine's selector and attributes) as the page streams through it and stops
+#parsing as soon as it has them, instead of building the whole page and searching it.
+#
+#bs4's html.parser tree builder sits on the same HTMLParser, so to give the same results this only
+#has to follow the tree it builds: a void element (br, img, ...) or a self-closing tag closes as
+#soon as it opens, and an end tag closes the most recent open tag of its name with every tag opened
+#after it, or nothing if no tag of that name is open. A result's URL is its href (an empty one
+#included) or the href of the first <a href> inside it; a result with neither is skipped, as in
+#Engine.scrape. Attribute values match as in find_all: a whole value, or for class and the other
+#whitespace-separated attributes also any one of its words. Only string (or True) attribute values
+#are supported.
+
+VOID_ELEMENTS = frozenset(["area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr",
+                           "image", "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid",
+                           "param", "source", "spacer", "track", "wbr"])
+#attributes bs4 splits into words, for every tag ("*") or some
+LIST_ATTRIBUTES = {"*": {"class", "accesskey", "dropzone"}, "a": {"rel", "rev"}, "link": {"rel", "rev"},
+                   "td": {"headers"}, "th": {"headers"}, "form": {"accept-charset"}, "object": {"archive"},
+                   "area": {"rel"}, "icon": {"sizes"}, "iframe": {"sandbox"}, "output": {"for"}}
+
+PENDING = object()  #a result still open with no link found yet
+SKIPPED = object()  #a result closed without a link
+
+
+class _Done(Exception):
+    pass
+
+
+def attribute_matches(tag, name, value, wanted):
+    if value is None:
+        return False
+    if wanted is True:
+        return True
+    if name in LIST_ATTRIBUTES["*"] or name in LIST_ATTRIBUTES.get(tag, ()):
+        words = value.split()
+        return wanted in words or " ".join(words) == wanted
+    return value == wanted
+
+
+class ResultParser(HTMLParser):
+
+    def __init__(self, selector, attrs, limit):
+        for value in attrs.values():
+            if value is not True and not isinstance(value, str):
+                raise ValueError(f"the stream parser only matches string attribute values, not {value!r}")
+        self.selector = selector
+        self.attrs = attrs
+        self.limit = limit
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.stack = []  #[tag, slot of the result it is or None] of every open tag
+        self.open = {}  #tag -> how many are open
+        self.slots = []  #per result in document order: its link, PENDING or SKIPPED
+        self.pending = []  #slots of the open results still waiting for an <a href>
+
+    def parse(self, html):
+        self.reset()
+        try:
+            self.feed(html)
+            self.close()
+        except _Done:
+            pass
+        return [slot for slot in self.slots if slot is not PENDING and slot is not SKIPPED][:self.limit]
+
+    def handle_starttag(self, tag, attrs):
+        self.start(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.start(tag, attrs)
+        self.handle_endtag(tag)
+
+    def start(self, tag, attrs):
+        #bs4 keeps the last value of an attribute given twice, and "" for one without a value
+        attributes = {name: "" if value is None else value for name, value in attrs}
+        href = attributes.get("href")
+        changed = False
+        if tag == "a" and href is not None and self.pending:
+            for slot in self.pending:
+                self.slots[slot] = href
+            self.pending.clear()
+            changed = True
+        slot = None
+        if tag == self.selector and all(attribute_matches(tag, name, attributes.get(name), wanted)
+                                        for name, wanted in self.attrs.items()):
+            slot = len(self.slots)
+            if href is not None:
+                self.slots.append(href)
+                changed = True
+            else:
+                self.slots.append(PENDING)
+                self.pending.append(slot)
+        self.stack.append([tag, slot])
+        self.open[tag] = self.open.get(tag, 0) + 1
+        if changed:
+            self.check()
+
+    def handle_endtag(self, tag):
+        if not self.open.get(tag):
+            return
+        changed = False
+        while True:
+            name, slot = self.stack.pop()
+            self.open[name] -= 1
+            if slot is not None and self.slots[slot] is PENDING:
+                self.slots[slot] = SKIPPED
+                self.pending.remove(slot)
+                changed = True
+            if name == tag:
+                break
+        if changed:
+            self.check()
+
+    def check(self):
+        #done once the first limit results that have a link are all known
+        found = 0
+        for slot in self.slots:
+            if slot is PENDING:
+                return
+            if slot is not SKIPPED:
+                found += 1
+                if found == self.limit:
+                    raise _Done
@@ -0,0 +1,144 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+#On-disk cache of search result pages for SearchEngine, in a sqlite file: for each engine and
+#normalized query (lower case, single spaces) the raw HTML (zlib compressed, so results can be
+#parsed again when the scraper changes) and the parsed top-10 URLs.
+#
+#Entries older than ttl seconds are misses and are deleted when the cache is opened; after that
+#the least recently used entries are deleted while the cache holds more than max_bytes. A cache
+#opened with ttl=None (replay) never expires anything.
+#
+#Snapshots are the results of one run of one engine, saved as
+#<directory>/<engine>-<YYYYmmddTHHMMSSffffff>.json, so the results of later runs can be compared with
+#them to see how the engine drifts.
+
+TTL = 7 * 24 * 3600
+MAX_BYTES = 64 * 2 ** 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    engine TEXT,
+    query_key TEXT,
+    query TEXT,
+    html BLOB,
+    results TEXT,
+    size INTEGER,
+    fetched REAL,
+    used REAL,
+    PRIMARY KEY (engine, query_key)
+)
+"""
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+class SearchCache:
+
+    def __init__(self, path, ttl=TTL, max_bytes=MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        #search_many's workers share the cache
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.evict()
+
+    def get(self, engine, query):
+        #The cached top-10 URLs, or None
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT results, fetched FROM responses WHERE engine = ? AND query_key = ?",
+                                  (engine, normalize_query(query))).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self.db:
+                self.db.execute("UPDATE responses SET used = ? WHERE engine = ? AND query_key = ?",
+                                (now, engine, normalize_query(query)))
+        return json.loads(row[0])
+
+    def get_html(self, engine, query):
+        with self.lock:
+            row = self.db.execute("SELECT html FROM responses WHERE engine = ? AND query_key = ?",
+                                  (engine, normalize_query(query))).fetchone()
+        return zlib.decompress(row[0]).decode() if row is not None else None
+
+    def html_pages(self, engine):
+        #(query, HTML) of every cached page of the engine
+        with self.lock:
+            rows = self.db.execute("SELECT query, html FROM responses WHERE engine = ? ORDER BY query_key",
+                                   (engine,)).fetchall()
+        return [(query, zlib.decompress(html).decode()) for query, html in rows]
+
+    def put(self, engine, query, html, results):
+        now = time.time()
+        compressed = zlib.compress(html.encode())
+        results = json.dumps(results)
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (engine, normalize_query(query), query, compressed, results,
+                             len(compressed) + len(results), now, now))
+        self.evict()
+
+    def size(self):
+        with self.lock:
+            return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def evict(self):
+        with self.lock, self.db:
+            if self.ttl is not None:
+                self.evicted += self.db.execute("DELETE FROM responses WHERE fetched < ?",
+                                                (time.time() - self.ttl,)).rowcount
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for engine, query_key, size in self.db.execute("SELECT engine, query_key, size FROM responses ORDER BY used"):
+                if total <= self.max_bytes:
+                    break
+                victims.append((engine, query_key))
+                total -= size
+            self.db.executemany("DELETE FROM responses WHERE engine = ? AND query_key = ?", victims)
+            self.evicted += len(victims)
+
+    def close(self):
+        self.db.close()
+
+
+def save_snapshot(directory, engine, results, search_url=None):
+    #Returns the path of the new snapshot
+    os.makedirs(directory, exist_ok=True)
+    created = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(directory, f"{engine}-{created}.json")
+    with open(path + ".tmp", "w") as file:
+        json.dump({"engine": engine, "created": created, "search_url": search_url, "results": results}, file, indent=1)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_snapshot(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def snapshots(directory, engine):
+    #Paths of the engine's snapshots, oldest first
+    return sorted(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(engine)}-*.json")))
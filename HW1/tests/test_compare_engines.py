@@ -0,0 +1,107 @@
+import json
+import sys
+
+import numpy as np
+import pytest
+
+import compare_engines
+from compare_engines import bootstrap, matrices, pairwise_metrics
+
+QUERIES = [f"query {q}" for q in range(5)]
+NAMES = ["a", "same", "reversed", "prefix"]
+
+
+def fixed_results():
+    #against "a": the same lists, the lists reversed, and the first q + 2 results of query q in the
+    #same order followed by other pages
+    results = {name: {} for name in NAMES}
+    for q, query in enumerate(QUERIES):
+        urls = [f"https://www.site{n}.com/{q}" for n in range(10)]
+        results["a"][query] = urls
+        results["same"][query] = [url.replace("https://www.", "http://") for url in urls]
+        results["reversed"][query] = urls[::-1]
+        results["prefix"][query] = urls[:q + 2] + [f"https://other{n}.com/{q}" for n in range(8 - q)]
+    return results
+
+
+def test_pairwise_metrics_of_known_lists():
+    pairs = pairwise_metrics(NAMES, fixed_results(), QUERIES, 10, 0.9)
+    assert sorted(pairs) == [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
+    for key in [(0, 1), (0, 2), (1, 2)]:
+        assert pairs[key]["percentage_overlap"].tolist() == [100.0] * len(QUERIES)
+    for key, expected in [((0, 1), 1.0), ((0, 2), -1.0), ((1, 2), -1.0), ((0, 3), 1.0)]:
+        assert pairs[key]["spearman"].tolist() == [expected] * len(QUERIES)
+        assert pairs[key]["kendall"].tolist() == [expected] * len(QUERIES)
+    assert pairs[0, 1]["rbo"] == pytest.approx([1.0] * len(QUERIES))
+    assert pairs[0, 3]["percentage_overlap"].tolist() == [20.0, 30.0, 40.0, 50.0, 60.0]
+    #result k of the q + 2 shared ones is at rank 9 - k in "reversed" and k in "prefix"; the
+    #assignment's Spearman takes the ranks in the lists, so it goes below -1
+    expected = []
+    for q in range(len(QUERIES)):
+        n = q + 2
+        expected.append(1 - 6 * sum((9 - 2 * k) ** 2 for k in range(n)) / (n * (n * n - 1)))
+    assert pairs[2, 3]["spearman"].tolist() == pytest.approx(expected)
+    assert expected[0] == -129.0
+    assert pairs[2, 3]["kendall"].tolist() == [-1.0] * len(QUERIES)
+
+
+def test_matrices_are_symmetric_with_the_means_inside_the_intervals():
+    names = NAMES
+    tables = matrices(names, pairwise_metrics(names, fixed_results(), QUERIES, 10, 0.9), 2000, 0.95, 0)
+    for metric in compare_engines.METRICS:
+        table = tables[metric]
+        for i in range(len(names)):
+            assert table["mean"][i][i] is None
+            for j in range(len(names)):
+                if i != j:
+                    for part in ("mean", "low", "high"):
+                        assert table[part][i][j] == table[part][j][i]
+                    assert table["low"][i][j] <= table["mean"][i][j] <= table["high"][i][j]
+    overlap = tables["percentage_overlap"]
+    assert overlap["mean"][0][3] == 40.0
+    assert 20.0 <= overlap["low"][0][3] < 40.0 < overlap["high"][0][3] <= 60.0
+    #a metric with the same value for every query has no spread
+    assert tables["spearman"]["low"][0][2] == tables["spearman"]["high"][0][2] == -1.0
+
+
+def test_bootstrap_is_seeded_resampling_of_the_queries(monkeypatch):
+    values = np.column_stack([np.arange(20.0), np.full(20, 3.0), np.arange(20.0) ** 2])
+    mean, low, high = bootstrap(values, 500, 0.9, seed=7)
+    #the same resamples drawn one at a time
+    rng = np.random.default_rng(7)
+    means = np.array([rng.multinomial(20, np.full(20, 1 / 20)) @ values / 20 for _ in range(500)])
+    assert mean.tolist() == values.mean(axis=0).tolist()
+    assert np.allclose(low, np.percentile(means, 5, axis=0))
+    assert np.allclose(high, np.percentile(means, 95, axis=0))
+    assert low[1] == high[1] == 3.0
+    #drawn in blocks of resamples, the same seed gives the same intervals
+    monkeypatch.setattr(compare_engines, "BOOTSTRAP_BLOCK", 20 * 7)
+    blocked = bootstrap(values, 500, 0.9, seed=7)
+    assert np.allclose(blocked[1], low) and np.allclose(blocked[2], high)
+    other = bootstrap(values, 500, 0.9, seed=8)
+    assert not np.allclose(other[1], low)
+
+
+def test_bootstrap_interval_width_is_the_standard_error():
+    rng = np.random.default_rng(0)
+    values = rng.normal(0.0, 1.0, (400, 1))
+    _, low, high = bootstrap(values, 4000, 0.95, seed=1)
+    standard_error = values.std() / np.sqrt(len(values))
+    assert (high - low)[0] == pytest.approx(2 * 1.96 * standard_error, rel=0.1)
+
+
+def test_main_writes_the_matrices_of_loaded_results(tmp_path, monkeypatch):
+    results = fixed_results()
+    (tmp_path / "queries.txt").write_text("\n".join(QUERIES) + "\n")
+    args = ["compare_engines.py", "--engines", ",".join(NAMES), "--queries", str(tmp_path / "queries.txt"),
+            "--resamples", "200", "--output", str(tmp_path / "matrices.json")]
+    for name in NAMES:
+        (tmp_path / f"{name}.json").write_text(json.dumps(results[name]))
+        args += ["--load", f"{name}={tmp_path / f'{name}.json'}"]
+    monkeypatch.setattr(sys, "argv", args)
+    compare_engines.main()
+    with open(tmp_path / "matrices.json") as f:
+        output = json.load(f)
+    assert output["engines"] == NAMES and output["coverage"] == {name: len(QUERIES) for name in NAMES}
+    assert output["metrics"]["spearman"]["mean"][0][2] == -1.0
+    assert output["metrics"]["percentage_overlap"]["mean"][3][0] == 40.0
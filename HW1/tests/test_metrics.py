@@ -0,0 +1,74 @@
+import random
+
+import numpy as np
+import pytest
+
+from benchmark_metrics import make_results, original_overlap_and_ranks
+from HW1 import calculate_overlap_and_ranks, calculate_spearman_coefficient, check_similar_results
+from metrics import compare_results, normalize_url, normalize_urls
+
+DEPTH = 10
+
+
+def random_results(rng, queries, depth):
+    #lists drawn from a small pool of pages written several ways, so they overlap and repeat URLs
+    forms = ["https://www.{}", "http://{}", "https://{}/", "www.{}/", "{}"]
+    pool = [f"site{n}.com/page" for n in range(3 * depth)]
+    results = {}
+    for q in range(queries):
+        size = rng.randrange(depth + 1)
+        results[f"query {q}"] = [rng.choice(forms).format(rng.choice(pool)) for _ in range(size)]
+    return results
+
+
+def brute_force(engine, baseline, depth, p):
+    #each metric from its definition, one query at a time
+    engine = [check_similar_results(url) for url in engine[:depth]]
+    baseline = [check_similar_results(url) for url in baseline[:depth]]
+    best = {}
+    for rank, url in enumerate(engine):
+        best.setdefault(url, rank)
+    pairs = []
+    for rank, url in enumerate(baseline):
+        if url in best and url not in {u for u, _, _ in pairs}:
+            pairs.append((url, rank, best[url]))
+    n = len(pairs)
+    if n == 0:
+        kendall = 0.0
+    elif n == 1:
+        kendall = float(pairs[0][1] == pairs[0][2])
+    else:
+        score = sum(np.sign(pairs[j][2] - pairs[i][2]) for i in range(n) for j in range(i + 1, n))
+        kendall = score / (n * (n - 1) / 2)
+    agreement = [len(set(baseline[:d]) & set(engine[:d])) / d for d in range(1, depth + 1)]
+    rbo = agreement[-1] * p ** depth + (1 - p) / p * sum(a * p ** d for d, a in enumerate(agreement, 1))
+    return n, kendall, rbo
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_metrics_match_dict_index_and_definitions(seed):
+    rng = random.Random(seed)
+    engine, baseline = random_results(rng, 200, DEPTH), random_results(rng, 200, DEPTH)
+    queries, metrics = compare_results(engine, baseline, DEPTH, 0.9)
+    data, _, _ = calculate_spearman_coefficient(calculate_overlap_and_ranks(engine, baseline))
+    assert list(metrics["overlap"]) == [d["overlapping_results"] for d in data]
+    assert np.allclose(metrics["spearman"], [d["spearman_coefficient"] for d in data])
+    for i, query in enumerate(queries):
+        overlap, kendall, rbo = brute_force(engine[query], baseline[query], DEPTH, 0.9)
+        assert metrics["overlap"][i] == overlap
+        assert metrics["kendall"][i] == pytest.approx(kendall)
+        assert metrics["rbo"][i] == pytest.approx(rbo)
+
+
+def test_dict_index_matches_original_loop():
+    #the benchmark's lists have no duplicates, where the original loop counted nothing twice
+    engine, google = make_results(50, 20, 0.4, 5000, 0)
+    assert calculate_overlap_and_ranks(engine, google) == original_overlap_and_ranks(engine, google)
+
+
+def test_normalize_urls_matches_normalize_url():
+    rng = random.Random(0)
+    parts = ["http://", "https://", "www.", "/", "x", "http", "s:", "w", ".", "\n"]
+    for _ in range(2000):
+        urls = ["".join(rng.choice(parts) for _ in range(rng.randrange(6))) for _ in range(rng.randrange(6))]
+        assert normalize_urls(urls) == [normalize_url(url) for url in urls]
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from engines import ENGINES, Engine
+from mock_search_server import MockSearchConfig
+from result_parser import ResultParser
+
+TAGS = ["a", "div", "li", "h2", "span", "p", "br", "img", "td", "ul"]
+CLASSES = ["result__a", "b_algo", "x", "result__a x", "x  result__a", "", None, "b_algo  y"]
+ENGINES_UNDER_TEST = [Engine("t1", "u", "a", {"class": "result__a"}), Engine("t2", "u", "li", {"class": "b_algo"}),
+                      Engine("t3", "u", "div", {"class": "x result__a"}), Engine("t4", "u", "a", {}),
+                      Engine("t5", "u", "h2", {"class": True}), Engine("t6", "u", "td", {"class": "b_algo y"})]
+
+
+def random_page(rng):
+    #tag soup: unclosed and stray end tags, void and self-closing tags, valueless and repeated
+    #attributes, markup inside scripts and comments
+    out = []
+    for _ in range(rng.randrange(5, 200)):
+        r = rng.random()
+        tag = rng.choice(TAGS)
+        if r < 0.45:
+            attrs = []
+            value = rng.choice(CLASSES)
+            if value is not None:
+                attrs.append(f'class="{value}"')
+            h = rng.random()
+            if h < 0.5:
+                attrs.append(f'href="https://s{rng.randrange(50)}.com/{rng.randrange(9)}?a=1&amp;b=2"')
+            elif h < 0.6:
+                attrs.append("href")
+            elif h < 0.65:
+                attrs.append('href="x" href="y"')
+            if rng.random() < 0.05:
+                attrs.append('CLASS="result__a"')
+            close = "/" if rng.random() < 0.08 else ""
+            out.append(f"<{tag.upper() if rng.random() < 0.05 else tag} {' '.join(attrs)}{close}>")
+        elif r < 0.8:
+            out.append(f"</{tag}>")
+        elif r < 0.85:
+            out.append("<script>var a = '<a href=\"no\" class=\"result__a\">';</script>")
+        elif r < 0.87:
+            out.append("<!-- <a class=result__a href=c> -->")
+        else:
+            out.append(rng.choice(["text", "&amp; more", "<", "x > y"]))
+    return "".join(out)
+
+
+def bs4_results(engine, html):
+    return Engine(engine.name, engine.search_url, engine.selector, engine.attrs, parser="bs4").parse(html)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_stream_parser_matches_bs4_on_tag_soup(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        page = random_page(rng)
+        for engine in ENGINES_UNDER_TEST:
+            assert engine.parse(page) == bs4_results(engine, page)
+            #an early exit after fewer results keeps their order
+            for limit in (1, 3):
+                assert ResultParser(engine.selector, engine.attrs, limit).parse(page) == bs4_results(engine, page)[:limit]
+
+
+def test_stream_parser_matches_bs4_on_mock_pages():
+    config = MockSearchConfig(results=30)
+    engine = ENGINES["duckduckgo"]
+    for n in range(20):
+        page = config.page(f"query number {n}")
+        assert engine.parse(page) == bs4_results(engine, page)
+        assert len(engine.parse(page)) == 10
+
+
+def test_unknown_parser_is_rejected():
+    with pytest.raises(ValueError):
+        Engine("t", "u", parser="lxml")
@@ -0,0 +1,58 @@
+import os
+from collections import Counter
+
+import pytest
+
+from engines import get_engine
+from HW1 import SearchEngine, describe_performance
+from mock_search_server import MockSearchConfig, search_url, start_mock_search_server
+
+QUERIES = [f"query number {n}" for n in range(24)]
+
+
+@pytest.fixture
+def server():
+    def start(**config):
+        server = start_mock_search_server(MockSearchConfig(latency=0.02, **config))
+        servers.append(server)
+        return server
+    servers = []
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_search_many_matches_serial_search(server):
+    url = search_url(server(rate=1000, burst=1000))
+    serial = {query: SearchEngine.search(query, sleep=False, search_url=url) for query in QUERIES}
+    assert all(len(results) == 10 for results in serial.values())
+    assert SearchEngine.search_many(QUERIES, workers=8, rate=50, burst=10, search_url=url) == serial
+
+
+@pytest.mark.parametrize("throttle_status", [429, 202])
+def test_search_many_backs_off_when_throttled(server, throttle_status):
+    #three times the server's rate: throttled requests are retried after Retry-After
+    expected = {query: SearchEngine.parse_results(MockSearchConfig().page(query)) for query in QUERIES}
+    mock = server(rate=10, burst=4, throttle_status=throttle_status)
+    stats = Counter()
+    results = SearchEngine.search_many(QUERIES, workers=8, rate=30, burst=4, search_url=search_url(mock),
+                                       stats=stats)
+    counts = mock.RequestHandlerClass.counts
+    assert results == expected
+    assert stats["failed"] == 0 and stats["throttled"] > 0
+    #every request the workers counted reached the server, and none was lost from the counts
+    assert counts["served"] == len(QUERIES)
+    assert stats["requests"] == counts["served"] + counts["throttled"]
+    assert stats["throttled"] == counts["throttled"] == stats["retries"]
+
+
+def test_description_names_the_compared_engine():
+    #the DuckDuckGo run's hw1.txt
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hw1.txt")) as f:
+        expected = f.read()
+    assert describe_performance("DuckDuckGo", 16.299999999999997, -5.290107142857142) == expected
+    description = describe_performance(get_engine("bing").title, 16.3, -5.29)
+    assert "DuckDuckGo" not in description
+    assert description.startswith("Baseline search engine: Google\nAssigned search engine for comparison: Bing\n")
+    assert description.count("Bing") == 4
+    assert "rank search results very differently" not in describe_performance("Bing", 16.3, 0.2)
@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import sys
+import types
+
+import pytest
+
+import HW1
+import search_cache
+from mock_search_server import MockSearchConfig, search_url, start_mock_search_server
+from search_cache import SearchCache, load_snapshot, save_snapshot, snapshots
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(search_cache, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SearchCache(path, ttl=60)
+    cache.put("duckduckgo", "Los  Angeles", "<html>la</html>", ["https://a/"])
+    clock.now += 59
+    #queries are matched lower case with single spaces
+    assert cache.get("duckduckgo", "los angeles") == ["https://a/"]
+    assert cache.get("bing", "los angeles") is None
+    clock.now += 2
+    assert cache.get("duckduckgo", "los angeles") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.close()
+    #deleted when the cache is opened again
+    cache = SearchCache(path, ttl=60)
+    assert len(cache) == 0 and cache.evicted == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = SearchCache(str(tmp_path / "cache.sqlite"), ttl=None)
+    for n in range(3):
+        clock.now += 1
+        cache.put("duckduckgo", f"query {n}", f"<html>{n}</html>", [f"https://{n}/"])
+    entry = cache.size() // 3
+    cache.max_bytes = 3 * entry
+    clock.now += 1
+    assert cache.get("duckduckgo", "query 0") == ["https://0/"]
+    clock.now += 1
+    cache.put("duckduckgo", "query 3", "<html>3</html>", ["https://3/"])
+    #query 1 was used least recently, query 0 was read after it
+    assert cache.get("duckduckgo", "query 1") is None
+    assert [cache.get("duckduckgo", f"query {n}") for n in (0, 2, 3)] == [["https://0/"], ["https://2/"], ["https://3/"]]
+    assert cache.evicted == 1 and cache.size() <= cache.max_bytes
+
+
+def test_replay_never_expires(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SearchCache(path, ttl=60)
+    cache.put("duckduckgo", "old query", "<html>old</html>", ["https://old/"])
+    cache.close()
+    clock.now += 365 * 24 * 3600
+    cache = SearchCache(path, ttl=None, max_bytes=float("inf"))
+    assert cache.get("duckduckgo", "old query") == ["https://old/"]
+    assert cache.get_html("duckduckgo", "old query") == "<html>old</html>"
+    assert cache.html_pages("duckduckgo") == [("old query", "<html>old</html>")]
+
+
+def test_snapshots_are_listed_oldest_first(tmp_path):
+    directory = str(tmp_path / "snapshots")
+    assert snapshots(directory, "duckduckgo") == []
+    paths = [save_snapshot(directory, "duckduckgo", {"q": [f"https://{n}/"]}, "https://duckduckgo.com/html/?q=")
+             for n in range(3)]
+    save_snapshot(directory, "bing", {"q": []})
+    #engine names that are glob patterns match only themselves
+    save_snapshot(directory, "127.0.0.1_8001", {"q": []})
+    assert snapshots(directory, "duckduckgo") == paths
+    assert len(snapshots(directory, "127.0.0.1_800[1]")) == 0
+    assert len(snapshots(directory, "127.0.0.1_8001")) == 1
+    snapshot = load_snapshot(paths[-1])
+    assert snapshot["engine"] == "duckduckgo" and snapshot["results"] == {"q": ["https://2/"]}
+    assert snapshot["search_url"] == "https://duckduckgo.com/html/?q="
+
+
+def run_main(monkeypatch, tmp_path, *args):
+    monkeypatch.setattr(sys, "argv", ["HW1.py", "--cache", str(tmp_path / "cache.sqlite"),
+                                      "--snapshot-dir", str(tmp_path / "snapshots"), *args])
+    HW1.main()
+    with open(HW1.OUTPUT_JSON) as f:
+        return json.load(f)
+
+
+def test_replay_and_reparse_make_no_requests(tmp_path, monkeypatch):
+    queries = [f"query number {n}" for n in range(6)]
+    (tmp_path / "queries.txt").write_text("\n".join(queries) + "\n")
+    (tmp_path / "google.json").write_text(json.dumps({query: [] for query in queries}))
+    for name, file in [("QUERIES_PATH", "queries.txt"), ("GOOGLE_JSON", "google.json"), ("OUTPUT_JSON", "hw1.json"),
+                       ("OUTPUT_CSV", "hw1.csv"), ("OUTPUT_TXT", "hw1.txt")]:
+        monkeypatch.setattr(HW1, name, str(tmp_path / file))
+    server = start_mock_search_server(MockSearchConfig(rate=1000, burst=1000, latency=0))
+    url = search_url(server)
+    try:
+        searched = run_main(monkeypatch, tmp_path, "--search-url", url, "--rate", "1000", "--burst", "1000")
+    finally:
+        server.shutdown()
+    assert server.RequestHandlerClass.counts["served"] == len(queries)
+    assert searched == {query: HW1.SearchEngine.parse_results(MockSearchConfig().page(query)) for query in queries}
+
+    #the server is down: every result comes from the cache
+    assert run_main(monkeypatch, tmp_path, "--search-url", url, "--replay") == searched
+    #the stored results are not used by --reparse, which scrapes the stored pages again
+    with sqlite3.connect(tmp_path / "cache.sqlite") as db:
+        db.execute("UPDATE responses SET results = '[\"https://stale/\"]'")
+    assert run_main(monkeypatch, tmp_path, "--search-url", url, "--replay") == {query: ["https://stale/"] for query in queries}
+    assert run_main(monkeypatch, tmp_path, "--search-url", url, "--replay", "--reparse") == searched
+    assert len(snapshots(str(tmp_path / "snapshots"), HW1.engine_name(url))) == 1
+
+    #a query missing from the cache stops the replay
+    (tmp_path / "queries.txt").write_text("\n".join(queries + ["not searched"]) + "\n")
+    with pytest.raises(SystemExit, match="1 queries are not in"):
+        run_main(monkeypatch, tmp_path, "--search-url", url, "--replay")
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import tempfile
+
+# Pages/sec and error rate of the spider against the multi-host stand-in (testing/multi_host_site.py)
+# with the fixed CONCURRENT_REQUESTS = 7, with a fixed 64, and with AdaptiveConcurrencyMiddleware
+# under a global cap of 64. Pages/sec counts 200 responses; the error rate is the share of
+# responses that were 429 or 5xx.
+#
+#   python benchmarks/benchmark_adaptive_concurrency.py [--pages 1500]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from testing.mock_crawl import run_crawl_process
+from testing.multi_host_site import DEFAULT_HOSTS, start_multi_host_site
+
+CONFIGURATIONS = {
+    "fixed 7": {},
+    "fixed 64": {"CONCURRENT_REQUESTS": 64, "CONCURRENT_REQUESTS_PER_DOMAIN": 64},
+    "adaptive": {"ADAPTIVE_CONCURRENCY_ENABLED": True, "CONCURRENT_REQUESTS": 64,
+                 "SCHEDULER_PRIORITY_QUEUE": "scrapy_crawler.pqueues.HostLoadPriorityQueue",
+                 "DOWNLOADER": "scrapy_crawler.downloader.SlotLimitedDownloader"},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fixed against adaptive per-host concurrency")
+    parser.add_argument("--pages", type=int, default=1500, help="CLOSESPIDER_PAGECOUNT per crawl")
+    parser.add_argument("--configurations", nargs="+", choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS))
+    args = parser.parse_args()
+
+    servers = start_multi_host_site(pages=args.pages)
+    port = servers[0].server_address[1]
+    hosts = [config["host"] for config in DEFAULT_HOSTS]
+    start_url = f"http://{hosts[0]}:{port}/"
+
+    print(f"{'configuration':<14}{'responses':>10}{'ok pages':>10}{'seconds':>9}{'pages/s':>9}{'error rate':>12}")
+    for name in args.configurations:
+        with tempfile.TemporaryDirectory() as run_dir:
+            stats = run_crawl_process(start_url, run_dir, args.pages, CONFIGURATIONS[name], hosts)
+        responses = stats.get("downloader/response_count", 0)
+        ok = stats.get("downloader/response_status_count/200", 0)
+        errors = sum(count for key, count in stats.items()
+                     if key.startswith("downloader/response_status_count/")
+                     and (key.endswith("/429") or key.rsplit("/", 1)[1].startswith("5")))
+        seconds = stats["elapsed_time_seconds"]
+        print(f"{name:<14}{responses:>10}{ok:>10}{seconds:>9.2f}{ok / seconds:>9.1f}{errors / max(responses, 1):>12.2%}")
+        for host in hosts:
+            prefix = f"adaptive_concurrency/{host}/"
+            if prefix + "concurrency" in stats:
+                print(f"    {host}: concurrency {stats[prefix + 'concurrency']}, delay {stats[prefix + 'delay']} s, "
+                      f"latency {stats.get(prefix + 'latency', 0) * 1000:.0f} ms, "
+                      f"error rate {stats[prefix + 'error_rate']:.2%}")
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Reproducible crawl benchmark: the latimes spider (with the synthetic site as its domain)
+# against a local synthetic news site (testing/synthetic_site.py), reporting pages/sec, CPU per
+# page, peak memory and the crawl log writer's CPU per page. The site options are those of
+# synthetic_site.py; --set passes Scrapy settings as in testing/mock_crawl.py.
+#
+#   python benchmarks/benchmark_crawl.py [--pages 1000] [--latency 0.01] [--repeat 3] \
+#       [--set CONCURRENT_REQUESTS=16] [--output results.json] [--compare baseline.json]
+#
+# --output writes the site, settings, every run and the medians as JSON, with the git commit,
+# so results can be kept per change; --compare prints the change of every median against such
+# a file and exits with status 1 if one is worse by more than --tolerance.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from testing.mock_crawl import parse_setting, run_crawl_process
+from testing.synthetic_site import add_site_args, site_config_from_args, start_synthetic_site
+
+# metric -> True if higher is better
+METRICS = {
+    "pages_per_second": True,
+    "cpu_ms_per_page": False,
+    "peak_rss_mb": False,
+    "log_write_cpu_ms_per_page": False,
+}
+
+
+def run_metrics(stats, run_dir, elapsed):
+    pages = stats.get("response_received_count", 0)
+    log_bytes = sum(os.path.getsize(os.path.join(run_dir, name)) for name in os.listdir(run_dir) if name.endswith(".csv"))
+    statuses = {key.rsplit("/", 1)[1]: value for key, value in stats.items()
+                if key.startswith("downloader/response_status_count/")}
+    return {
+        "pages": pages,
+        "seconds": stats.get("elapsed_time_seconds", elapsed),
+        "pages_per_second": pages / stats.get("elapsed_time_seconds", elapsed),
+        "cpu_ms_per_page": stats["process/cpu_seconds"] * 1000 / max(pages, 1),
+        "peak_rss_mb": stats["process/max_rss_bytes"] / 2 ** 20,
+        "log_write_cpu_ms_per_page": stats.get("csv_log/write_cpu_seconds", 0) * 1000 / max(pages, 1),
+        "log_rows": stats.get("csv_log/rows", 0),
+        "log_bytes": log_bytes,
+        "response_bytes": stats.get("downloader/response_bytes", 0),
+        "statuses": statuses,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(medians, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["median"]
+    regressions = []
+    print(f"\n{'metric':<28}{'baseline':>12}{'now':>12}{'change':>10}")
+    for name, higher_is_better in METRICS.items():
+        before, now = baseline[name], medians[name]
+        change = (now - before) / before if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<28}{before:>12.3f}{now:>12.3f}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="crawl benchmark against a synthetic news site")
+    add_site_args(parser)
+    parser.add_argument("--max-pages", type=int, default=None, help="CLOSESPIDER_PAGECOUNT (default: the whole site)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--set", action="append", default=[], type=parse_setting, help="NAME=VALUE Scrapy setting")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    config = site_config_from_args(args)
+    settings = dict(args.set)
+    server = start_synthetic_site(config)
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    runs = []
+    print(f"{'run':<7}{'pages':>7}{'pages/s':>9}{'CPU ms/page':>13}{'peak MB':>9}{'log ms/page':>13}")
+    for run in range(args.repeat):
+        with tempfile.TemporaryDirectory() as run_dir:
+            start = time.perf_counter()
+            stats = run_crawl_process(start_url, run_dir, args.max_pages, settings)
+            metrics = run_metrics(stats, run_dir, time.perf_counter() - start)
+        runs.append(metrics)
+        print(f"{run + 1:<7}{metrics['pages']:>7}{metrics['pages_per_second']:>9.1f}{metrics['cpu_ms_per_page']:>13.2f}"
+              f"{metrics['peak_rss_mb']:>9.1f}{metrics['log_write_cpu_ms_per_page']:>13.3f}")
+    server.shutdown()
+
+    medians = {name: statistics.median(run[name] for run in runs) for name in METRICS}
+    medians["pages"] = statistics.median(run["pages"] for run in runs)
+    print(f"{'median':<7}{medians['pages']:>7.0f}{medians['pages_per_second']:>9.1f}{medians['cpu_ms_per_page']:>13.2f}"
+          f"{medians['peak_rss_mb']:>9.1f}{medians['log_write_cpu_ms_per_page']:>13.3f}")
+
+    results = {
+        "benchmark": "crawl",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "site": config.as_dict(),
+        "max_pages": args.max_pages,
+        "settings": settings,
+        "runs": runs,
+        "median": medians,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved as {args.output}")
+    if args.compare:
+        regressions = compare(medians, args.compare, args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Per-page CPU time of link extraction: the old two passes (the rule's LinkExtractor, then
+# response.css("a::attr(href)"), response.urljoin and urlparse in parse_item) against one
+# SinglePassLinkExtractor pass with HostClassifier. Both must give the same links to follow
+# (URL, text, nofollow) and the same outlink log rows.
+#
+# Fixtures are saved latimes pages in --fixtures, one file per page named after its quoted URL:
+#
+#   scrapy fetch --nolog https://www.latimes.com/ > "benchmarks/fixtures/latimes/$(python -c \
+#       'from urllib.parse import quote; print(quote("https://www.latimes.com/", safe=""))').html"
+#
+# Without saved pages, --generate N writes N pages shaped like the crawled ones to a temporary
+# directory instead (see testing/latimes_pages.py).
+#
+#   python benchmarks/benchmark_link_extraction.py [--fixtures DIR] [--generate 20] [--repeat 5]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse
+from scrapy.linkextractors import LinkExtractor
+from scrapy_crawler.linkextractors import HostClassifier, SinglePassLinkExtractor
+from scrapy_crawler.spiders.news import latimesSpider
+from testing.latimes_pages import EXTRACTOR_ARGS, generate_fixtures, load_fixtures, single_pass, two_passes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="per-page CPU time of link extraction")
+    parser.add_argument("--fixtures", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "latimes"))
+    parser.add_argument("--generate", type=int, default=20, help="pages to generate when --fixtures has none")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"no saved pages in {args.fixtures}, generating {args.generate}")
+        with tempfile.TemporaryDirectory() as directory:
+            generate_fixtures(directory, args.generate)
+            fixtures = load_fixtures(directory)
+    base_domain = latimesSpider.base_domain
+    classify_host = HostClassifier(base_domain)
+    old_extractor = LinkExtractor(**EXTRACTOR_ARGS)
+
+    # DOM parsing is the same in both, so it is timed separately
+    ok = True
+    parse_time = old_time = new_time = 0.0
+    for url, body in fixtures:
+        for _ in range(args.repeat):
+            old_response = HtmlResponse(url, body=body, encoding="utf-8")
+            new_response = HtmlResponse(url, body=body, encoding="utf-8")
+            start = time.process_time()
+            old_response.selector, new_response.selector
+            parse_time += (time.process_time() - start) / 2
+            start = time.process_time()
+            old = two_passes(old_response, old_extractor, base_domain)
+            old_time += time.process_time() - start
+            start = time.process_time()
+            new = single_pass(new_response, SinglePassLinkExtractor(**EXTRACTOR_ARGS), classify_host)
+            new_time += time.process_time() - start
+        old_links = [(link.url, link.text, link.nofollow) for link in old[0]]
+        new_links = [(link.url, link.text, link.nofollow) for link in new[0]]
+        if old_links != new_links or old[1] != new[1]:
+            ok = False
+            print(f"MISMATCH {url}: {len(old_links)}/{len(new_links)} links, {len(old[1])}/{len(new[1])} outlink rows")
+
+    runs = len(fixtures) * args.repeat
+    size = sum(len(body) for _, body in fixtures) / len(fixtures)
+    print(f"{len(fixtures)} pages, {size / 1000:.0f} KB and {len(old[1])} outlinks for the last one")
+    print(f"DOM parsing:  {parse_time / runs * 1000:7.2f} ms per page (both)")
+    print(f"two passes:   {old_time / runs * 1000:7.2f} ms per page")
+    print(f"single pass:  {new_time / runs * 1000:7.2f} ms per page ({old_time / new_time:.1f}x)")
+    print("same links and outlink rows:", "yes" if ok else "NO")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
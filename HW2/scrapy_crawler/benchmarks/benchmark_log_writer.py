@@ -0,0 +1,88 @@
+import argparse
+import csv
+import os
+import sys
+import tempfile
+
+# Pages/sec of the latimes spider against the local mock site with the old per-record writer
+# (one open()/close() per row, unquoted) and with ScrapyCrawlerPipeline in its legacy and csv
+# formats.
+#
+#   python benchmarks/benchmark_log_writer.py [--pages 2000] [--links 200]
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from testing.mock_crawl import run_crawl_process
+from testing.mock_site import start_mock_site
+
+MODES = ["per-record", "legacy", "csv"]
+
+
+class PerRecordWriterPipeline:
+    # The writer the spider used before the pipeline: the files are reopened for every row
+
+    def open_spider(self, spider):
+        from scrapy_crawler.pipelines import ScrapyCrawlerPipeline
+        from scrapy_crawler.items import FetchItem, UrlsItem, VisitItem
+        self.paths = {FetchItem: spider.fetch_file, VisitItem: spider.visit_file, UrlsItem: spider.urls_file}
+        for item_class, path in self.paths.items():
+            with open(path, "w") as f:
+                f.write(",".join(ScrapyCrawlerPipeline.headers[item_class]) + "\n")
+
+    def process_item(self, item, spider):
+        from scrapy_crawler.items import FetchItem, UrlsItem, VisitItem
+        path = self.paths[type(item)]
+        if isinstance(item, FetchItem):
+            with open(path, "a") as f:
+                f.write(f"{item['url']},{item['status']}\n")
+        elif isinstance(item, VisitItem):
+            with open(path, "a") as f:
+                f.write(f"{item['url']},{item['size']:.2f},{item['outlinks']},{item['content_type']}\n")
+        else:
+            for url, indicator in item["urls"]:
+                with open(path, "a") as f:
+                    f.write(f"{url},{indicator}\n")
+        return item
+
+
+def check_urls_file(path):
+    # (rows, rows that do not parse back into exactly two fields)
+    rows = 0
+    malformed = 0
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            rows += 1
+            malformed += len(row) != 2
+    return rows, malformed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pages/sec of the crawl log writers against a mock site")
+    parser.add_argument("--pages", type=int, default=2000, help="CLOSESPIDER_PAGECOUNT per crawl")
+    parser.add_argument("--links", type=int, default=200, help="outlinks per mock page")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    server = start_mock_site(pages=args.pages * 2, links=args.links)
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    print(f"{'writer':<12}{'pages':>7}{'seconds':>9}{'pages/s':>9}{'url rows':>10}{'malformed':>11}")
+    for mode in args.modes:
+        if mode == "per-record":
+            settings = {"ITEM_PIPELINES": {"benchmark_log_writer.PerRecordWriterPipeline": 300}}
+        else:
+            settings = {"CSV_LOG_FORMAT": mode}
+        with tempfile.TemporaryDirectory() as run_dir:
+            stats = run_crawl_process(start_url, run_dir, args.pages, settings, python_path=[BENCHMARK_DIR])
+            rows, malformed = check_urls_file(os.path.join(run_dir, "urls_latimes.csv"))
+        pages = stats.get("response_received_count", 0)
+        seconds = stats["elapsed_time_seconds"]
+        print(f"{mode:<12}{pages:>7}{seconds:>9.2f}{pages / seconds:>9.1f}{rows:>10}{malformed:>11}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
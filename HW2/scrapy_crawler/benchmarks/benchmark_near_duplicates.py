@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Near-duplicate detection (scrapy_crawler/neardup.py):
+#
+# 1. SimHash fingerprints per second on mock site pages, and lookups in the permuted-table
+#    index against a linear scan of all fingerprints (the results must agree)
+# 2. the mock site crawled with detection off, flagging only, and skipping the outlinks of
+#    near-duplicates: pages fetched, bytes downloaded, pages flagged and fetches avoided. On the
+#    mock site the only near-duplicates are the ",section" listing pages, so a flagged page and
+#    the page it is flagged as a near-duplicate of must both be listing pages.
+#
+#   python benchmarks/benchmark_near_duplicates.py [--pages 400] [--links 50] [--fingerprints 100000]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy_crawler.neardup import SimHashIndex, hamming, page_fingerprint
+from testing.mock_crawl import read_log, run_crawl_process
+from testing.mock_site import page_body, start_mock_site
+
+MODES = {
+    "off": {},
+    "flag": {"NEAR_DUPLICATE_ENABLED": True},
+    "skip outlinks": {"NEAR_DUPLICATE_ENABLED": True, "NEAR_DUPLICATE_SKIP_OUTLINKS": True},
+}
+
+
+def benchmark_fingerprints(pages, size):
+    bodies = [page_body(n, pages, 50, size) for n in range(pages)]
+    start = time.perf_counter()
+    for body in bodies:
+        page_fingerprint(body)
+    seconds = time.perf_counter() - start
+    print(f"SimHash of {pages} pages of {size} bytes: {pages / seconds:.0f} pages/s")
+
+
+def benchmark_index(n, distance, queries=1000):
+    rng = random.Random(0)
+    fingerprints = [rng.getrandbits(64) for _ in range(n)]
+    index = SimHashIndex(distance)
+    for i, fingerprint in enumerate(fingerprints):
+        index.add(fingerprint, i)
+    # half near an indexed fingerprint, half random (no match)
+    lookups = []
+    for i in range(queries):
+        fingerprint = rng.getrandbits(64)
+        if i % 2 == 0:
+            fingerprint = fingerprints[rng.randrange(n)]
+            for bit in rng.sample(range(64), rng.randrange(distance + 1)):
+                fingerprint ^= 1 << bit
+        lookups.append(fingerprint)
+
+    start = time.perf_counter()
+    found = [index.nearest(fingerprint) for fingerprint in lookups]
+    index_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scanned = []
+    for fingerprint in lookups[:100]:
+        distances = [hamming(fingerprint, other) for other in fingerprints]
+        best = min(range(n), key=distances.__getitem__)
+        scanned.append((best, distances[best]) if distances[best] <= distance else None)
+    scan_seconds = (time.perf_counter() - start) * len(lookups) / 100
+    agree = [(match[1] if match else None) for match in found[:100]] == [(match[1] if match else None) for match in scanned]
+    print(f"{n} fingerprints, distance {distance}: index {len(lookups) / index_seconds:.0f} lookups/s, "
+          f"linear scan {len(lookups) / scan_seconds:.1f} lookups/s; same results: {'yes' if agree else 'NO'}")
+    return agree
+
+
+def flagged_rows(run_dir):
+    return [(row[0], row[4]) for row in read_log(run_dir, "visit")[1:] if len(row) > 4 and row[4]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="near-duplicate detection: fingerprint, index and crawl benchmarks")
+    parser.add_argument("--pages", type=int, default=400, help="stories on the mock site")
+    parser.add_argument("--links", type=int, default=50, help="outlinks per mock page")
+    parser.add_argument("--size", type=int, default=20000, help="approximate page size in bytes")
+    parser.add_argument("--fingerprints", type=int, default=100000, help="fingerprints in the index benchmark")
+    parser.add_argument("--distance", type=int, default=3)
+    args = parser.parse_args()
+
+    benchmark_fingerprints(min(args.pages, 200), args.size)
+    ok = benchmark_index(args.fingerprints, args.distance)
+
+    server = start_mock_site(pages=args.pages, links=args.links, size=args.size)
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    print(f"\n{'mode':<15}{'pages':>7}{'MB':>8}{'flagged':>9}{'not followed':>14}{'avoided':>9}")
+    for name, settings in MODES.items():
+        with tempfile.TemporaryDirectory() as run_dir:
+            stats = run_crawl_process(start_url, run_dir, None, dict(settings, NEAR_DUPLICATE_DISTANCE=args.distance))
+            flagged = flagged_rows(run_dir) if settings else []
+        print(f"{name:<15}{stats.get('response_received_count', 0):>7}"
+              f"{stats.get('downloader/response_bytes', 0) / 1e6:>8.1f}{stats.get('near_duplicates/pages', 0):>9}"
+              f"{stats.get('near_duplicates/outlinks_skipped', 0):>14}{stats.get('near_duplicates/fetches_avoided', 0):>9}")
+        wrong = [(url, original) for url, original in flagged if ",section" not in url or ",section" not in original]
+        if wrong:
+            ok = False
+            print(f"    {len(wrong)} pages wrongly flagged as near-duplicates, e.g. {wrong[0]}")
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import tempfile
+
+# Re-crawl mode (RECRAWL_ENABLED) against a full crawl of the synthetic site as it changes: one
+# crawl builds the re-crawl state, then the site moves on an epoch at a time (the section fronts
+# change in every epoch, other pages in --change-ratio of them) and each epoch is crawled both
+# from scratch and as a re-crawl. Reported per epoch: bytes downloaded, 304 responses, pages not
+# requested, and the changed pages the re-crawl found out of those that changed.
+#
+# --min-change-rate is RECRAWL_MIN_CHANGE_RATE; its default here is higher than the setting's so
+# that pages start to be left out within a few epochs.
+#
+#   python benchmarks/benchmark_recrawl.py [--pages 500] [--epochs 6] [--min-change-rate 0.2]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from testing.mock_crawl import run_crawl_process
+from testing.synthetic_site import SiteConfig, start_synthetic_site
+
+
+def main():
+    parser = argparse.ArgumentParser(description="re-crawl mode against full crawls of a changing site")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--links", type=int, default=30)
+    parser.add_argument("--size", type=int, default=30000)
+    parser.add_argument("--epochs", type=int, default=6)
+    parser.add_argument("--fronts", type=int, default=10)
+    parser.add_argument("--change-ratio", type=float, default=0.05)
+    parser.add_argument("--min-change-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    config = SiteConfig(pages=args.pages, links=args.links, size=args.size, image_ratio=0.0, fronts=args.fronts,
+                        change_ratio=args.change_ratio)
+    server = start_synthetic_site(config)
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    print(f"{'epoch':<7}{'changed':>8}{'full MB':>9}{'re-crawl MB':>13}{'saved':>8}{'304s':>7}{'skipped':>9}{'found':>7}")
+    ok = True
+    with tempfile.TemporaryDirectory() as state_dir:
+        recrawl = {"RECRAWL_ENABLED": True, "RECRAWL_STATE": os.path.join(state_dir, "recrawl.sqlite"),
+                   "RECRAWL_MIN_CHANGE_RATE": args.min_change_rate}
+        with tempfile.TemporaryDirectory() as run_dir:
+            run_crawl_process(start_url, run_dir, None, recrawl)
+        for epoch in range(1, args.epochs + 1):
+            config.epoch = epoch
+            # pages served with status 200 whose text changed in this epoch
+            changed = sum(1 for n in range(args.pages) if config.status(n)[0] == 200 and config.version(n) == epoch)
+            with tempfile.TemporaryDirectory() as run_dir:
+                full = run_crawl_process(start_url, run_dir, None)
+            with tempfile.TemporaryDirectory() as run_dir:
+                stats = run_crawl_process(start_url, run_dir, None, recrawl)
+            full_bytes = full.get("downloader/response_bytes", 0)
+            recrawl_bytes = stats.get("downloader/response_bytes", 0)
+            found = stats.get("recrawl/changed", 0)
+            if found > changed:
+                ok = False
+            print(f"{epoch:<7}{changed:>8}{full_bytes / 1e6:>9.2f}{recrawl_bytes / 1e6:>13.2f}"
+                  f"{1 - recrawl_bytes / full_bytes:>8.0%}{stats.get('recrawl/not_modified', 0):>7}"
+                  f"{stats.get('recrawl/skipped', 0):>9}{found:>7}")
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
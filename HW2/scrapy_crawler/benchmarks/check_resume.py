@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import tempfile
+
+# Resume check for the JOBDIR crawl state (Bloom dupefilter, Scrapy's disk frontier, CSV logs
+# and report counters): the mock site is crawled once without interruption, then again with a
+# JOBDIR in several runs that each stop after --stop-after pages. The resumed crawl must fetch
+# every page the uninterrupted one fetched, none of them twice, and end with the same report.
+#
+#   python benchmarks/check_resume.py [--pages 300] [--stop-after 100]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy_crawler.dupefilters import BloomFilter
+from testing.mock_crawl import fetched_urls, read_report, run_crawl_process
+from testing.mock_site import start_mock_site
+
+
+def memory_per_url(n=100000):
+    # bytes per seen request: Bloom filter at its capacity against a set of 20-byte fingerprints
+    import hashlib
+    fingerprints = {hashlib.sha1(str(i).encode()).digest() for i in range(n)}
+    set_bytes = sys.getsizeof(fingerprints) + sum(sys.getsizeof(fp) for fp in fingerprints)
+    bloom = BloomFilter(n, 0.0001)
+    return set_bytes / n, bloom.size_bytes / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check that a stopped JOBDIR crawl resumes without refetching")
+    parser.add_argument("--pages", type=int, default=300, help="pages on the mock site")
+    parser.add_argument("--links", type=int, default=20, help="outlinks per mock page")
+    parser.add_argument("--stop-after", type=int, default=100, help="CLOSESPIDER_PAGECOUNT of each resumed run")
+    args = parser.parse_args()
+
+    server = start_mock_site(pages=args.pages, links=args.links, size=2000)
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    hits = server.RequestHandlerClass.hits
+    ok = True
+    with tempfile.TemporaryDirectory() as full_dir, tempfile.TemporaryDirectory() as resumed_dir:
+        run_crawl_process(start_url, full_dir)
+        _, expected = fetched_urls(full_dir)
+        print(f"uninterrupted crawl: {len(expected)} pages")
+
+        hits.clear()
+        jobdir = os.path.join(resumed_dir, "job")
+        runs = 0
+        while True:
+            runs += 1
+            stats = run_crawl_process(start_url, resumed_dir, args.stop_after, {"JOBDIR": jobdir})
+            print(f"run {runs}: {stats.get('response_received_count', 0)} pages, finish reason "
+                  f"{stats['finish_reason']}, {stats.get('dupefilter/bloom_requests', 0)} requests in the "
+                  f"Bloom filter ({stats.get('dupefilter/bloom_bytes', 0)} bytes)")
+            if stats["finish_reason"] != "closespider_pagecount" or runs > args.pages:
+                break
+
+        header, urls = fetched_urls(resumed_dir)
+        refetched = sorted(path for path, count in hits.items() if count > 1)
+        checks = [
+            ("stopped and resumed at least once", runs > 1),
+            ("CSV header written once", "URL" not in urls),
+            ("no page requested twice", not refetched),
+            ("no duplicate fetch rows", len(urls) == len(set(urls))),
+            ("same pages as the uninterrupted crawl", set(urls) == set(expected)),
+            ("same crawl report", read_report(resumed_dir) == read_report(full_dir)),
+        ]
+        for name, passed in checks:
+            print(f"{'ok  ' if passed else 'FAIL'} {name}")
+            ok = ok and passed
+        if refetched:
+            print("refetched:", ", ".join(refetched[:10]))
+
+    set_bytes, bloom_bytes = memory_per_url()
+    print(f"memory per seen request: {set_bytes:.1f} bytes in a set of fingerprints, "
+          f"{bloom_bytes:.1f} bytes in the Bloom filter (false positive rate 0.0001)")
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# Incremental counters for the crawl report, updated as pages are parsed so that the report
+# can be written (or looked at) at any time without re-reading the CSV logs.
+#
+# Unique URL counts use an exact set by default; with CRAWL_STATS_UNIQUE = "hll" they use
+# HyperLogLog sketches with 2**CRAWL_STATS_HLL_PRECISION one-byte registers each
+# (about 1.04 / sqrt(2**precision) relative error, 0.8% at the default precision of 14).
+
+import hashlib
+import json
+import math
+import os
+import pickle
+from collections import Counter
+
+# Major HTTP Status Code Descriptions
+STATUS_CODE_DESCRIPTIONS = {
+    200: "OK",
+    201: "Created",
+    204: "No Content",
+    301: "Moved Permanently",
+    302: "Found (Moved Temporarily)",
+    304: "Not Modified",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+# (label, upper bound in bytes), checked in order
+SIZE_BUCKETS = [
+    ("< 1 KB", 1024),
+    ("1 KB - 10 KB", 10 * 1024),
+    ("10 KB - 100 KB", 100 * 1024),
+    ("100 KB - 1 MB", 1024 * 1024),
+    ("> 1 MB", math.inf),
+]
+
+
+class ExactSet:
+
+    def __init__(self):
+        self.values = set()
+
+    def add(self, value):
+        self.values.add(value)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class HyperLogLog:
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, value):
+        # 64-bit hash: the first `precision` bits pick the register, the rest give the rank
+        h = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rank = rest_bits - (h & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def __len__(self):
+        estimate = self.alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # small-range correction (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class CrawlStats:
+
+    def __init__(self, unique="exact", precision=14):
+        if unique not in ("exact", "hll"):
+            raise ValueError(f"CRAWL_STATS_UNIQUE must be 'exact' or 'hll', not {unique!r}")
+        new_set = ExactSet if unique == "exact" else lambda: HyperLogLog(precision)
+        self.unique = unique
+        self.fetches = 0
+        self.status_codes = Counter()
+        self.sizes = Counter()
+        self.content_types = Counter()
+        self.total_extracted = 0
+        self.unique_urls = new_set()
+        self.unique_internal = new_set()
+        self.unique_external = new_set()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get("CRAWL_STATS_UNIQUE", "exact"), settings.getint("CRAWL_STATS_HLL_PRECISION", 14))
+
+    def record_fetch(self, status):
+        self.fetches += 1
+        self.status_codes[status] += 1
+
+    def record_visit(self, size, content_type):
+        for label, limit in SIZE_BUCKETS:
+            if size < limit:
+                self.sizes[label] += 1
+                break
+        self.content_types[content_type] += 1
+
+    def record_urls(self, urls):
+        # urls: [(url, "OK" or "N_OK"), ...] as written to the urls CSV file
+        self.total_extracted += len(urls)
+        for url, indicator in urls:
+            self.unique_urls.add(url)
+            if indicator == "OK":
+                self.unique_internal.add(url)
+            else:
+                self.unique_external.add(url)
+
+    def snapshot(self):
+        # A 304 (a re-crawl's unchanged page) is neither a success nor a failure
+        succeeded = sum(count for status, count in self.status_codes.items() if 200 <= status <= 299)
+        not_modified = self.status_codes[304]
+        return {
+            "fetches_attempted": self.fetches,
+            "fetches_succeeded": succeeded,
+            "fetches_not_modified": not_modified,
+            "fetches_failed": self.fetches - succeeded - not_modified,
+            "total_urls_extracted": self.total_extracted,
+            "unique_urls_extracted": len(self.unique_urls),
+            "unique_urls_internal": len(self.unique_internal),
+            "unique_urls_external": len(self.unique_external),
+            "unique_counting": self.unique,
+            "status_codes": dict(sorted(self.status_codes.items())),
+            "file_sizes": {label: self.sizes[label] for label, _ in SIZE_BUCKETS},
+            "content_types": dict(self.content_types.most_common()),
+        }
+
+    def save(self, path):
+        # Lets a crawl resumed from a JOBDIR report on all of its runs
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def write_snapshot(self, path):
+        # Replaced atomically, so readers never see a half-written file
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def report(self):
+        # The statistics sections of the crawl report; cost does not depend on the crawl size
+        s = self.snapshot()
+        lines = [
+            "Fetch Statistics", "================",
+            f"# Fetches attempted: {s['fetches_attempted']}",
+            f"# Fetches succeeded: {s['fetches_succeeded']}",
+        ]
+        if s["fetches_not_modified"]:
+            lines.append(f"# Fetches not modified (304): {s['fetches_not_modified']}")
+        lines += [
+            f"# Fetches failed or aborted: {s['fetches_failed']}",
+            "",
+            "Outgoing URLs:", "================",
+            f"Total URLs extracted: {s['total_urls_extracted']}",
+            f"# Unique URLs extracted: {s['unique_urls_extracted']}",
+            f"# Unique URLs within News Site: {s['unique_urls_internal']}",
+            f"# Unique URLs outside News Site: {s['unique_urls_external']}",
+            "",
+            "Status Codes:", "================",
+        ]
+        lines += [f"{code} {STATUS_CODE_DESCRIPTIONS.get(code, '')}: {count}" for code, count in s["status_codes"].items()]
+        lines += ["", "File Sizes:", "================"]
+        lines += [f"{label}: {count}" for label, count in s["file_sizes"].items()]
+        lines += ["", "Content Types:", "================"]
+        lines += [f"{ctype}: {count}" for ctype, count in s["content_types"].items()]
+        return "\n".join(lines) + "\n\n"
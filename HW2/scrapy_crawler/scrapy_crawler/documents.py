@@ -0,0 +1,158 @@
+# Crawled documents for the HW3 indexers.
+#
+# main_text() is the readable text of an HTML page: the <article> elements if the page has
+# any, else <main>, else <body>, without scripts, styles, navigation, headers, footers, asides
+# and forms, on one line with whitespace collapsed.
+#
+# ShardWriter streams "docID\tcontent" lines, the input of MRUnigramIndex, MRBigramIndex,
+# local_indexer.py and segments.py, into gzip shards of about max_bytes (uncompressed) each.
+# A shard is written as NAME.part and renamed when it is full; only then is it listed in
+# manifest.json, which is replaced atomically, so every shard in the manifest is complete and can
+# be indexed while the crawl goes on. "complete" becomes true when the crawl closes. Each shard
+# has a NAME.urls.tsv sidecar mapping its docIDs back to URLs ("docID\tURL" lines), and every
+# crawl has a crawl_id, so an indexer can tell the shards of two crawls of one directory apart.
+#
+# A URL keeps its docID across crawls: doc_ids.tsv ("docID\tURL" lines) survives a new crawl of
+# the directory, a URL seen before gets its docID back and a new one the next unused docID
+# (0, 1, 2, ...). An index of both crawls then replaces the older version of a page instead of
+# mixing two pages under one docID. New URLs are added to doc_ids.tsv when their shard is
+# listed; documents of a .part shard left by a crawl that was killed rather than stopped are
+# lost, and the docIDs of their new URLs are given to the next new URLs.
+
+import gzip
+import json
+import os
+import re
+import uuid
+
+MANIFEST = "manifest.json"
+DOC_IDS = "doc_ids.tsv"
+URLS_EXT = ".urls.tsv"
+PART_EXT = ".part"
+
+SKIPPED_TAGS = ("script", "style", "noscript", "template", "nav", "header", "footer", "aside", "form", "svg")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def collect_text(el, parts):
+    if el.text:
+        parts.append(el.text)
+    for child in el:
+        # comments and processing instructions have no string tag; their tails are text
+        if isinstance(child.tag, str) and child.tag not in SKIPPED_TAGS:
+            collect_text(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+
+
+def main_text(response):
+    root = response.selector.root
+    containers = root.xpath("//article[not(ancestor::article)]") or root.xpath("//main") or root.xpath("//body") or [root]
+    parts = []
+    for container in containers:
+        collect_text(container, parts)
+    return WHITESPACE_RE.sub(" ", " ".join(parts)).strip()
+
+
+class ShardWriter:
+
+    def __init__(self, directory, max_bytes=16 * 1024 * 1024, resume=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        manifest = self.read_manifest() if resume else None
+        if manifest is None:
+            # a new crawl replaces the shards of the previous one
+            old = self.read_manifest()
+            for shard in old["shards"] if old else []:
+                for name in (shard["name"], shard["urls"]):
+                    path = os.path.join(directory, name)
+                    if os.path.exists(path):
+                        os.remove(path)
+            manifest = {"complete": False, "crawl_id": uuid.uuid4().hex, "next_doc_id": 0, "shards": []}
+        manifest.setdefault("crawl_id", uuid.uuid4().hex)
+        manifest["complete"] = False
+        self.doc_ids = self.read_doc_ids()
+        manifest["next_doc_id"] = max([manifest["next_doc_id"]] + [doc_id + 1 for doc_id in self.doc_ids.values()])
+        self.manifest = manifest
+        self.file = None
+        self.urls = []
+        self.new_urls = []
+        self.bytes = 0
+        self.commit()
+
+    def read_doc_ids(self):
+        # {URL: docID} of every crawl of the directory
+        doc_ids = {}
+        path = os.path.join(self.directory, DOC_IDS)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    doc_id, tab, url = line.rstrip("\n").partition("\t")
+                    # a line cut short by a crash is dropped; its shard was never listed
+                    if tab and line.endswith("\n"):
+                        doc_ids[url] = int(doc_id)
+        return doc_ids
+
+    def read_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def commit(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def shard_name(self):
+        return f"shard_{len(self.manifest['shards']):06d}"
+
+    def write(self, url, text):
+        # Returns the document's docID
+        if self.file is None:
+            path = os.path.join(self.directory, self.shard_name() + ".tsv.gz" + PART_EXT)
+            self.file = gzip.open(path, "wt", encoding="utf-8", newline="\n")
+        doc_id = self.doc_ids.get(url)
+        if doc_id is None:
+            doc_id = self.doc_ids[url] = self.manifest["next_doc_id"]
+            self.manifest["next_doc_id"] += 1
+            self.new_urls.append((doc_id, url))
+        line = f"{doc_id}\t{text}\n"
+        self.file.write(line)
+        self.bytes += len(line.encode("utf-8"))
+        self.urls.append((doc_id, url))
+        if self.bytes >= self.max_bytes:
+            self.rotate()
+        return doc_id
+
+    def rotate(self):
+        # Closes the current shard and lists it in the manifest
+        if self.file is None:
+            return None
+        self.file.close()
+        self.file = None
+        # the sidecar and the new docIDs first: a listed shard always has its URLs
+        name = self.shard_name()
+        with open(os.path.join(self.directory, name + URLS_EXT), "w", encoding="utf-8") as f:
+            f.writelines(f"{doc_id}\t{url}\n" for doc_id, url in self.urls)
+        with open(os.path.join(self.directory, DOC_IDS), "a", encoding="utf-8") as f:
+            f.writelines(f"{doc_id}\t{url}\n" for doc_id, url in self.new_urls)
+        path = os.path.join(self.directory, name + ".tsv.gz")
+        os.replace(path + PART_EXT, path)
+        doc_ids = [doc_id for doc_id, _ in self.urls]
+        shard = {"name": name + ".tsv.gz", "urls": name + URLS_EXT, "docs": len(self.urls), "min_doc_id": min(doc_ids),
+                 "max_doc_id": max(doc_ids), "bytes": self.bytes, "compressed_bytes": os.path.getsize(path)}
+        self.manifest["shards"].append(shard)
+        self.commit()
+        self.urls = []
+        self.new_urls = []
+        self.bytes = 0
+        return shard
+
+    def close(self):
+        self.rotate()
+        self.manifest["complete"] = True
+        self.commit()
@@ -0,0 +1,50 @@
+from time import monotonic
+
+import scrapy
+from scrapy.core.downloader import Downloader
+from scrapy.exceptions import NotSupported
+
+try:
+    from scrapy.utils.defer import _schedule_coro
+except ImportError:
+    _schedule_coro = None
+
+# The Scrapy release this override was written against. It replaces a private method and calls
+# private helpers, so it refuses to run with any other version rather than quietly crawling with
+# per-slot limits that may no longer hold.
+TESTED_SCRAPY_VERSION = (2, 19)
+PRIVATE_API_AVAILABLE = _schedule_coro is not None and hasattr(Downloader, "_wait_for_download")
+
+
+def scrapy_version():
+    return tuple(int(part) for part in scrapy.__version__.split(".")[:2] if part.isdigit())
+
+
+class SlotLimitedDownloader(Downloader):
+    # Scrapy's downloader, with the per-slot concurrency actually enforced. Opt-in, with
+    # ADAPTIVE_CONCURRENCY_ENABLED (see settings.py).
+    #
+    # Downloader._process_queue() hands every request to _download() as a scheduled coroutine,
+    # and the request is only added to slot.transferring once that coroutine starts running. So
+    # with the asyncio reactor, the loop sees free transfer slots until the slot's queue is
+    # empty, and a host gets as many requests at once as the global CONCURRENT_REQUESTS lets
+    # through, whatever CONCURRENT_REQUESTS_PER_DOMAIN or the slot's concurrency says. Here the
+    # request counts as transferring as soon as it leaves the queue (_download() adding it
+    # again is a no-op, and it still removes it when the download finishes).
+
+    def __init__(self, crawler):
+        if not PRIVATE_API_AVAILABLE or scrapy_version() != TESTED_SCRAPY_VERSION:
+            raise NotSupported(f"SlotLimitedDownloader is written for Scrapy {'.'.join(map(str, TESTED_SCRAPY_VERSION))}, "
+                               f"not {scrapy.__version__}: check Downloader._process_queue and update it, or unset "
+                               f"DOWNLOADER")
+        super().__init__(crawler)
+
+    def _process_queue(self, slot):
+        if slot.latercall or slot.download_delay():
+            # with a delay, Scrapy sends one request per call anyway
+            return super()._process_queue(slot)
+        while slot.queue and slot.free_transfer_slots() > 0:
+            slot.lastseen = monotonic()
+            request, queue_dfd = slot.queue.popleft()
+            slot.transferring.add(request)
+            _schedule_coro(self._wait_for_download(slot, request, queue_dfd))
@@ -0,0 +1,146 @@
+# Compact duplicate request filter for long crawls (DUPEFILTER_CLASS).
+#
+# Scrapy's RFPDupeFilter keeps every request fingerprint in a Python set, which costs well over
+# 100 bytes per URL. BloomDupeFilter sets k bits per fingerprint in a bit array sized for
+# BLOOM_DUPEFILTER_CAPACITY URLs at a false positive rate of BLOOM_DUPEFILTER_ERROR_RATE:
+#
+#   bits m = -n ln(p) / ln(2)^2, hashes k = m / n ln(2)    (about 19.2 bits per URL at p = 0.0001)
+#
+# A false positive means a new URL is treated as seen and never fetched. Up to the capacity the
+# rate stays below the configured one; past it the rate grows, and the filter logs a warning
+# and reports its estimated rate. The filter never forgets a URL.
+#
+# With JOBDIR set the bit array is saved to JOBDIR/requests.bloom when the spider closes and at
+# every checkpoint of JournaledScheduler (scheduler.py), and loaded again on the next start.
+# The scheduler's journal has the requests seen since, and replays them into the filter, so a
+# crawl resumes without refetching pages whether it was stopped gracefully or killed.
+
+import json
+import logging
+import math
+import os
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+logger = logging.getLogger(__name__)
+
+BLOOM_FILE = "requests.bloom"
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate, bits=None, count=0):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("Bloom filter needs a positive capacity and 0 < error_rate < 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.m = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.m + 7) // 8)
+        self.count = count
+
+    def positions(self, key):
+        # Double hashing over the key, which is already a uniform hash (a SHA1 request fingerprint)
+        h1 = int.from_bytes(key[:8], "big")
+        h2 = int.from_bytes(key[8:16], "big") | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, key):
+        # Sets the key's bits; True if they were all set already (seen, or a false positive)
+        bits = self.bits
+        seen = True
+        for position in self.positions(key):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                seen = False
+        if not seen:
+            self.count += 1
+        return seen
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self.positions(key))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+    def false_positive_rate(self):
+        # Expected rate for the number of keys added so far
+        return (1 - math.exp(-self.k * self.count / self.m)) ** self.k
+
+    def save(self, path):
+        header = {"capacity": self.capacity, "error_rate": self.error_rate, "count": self.count}
+        with open(path + ".tmp", "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            f.write(self.bits)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            bits = bytearray(f.read())
+        bloom = cls(header["capacity"], header["error_rate"], bits, header["count"])
+        if len(bits) != (bloom.m + 7) // 8:
+            raise ValueError(f"{path} is truncated or was written with different parameters")
+        return bloom
+
+
+class BloomDupeFilter(RFPDupeFilter):
+
+    def __init__(self, path=None, debug=False, *, fingerprinter=None, capacity=1000000, error_rate=0.0001, stats=None):
+        # path is the job directory; RFPDupeFilter's own requests.seen file is not used
+        super().__init__(None, debug, fingerprinter=fingerprinter)
+        self.path = os.path.join(path, BLOOM_FILE) if path else None
+        self.stats = stats
+        if self.path and os.path.exists(self.path):
+            self.bloom = BloomFilter.load(self.path)
+            logger.info("Resumed Bloom dupefilter with %d seen requests from %s", len(self.bloom), self.path)
+        else:
+            self.bloom = BloomFilter(capacity, error_rate)
+        self.over_capacity = len(self.bloom) > self.bloom.capacity
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            job_dir(settings),
+            settings.getbool("DUPEFILTER_DEBUG"),
+            fingerprinter=crawler.request_fingerprinter,
+            capacity=settings.getint("BLOOM_DUPEFILTER_CAPACITY", 1000000),
+            error_rate=settings.getfloat("BLOOM_DUPEFILTER_ERROR_RATE", 0.0001),
+            stats=crawler.stats,
+        )
+
+    def request_seen(self, request):
+        seen = self.bloom.add(self.fingerprinter.fingerprint(request))
+        if not seen and not self.over_capacity and len(self.bloom) > self.bloom.capacity:
+            self.over_capacity = True
+            logger.warning("Bloom dupefilter is past its capacity of %d requests; the false positive rate "
+                           "is now above %g and rising", self.bloom.capacity, self.bloom.error_rate)
+        return seen
+
+    def close(self, reason):
+        bloom = self.bloom
+        bits_per_url = 8 * bloom.size_bytes / len(bloom) if len(bloom) else 0.0
+        logger.info("Bloom dupefilter: %d requests in %d bytes (%.1f bits per request now, %.1f at the "
+                    "capacity of %d, %d hashes), estimated false positive rate %.2g", len(bloom), bloom.size_bytes,
+                    bits_per_url, bloom.m / bloom.capacity, bloom.capacity, bloom.k, bloom.false_positive_rate())
+        if self.stats is not None:
+            self.stats.set_value("dupefilter/bloom_requests", len(bloom))
+            self.stats.set_value("dupefilter/bloom_bytes", bloom.size_bytes)
+            self.stats.set_value("dupefilter/bloom_bits_per_request", round(bits_per_url, 2))
+            self.stats.set_value("dupefilter/bloom_false_positive_rate", bloom.false_positive_rate())
+        self.checkpoint()
+        super().close(reason)
+
+    def checkpoint(self):
+        if self.path:
+            self.bloom.save(self.path)
@@ -0,0 +1,230 @@
+# Per-stage latency instrumentation (STAGE_TIMINGS_ENABLED): where a crawl's time goes.
+#
+# Stages, each a histogram with log-spaced buckets from 10 us to 100 s:
+#   dns                  resolver lookups not answered from Scrapy's DNS cache, when
+#                        TWISTED_DNS_RESOLVER is TimedResolver (empty otherwise)
+#   scheduler queue      request_scheduled -> request_reached_downloader
+#   downloader           request_reached_downloader -> response_downloaded, waiting for a
+#                        slot included
+#   download             the response's download_latency: sending the request to receiving it
+#   callback cpu         reactor thread CPU time of the callback per response, link extraction
+#                        included (StageTimingSpiderMiddleware)
+#   link extraction cpu  the part of it spent in the spider's link extractor
+#   pipeline             an item leaving the callback -> item_scraped, item_dropped or item_error
+#
+# Queue depths (scheduler, downloader, transferring, scraper, item pipelines) are sampled every
+# STAGE_TIMINGS_INTERVAL seconds, when a JSON snapshot of everything is also written to
+# STAGE_TIMINGS_FILE. The final breakdown is added to the crawl report through the spider's
+# report_sections.
+
+import bisect
+import json
+import os
+import time
+import weakref
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.resolver import CachingThreadedResolver, dnscache
+from twisted.internet import task
+
+BOUNDS = [1e-5 * 10 ** (i / 10) for i in range(71)]  # 10 us ... 100 s, ten buckets per decade (26% wide)
+STAGES = ["dns", "scheduler queue", "downloader", "download", "callback cpu", "link extraction cpu", "pipeline"]
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th percentile (at most the largest value seen)
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BOUNDS[index], self.max) if index < len(BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+    def as_dict(self):
+        buckets = {f"{BOUNDS[i]:.6g}" if i < len(BOUNDS) else "inf": count for i, count in enumerate(self.counts) if count}
+        return dict(self.summary(), buckets=buckets)
+
+
+# The resolver is installed once per process, before any crawler exists, so its lookups go here
+DNS_TIMINGS = LatencyHistogram()
+
+
+class TimedResolver(CachingThreadedResolver):
+    # CachingThreadedResolver that records the latency of every lookup not answered from the cache
+
+    def getHostByName(self, name, timeout=()):
+        if name in dnscache:
+            return super().getHostByName(name, timeout)
+        start = time.perf_counter()
+        d = super().getHostByName(name, timeout)
+        d.addBoth(self.record, start)
+        return d
+
+    def record(self, result, start):
+        DNS_TIMINGS.add(time.perf_counter() - start)
+        return result
+
+
+class StageTimings:
+
+    def __init__(self, crawler, path, interval):
+        self.crawler = crawler
+        self.path = path
+        self.interval = interval
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+        self.stages["dns"] = DNS_TIMINGS
+        self.scheduled = weakref.WeakKeyDictionary()  # request -> time it was scheduled
+        self.reached = weakref.WeakKeyDictionary()  # request -> time it reached the downloader
+        self.items = {}  # id(item) -> time it left the callback
+        self.depths = {}  # queue -> {"last", "max", "total"}
+        self.samples = 0
+        self.timer = None
+        self.started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("STAGE_TIMINGS_ENABLED"):
+            raise NotConfigured
+        extension = cls(crawler, settings.get("STAGE_TIMINGS_FILE", "stage_timings_latimes.json"),
+                        settings.getfloat("STAGE_TIMINGS_INTERVAL", 10.0))
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.request_scheduled, signal=signals.request_scheduled)
+        crawler.signals.connect(extension.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(extension.response_downloaded, signal=signals.response_downloaded)
+        for signal in (signals.item_scraped, signals.item_dropped, signals.item_error):
+            crawler.signals.connect(extension.item_done, signal=signal)
+        return extension
+
+    def record(self, stage, seconds):
+        self.stages[stage].add(seconds)
+
+    def spider_opened(self, spider):
+        self.started = time.time()
+        spider.stage_timings = self
+        spider.report_sections.append(self.report)
+        if self.interval > 0:
+            self.timer = task.LoopingCall(self.tick)
+            self.timer.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.timer is not None and self.timer.running:
+            self.timer.stop()
+        self.write_snapshot()
+        stats = self.crawler.stats
+        for stage, histogram in self.stages.items():
+            if histogram.count:
+                key = "stage_timings/" + stage.replace(" ", "_")
+                stats.set_value(f"{key}/mean_ms", histogram.total / histogram.count * 1000)
+                stats.set_value(f"{key}/p99_ms", histogram.percentile(99) * 1000)
+
+    def request_scheduled(self, request, spider=None):
+        self.scheduled[request] = time.perf_counter()
+
+    def request_reached_downloader(self, request, spider=None):
+        now = time.perf_counter()
+        scheduled = self.scheduled.pop(request, None)
+        # requests read back from a JOBDIR disk queue are new objects, with no scheduled time
+        if scheduled is not None:
+            self.record("scheduler queue", now - scheduled)
+        self.reached[request] = now
+
+    def response_downloaded(self, response, request, spider=None):
+        reached = self.reached.pop(request, None)
+        if reached is not None:
+            self.record("downloader", time.perf_counter() - reached)
+        if "download_latency" in request.meta:
+            self.record("download", request.meta["download_latency"])
+
+    def item_left_callback(self, item):
+        self.items[id(item)] = time.perf_counter()
+
+    def item_done(self, item, response=None, spider=None, **kwargs):
+        start = self.items.pop(id(item), None)
+        if start is not None:
+            self.record("pipeline", time.perf_counter() - start)
+
+    def queue_depths(self):
+        engine = self.crawler.engine
+        slot = getattr(engine, "_slot", None) or getattr(engine, "slot", None)
+        scheduler = slot.scheduler if slot is not None else None
+        downloader = engine.downloader
+        scraper = engine.scraper.slot
+        return {
+            "scheduler": len(scheduler) if scheduler is not None and hasattr(scheduler, "__len__") else 0,
+            "downloader": len(downloader.active),
+            "transferring": sum(len(s.transferring) for s in downloader.slots.values()),
+            "scraper": len(scraper.queue) + len(scraper.active) if scraper is not None else 0,
+            "item pipelines": scraper.itemproc_size if scraper is not None else 0,
+        }
+
+    def sample(self):
+        self.samples += 1
+        for queue, depth in self.queue_depths().items():
+            gauge = self.depths.setdefault(queue, {"last": 0, "max": 0, "total": 0})
+            gauge["last"] = depth
+            gauge["max"] = max(gauge["max"], depth)
+            gauge["total"] += depth
+
+    def tick(self):
+        self.sample()
+        self.write_snapshot()
+
+    def snapshot(self):
+        return {
+            "time": time.time(),
+            "elapsed": time.time() - self.started if self.started else 0.0,
+            "stages": {stage: histogram.as_dict() for stage, histogram in self.stages.items()},
+            "queue_depths": {queue: {"last": gauge["last"], "max": gauge["max"], "mean": gauge["total"] / self.samples}
+                             for queue, gauge in self.depths.items()},
+        }
+
+    def write_snapshot(self):
+        # Replaced atomically, so a reader never sees a half-written file
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+    def report(self):
+        lines = ["Stage Timings:", "==============",
+                 f"{'stage':<22}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>10}"]
+        for stage, histogram in self.stages.items():
+            s = histogram.summary()
+            lines.append(f"{stage:<22}{s['count']:>8}{s['mean'] * 1000:>10.2f}{s['p50'] * 1000:>10.2f}{s['p90'] * 1000:>10.2f}"
+                         f"{s['p99'] * 1000:>10.2f}{s['max'] * 1000:>10.2f}{s['total']:>10.2f}")
+        if self.samples:
+            lines += ["", f"Queue depths ({self.samples} samples, every {self.interval:g} s): last / mean / max"]
+            for queue, gauge in self.depths.items():
+                lines.append(f"# {queue}: {gauge['last']} / {gauge['total'] / self.samples:.1f} / {gauge['max']}")
+        return "\n".join(lines) + "\n\n"
@@ -10,3 +10,29 @@ class ScrapyCrawlerItem(scrapy.Item):
     # define the fields for your item here like:
     # name = scrapy.Field()
     pass
+
+
+class FetchItem(scrapy.Item):
+    # One row of fetch_latimes.csv: every attempted URL
+    url = scrapy.Field()
+    status = scrapy.Field()
+
+
+class VisitItem(scrapy.Item):
+    # One row of visit_latimes.csv: every successfully downloaded page
+    url = scrapy.Field()
+    size = scrapy.Field()
+    outlinks = scrapy.Field()
+    content_type = scrapy.Field()
+    near_duplicate_of = scrapy.Field()  # URL of the earlier page, with NEAR_DUPLICATE_ENABLED
+
+
+class UrlsItem(scrapy.Item):
+    # All rows of urls_latimes.csv for one page: [(url, "OK" or "N_OK"), ...]
+    urls = scrapy.Field()
+
+
+class DocumentItem(scrapy.Item):
+    # The main text of one HTML page, for the HW3 document shards (DOCUMENT_SHARDS_ENABLED)
+    url = scrapy.Field()
+    text = scrapy.Field()
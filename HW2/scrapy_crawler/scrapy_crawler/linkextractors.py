@@ -0,0 +1,164 @@
+# Single-pass link extraction for the latimes spider.
+#
+# The CrawlSpider rule's LinkExtractor and parse_item's outlink log used to walk every page's
+# DOM separately (the rule over all elements, parse_item through response.css("a::attr(href)")),
+# and every outlink was then joined with response.urljoin and parsed with urlparse to tell
+# internal from external links. SinglePassLinkExtractor walks the DOM once per response, only
+# over the tags it needs, resolves each distinct attribute value once, and keeps the result on
+# the response for both users; HostClassifier remembers the indicator of every host.
+
+import re
+import weakref
+from urllib.parse import urljoin
+
+from lxml import etree
+from scrapy.http import TextResponse
+from scrapy.link import Link
+from scrapy.linkextractors import LinkExtractor
+from scrapy.utils.misc import arg_to_iter, rel_has_nofollow
+from scrapy.utils.python import unique as unique_list
+from scrapy.utils.response import get_base_url
+from w3lib.html import strip_html5_whitespace
+from w3lib.url import canonicalize_url, safe_url_string
+
+# the netloc urlparse() finds in an absolute URL ("scheme://netloc/..."); other URLs have none
+NETLOC_RE = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*://([^/?#]*)")
+
+_collect_string_content = etree.XPath("string()")
+
+
+class HostClassifier:
+    # "OK" for URLs on the news site (netloc ending in base_domain), "N_OK" otherwise, as
+    # urlparse(url).netloc.endswith(base_domain) decides it; one regex match and one dict
+    # lookup per URL once its netloc has been seen
+
+    def __init__(self, base_domain):
+        self.base_domain = base_domain
+        self.indicators = {}
+
+    def __call__(self, url):
+        match = NETLOC_RE.match(url)
+        netloc = match.group(1) if match else ""
+        try:
+            return self.indicators[netloc]
+        except KeyError:
+            indicator = self.indicators[netloc] = "OK" if netloc.endswith(self.base_domain) else "N_OK"
+            return indicator
+
+
+class PageLinks:
+    # outlinks: the absolute URL of every <a href> in document order, duplicates included
+    # (response.urljoin of each of response.css("a::attr(href)").getall())
+    # links: the links to follow, as LinkExtractor.extract_links returns them
+
+    def __init__(self, outlinks, links):
+        self.outlinks = outlinks
+        self.links = links
+
+
+class SinglePassLinkExtractor(LinkExtractor):
+
+    def __init__(self, *args, tags=("a", "area"), **kwargs):
+        super().__init__(*args, tags=tags, **kwargs)
+        tags = set(arg_to_iter(tags))
+        # the tags to visit: those links are followed from, and <a> for the outlink log
+        self.visit_tags = None if "*" in tags else tuple(tags | {"a"})
+        self.pages = weakref.WeakKeyDictionary()
+
+    def extract_links(self, response):
+        return self.page_links(response).links
+
+    def page_links(self, response):
+        try:
+            return self.pages[response]
+        except KeyError:
+            pass
+        if not isinstance(response, TextResponse):
+            page = PageLinks([], [])
+        elif self.restrict_xpaths:
+            outlinks = [response.urljoin(href) for href in response.css("a::attr(href)").getall()]
+            page = PageLinks(outlinks, super().extract_links(response))
+        else:
+            page = self.walk(response)
+        self.pages[response] = page
+        return page
+
+    def resolve(self, value, base_url, response_url, encoding):
+        # LxmlParserLinkExtractor._extract_links() for one attribute value: the URL, or None
+        extractor = self.link_extractor
+        try:
+            if extractor.strip:
+                value = strip_html5_whitespace(value)
+            value = urljoin(base_url, value)
+        except ValueError:
+            return None
+        url = extractor.process_attr(value)
+        if url is None:
+            return None
+        try:
+            url = safe_url_string(url, encoding=encoding)
+        except ValueError:
+            return None
+        return urljoin(response_url, url)
+
+    def walk(self, response):
+        base_url = get_base_url(response)
+        response_url = response.url
+        encoding = response.encoding
+        scan_tag = self.link_extractor.scan_tag
+        scan_attr = self.link_extractor.scan_attr
+        document = response.selector.root
+        elements = document.iter(*self.visit_tags) if self.visit_tags else document.iter(etree.Element)
+
+        outlinks = []
+        joined = {}  # href -> urljoin(base_url, href), for the outlink log
+        resolved = {}  # attribute value -> URL to follow or None
+        candidates = []  # (element, URL) in document order
+        for el in elements:
+            attribs = el.attrib
+            tag = el.tag
+            if tag == "a":
+                href = attribs.get("href")
+                if href is not None:
+                    url = joined.get(href)
+                    if url is None:
+                        url = joined[href] = urljoin(base_url, href)
+                    outlinks.append(url)
+            if not scan_tag(tag):
+                continue
+            for attrib, value in attribs.items():
+                if not scan_attr(attrib):
+                    continue
+                try:
+                    url = resolved[value]
+                except KeyError:
+                    url = resolved[value] = self.resolve(value, base_url, response_url, encoding)
+                if url is not None:
+                    candidates.append((el, url))
+
+        # LinkExtractor keeps the first link of every URL, then filters; a link's text only
+        # matters to the filters with restrict_text, so otherwise it is only collected for
+        # the links that are kept
+        unique = self.link_extractor.unique
+        seen = set()
+        links = []
+        for el, url in candidates:
+            if unique:
+                if url in seen:
+                    continue
+                seen.add(url)
+            if self.restrict_text:
+                link = Link(url, _collect_string_content(el) or "", nofollow=rel_has_nofollow(el.get("rel")))
+                if not self._link_allowed(link):
+                    continue
+            else:
+                if not self._link_allowed(Link(url)):
+                    continue
+                link = Link(url, _collect_string_content(el) or "", nofollow=rel_has_nofollow(el.get("rel")))
+            links.append(link)
+        if self.canonicalize:
+            for link in links:
+                link.url = canonicalize_url(link.url)
+            if unique:
+                links = unique_list(links, key=self.link_extractor.link_key)
+        return PageLinks(outlinks, links)
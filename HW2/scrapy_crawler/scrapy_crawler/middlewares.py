@@ -3,7 +3,10 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import time
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -101,3 +104,205 @@ class ScrapyCrawlerDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class HostState:
+    # Latency and error statistics of one download slot (one host)
+
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latency = None  # exponentially weighted moving average, seconds
+        self.responses = 0
+        self.errors = 0
+        self.successes_since_change = 0
+        # whether the host had a full window of requests at once since the last change
+        self.window_used = False
+        self.last_backoff = 0.0
+        # concurrency at the last backoff, and successful windows spent just below it
+        self.ceiling = None
+        self.windows_below_ceiling = 0
+
+
+class AdaptiveConcurrencyMiddleware:
+    # Per-host concurrency and delay, adjusted like TCP congestion control (additive increase,
+    # multiplicative decrease) on every downloaded response:
+    #
+    # - 429, 5xx or a download error halves the host's concurrency and doubles its delay
+    #   (at least ADAPTIVE_CONCURRENCY_BACKOFF_DELAY, or the Retry-After of a 429), at most
+    #   once per round trip so that one burst of errors is one backoff
+    # - after a full window of successes (as many as the current concurrency), the host's delay
+    #   is halved, and it gains one concurrent request if it actually had that many requests at
+    #   once during the window and is not slower than ADAPTIVE_CONCURRENCY_MAX_LATENCY, up to
+    #   ADAPTIVE_CONCURRENCY_MAX. A slow host keeps its concurrency: taking it lower only makes
+    #   its backlog drain slower, and errors already shrink it
+    # - the concurrency that caused the last backoff is not tried again, unless
+    #   ADAPTIVE_CONCURRENCY_PROBE_WINDOWS is set: then after that many clean windows just
+    #   below it
+    #
+    # Every step past a host's hard limit costs a burst of errors, so the defaults stay under
+    # what a polite crawler asks of one host (4) and find a lower limit only once; raise
+    # ADAPTIVE_CONCURRENCY_MAX for hosts known to take more.
+    #
+    # Latency is an absolute threshold rather than relative to the host's best latency: when
+    # the crawler itself is CPU-bound, every host's measured latency rises together.
+    #
+    # The values are written to the host's downloader slot and its DOWNLOAD_SLOTS entry;
+    # CONCURRENT_REQUESTS stays the global cap. Enable it with ADAPTIVE_CONCURRENCY_ENABLED = True and raise
+    # CONCURRENT_REQUESTS; SCHEDULER_PRIORITY_QUEUE = "scrapy_crawler.pqueues.HostLoadPriorityQueue"
+    # makes the scheduler hand out requests for the least busy hosts first, and
+    # DOWNLOADER = "scrapy_crawler.downloader.SlotLimitedDownloader" holds every host to its limit.
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED"):
+            raise NotConfigured
+        self.crawler = crawler
+        self.start_concurrency = settings.getint("ADAPTIVE_CONCURRENCY_START", 2)
+        self.min_concurrency = settings.getint("ADAPTIVE_CONCURRENCY_MIN", 1)
+        self.max_concurrency = settings.getint("ADAPTIVE_CONCURRENCY_MAX", 4)
+        self.max_latency = settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_LATENCY", 2.0)
+        self.probe_windows = settings.getint("ADAPTIVE_CONCURRENCY_PROBE_WINDOWS", 0)
+        self.backoff_delay = settings.getfloat("ADAPTIVE_CONCURRENCY_BACKOFF_DELAY", 0.25)
+        self.max_delay = settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_DELAY", 10.0)
+        self.hosts = {}
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def host_state(self, request):
+        downloader = self.crawler.engine.downloader
+        key = downloader.get_slot_key(request)
+        if key not in self.hosts:
+            delay = downloader.per_slot_settings.get(key, {}).get("delay", 0.0)
+            self.hosts[key] = HostState(self.start_concurrency, delay)
+            # slots are created (and recreated after being garbage-collected) from DOWNLOAD_SLOTS,
+            # so the first burst to a host already uses the start concurrency
+            downloader.per_slot_settings[key] = {"concurrency": self.start_concurrency, "delay": delay}
+        return key, self.hosts[key], downloader.slots.get(key)
+
+    def process_request(self, request, spider=None):
+        self.host_state(request)
+        return None
+
+    def process_response(self, request, response, spider=None):
+        key, host, slot = self.host_state(request)
+        host.responses += 1
+        latency = request.meta.get("download_latency")
+        if response.status == 429 or response.status >= 500:
+            host.errors += 1
+            retry_after = response.headers.get("Retry-After", b"").decode(errors="ignore")
+            self.back_off(host, float(retry_after) if retry_after.isdigit() else 0.0, latency)
+        elif latency is not None:
+            self.record_latency(host, latency, slot)
+        self.apply(key, host, slot)
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        key, host, slot = self.host_state(request)
+        host.responses += 1
+        host.errors += 1
+        self.back_off(host, 0.0, request.meta.get("download_latency"))
+        self.apply(key, host, slot)
+        return None
+
+    def record_latency(self, host, latency, slot):
+        host.latency = latency if host.latency is None else 0.8 * host.latency + 0.2 * latency
+        host.successes_since_change += 1
+        # slot.active still holds this request, and the host's queued ones
+        if slot is not None and len(slot.active) >= host.concurrency:
+            host.window_used = True
+        if host.successes_since_change < host.concurrency:
+            return
+        host.successes_since_change = 0
+        host.delay = host.delay / 2 if host.delay > 0.01 else 0.0
+        window_used, host.window_used = host.window_used, False
+        if host.latency > self.max_latency or not window_used:
+            return
+        if host.ceiling is not None and host.concurrency + 1 >= host.ceiling:
+            if not self.probe_windows:
+                return
+            host.windows_below_ceiling += 1
+            if host.windows_below_ceiling < self.probe_windows:
+                return
+            host.windows_below_ceiling = 0
+        host.concurrency = min(self.max_concurrency, host.concurrency + 1)
+
+    def back_off(self, host, retry_after, latency):
+        now = time.monotonic()
+        if now - host.last_backoff < max(host.latency or 0.0, latency or 0.0):
+            return
+        host.last_backoff = now
+        host.successes_since_change = 0
+        host.ceiling = host.concurrency
+        host.windows_below_ceiling = 0
+        host.concurrency = max(self.min_concurrency, host.concurrency // 2)
+        host.delay = min(self.max_delay, max(self.backoff_delay, 2 * host.delay, retry_after))
+
+    def apply(self, key, host, slot):
+        self.crawler.engine.downloader.per_slot_settings[key].update(concurrency=host.concurrency, delay=host.delay)
+        if slot is not None:
+            slot.concurrency = host.concurrency
+            slot.delay = host.delay
+
+    def spider_closed(self, spider):
+        stats = self.crawler.stats
+        for key, host in self.hosts.items():
+            stats.set_value(f"adaptive_concurrency/{key}/concurrency", host.concurrency)
+            stats.set_value(f"adaptive_concurrency/{key}/delay", round(host.delay, 3))
+            stats.set_value(f"adaptive_concurrency/{key}/error_rate", round(host.errors / max(host.responses, 1), 4))
+            if host.latency is not None:
+                stats.set_value(f"adaptive_concurrency/{key}/latency", round(host.latency, 4))
+
+
+class StageTimingSpiderMiddleware:
+    # Callback CPU time per response and the time items leave the callback, for StageTimings
+    # (STAGE_TIMINGS_ENABLED). It sits next to the spider, so the reactor thread CPU time spent
+    # getting each output from the result is the callback's own, and the time between outputs
+    # (the items in the pipelines, the requests in the scheduler) is not counted
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("STAGE_TIMINGS_ENABLED"):
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_spider_output(self, response, result, spider=None):
+        timings = self.crawler.spider.stage_timings
+        iterator = iter(result)
+        cpu = 0.0
+        while True:
+            start = time.thread_time()
+            try:
+                output = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                cpu += time.thread_time() - start
+            if is_item(output):
+                timings.item_left_callback(output)
+            yield output
+        timings.record("callback cpu", cpu)
+
+    async def process_spider_output_async(self, response, result, spider=None):
+        # CrawlSpider callbacks produce an async iterable (parse_with_rules)
+        timings = self.crawler.spider.stage_timings
+        iterator = result.__aiter__()
+        cpu = 0.0
+        while True:
+            start = time.thread_time()
+            try:
+                output = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                cpu += time.thread_time() - start
+            if is_item(output):
+                timings.item_left_callback(output)
+            yield output
+        timings.record("callback cpu", cpu)
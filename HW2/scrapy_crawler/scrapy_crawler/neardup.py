@@ -0,0 +1,176 @@
+# Crawl-time near-duplicate detection: a 64-bit SimHash (Charikar) of each HTML page's text and
+# an index that finds an earlier page within a few bits of it (Manku, Jain and Das Sarma,
+# "Detecting Near-Duplicates for Web Crawling").
+#
+# Tag pages, paginated listings and AMP or print variants of a story share almost all of their
+# text, so their fingerprints differ in a few bits while unrelated pages differ in about half.
+#
+# The index splits the fingerprint into `blocks` blocks. Two fingerprints within `distance`
+# bits of each other differ in at most `distance` blocks, so they agree exactly on some
+# `blocks - distance` of them; there is one table for every such choice of blocks, keyed on
+# those blocks (the permuted tables of the paper), and a query only compares the fingerprint
+# with the pages in its own bucket of each table.
+
+import hashlib
+import os
+import pickle
+import re
+import struct
+from collections import Counter
+from itertools import combinations
+from operator import xor
+
+FINGERPRINT_BITS = 64
+MASK = (1 << FINGERPRINT_BITS) - 1
+SHINGLE_WORDS = 3
+
+SCRIPT_RE = re.compile(rb"<(script|style)\b.*?</\1\s*>", re.S | re.I)
+TAG_RE = re.compile(rb"<[^>]*>")
+WORD_RE = re.compile(rb"[a-z0-9]+")
+
+# byte values with bit b set, for turning per-byte counts into per-bit counts
+BYTES_WITH_BIT = [[value for value in range(256) if value >> bit & 1] for bit in range(8)]
+
+
+def page_words(body):
+    # Words of the page text (tags, scripts and styles removed), as bytes
+    return WORD_RE.findall(TAG_RE.sub(b" ", SCRIPT_RE.sub(b" ", body)).lower())
+
+
+def shingle_hashes(words, size=SHINGLE_WORDS):
+    # A 64-bit hash of every run of `size` words: the XOR of the words' hashes, each rotated by
+    # its position in the run. Only the distinct words of the page go through blake2b
+    size = min(size, len(words))
+    if size == 0:
+        return []
+    hashes = {word: int.from_bytes(hashlib.blake2b(word, digest_size=8).digest(), "little") for word in set(words)}
+    count = len(words) - size + 1
+    result = None
+    for position in range(size):
+        shift = size - 1 - position
+        rotated = {word: (h << shift | h >> (FINGERPRINT_BITS - shift)) & MASK for word, h in hashes.items()} if shift else hashes
+        column = map(rotated.__getitem__, words[position:position + count])
+        result = list(column) if result is None else list(map(xor, result, column))
+    return result
+
+
+def simhash(hashes):
+    # Bit b of the fingerprint is set when more of the feature hashes (repeats included) have
+    # bit b set than not. The hashes are packed into one bytes object, so the per-byte counts
+    # are Counter(packed[byte::8]) and each bit sums 128 of them
+    packed = struct.pack(f"<{len(hashes)}Q", *hashes)
+    fingerprint = 0
+    for byte in range(8):
+        counts = Counter(packed[byte::8])
+        for bit, values in enumerate(BYTES_WITH_BIT):
+            if 2 * sum(map(counts.__getitem__, values)) > len(hashes):
+                fingerprint |= 1 << (8 * byte + bit)
+    return fingerprint
+
+
+def page_fingerprint(body):
+    return simhash(shingle_hashes(page_words(body)))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+
+    def __init__(self, distance=3, blocks=None, bits=FINGERPRINT_BITS):
+        self.distance = distance
+        self.blocks = blocks or distance + 1
+        if not distance < self.blocks <= bits:
+            raise ValueError(f"need distance < blocks <= {bits}, got distance {distance} and {self.blocks} blocks")
+        edges = [bits * i // self.blocks for i in range(self.blocks + 1)]
+        self.masks = [((1 << (end - start)) - 1) << start for start, end in zip(edges, edges[1:])]
+        self.keys = list(combinations(range(self.blocks), self.blocks - distance))
+        self.tables = [{} for _ in self.keys]
+        self.count = 0
+
+    def key(self, fingerprint, blocks):
+        mask = 0
+        for block in blocks:
+            mask |= self.masks[block]
+        return fingerprint & mask
+
+    def add(self, fingerprint, value):
+        for blocks, table in zip(self.keys, self.tables):
+            table.setdefault(self.key(fingerprint, blocks), []).append((fingerprint, value))
+        self.count += 1
+
+    def nearest(self, fingerprint):
+        # (value, distance) of the closest indexed fingerprint within `distance` bits, or None
+        best = None
+        for blocks, table in zip(self.keys, self.tables):
+            for candidate, value in table.get(self.key(fingerprint, blocks), ()):
+                d = hamming(fingerprint, candidate)
+                if d <= self.distance and (best is None or d < best[1]):
+                    best = (value, d)
+                    if d == 0:
+                        return best
+        return best
+
+    def __len__(self):
+        return self.count
+
+
+class NearDuplicateDetector:
+    # The crawl's near-duplicate state: the index of distinct pages, plus the outlinks of
+    # near-duplicates that were not followed and every request that was downloaded, for the
+    # number of fetches avoided (skipped links the crawl never requested some other way)
+
+    def __init__(self, distance=3):
+        self.index = SimHashIndex(distance)
+        self.pages = 0
+        self.near_duplicates = 0
+        self.outlinks_skipped = 0
+        self.skipped = set()  # request fingerprints
+        self.requested = set()
+
+    def check(self, url, body):
+        # URL of an earlier page this one is a near-duplicate of, or None (and the page is indexed).
+        # A page without words has no shingles, and its fingerprint would be 0 like every other
+        # such page's, so it is never fingerprinted
+        hashes = shingle_hashes(page_words(body))
+        if not hashes:
+            return None
+        fingerprint = simhash(hashes)
+        self.pages += 1
+        match = self.index.nearest(fingerprint)
+        if match is not None:
+            self.near_duplicates += 1
+            return match[0]
+        self.index.add(fingerprint, url)
+        return None
+
+    def record_request(self, fingerprint):
+        self.requested.add(fingerprint)
+
+    def record_skipped(self, fingerprint):
+        self.outlinks_skipped += 1
+        self.skipped.add(fingerprint)
+
+    def fetches_avoided(self):
+        return len(self.skipped - self.requested)
+
+    def report(self):
+        lines = [
+            "Near Duplicates:", "================",
+            f"# HTML pages fingerprinted: {self.pages}",
+            f"# Near duplicates (within {self.index.distance} bits): {self.near_duplicates}",
+            f"# Outlinks of near duplicates not followed: {self.outlinks_skipped}",
+            f"# Fetches avoided: {self.fetches_avoided()}",
+        ]
+        return "\n".join(lines) + "\n\n"
+
+    def save(self, path):
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -3,11 +3,200 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import csv
+import os
+import queue
+import threading
+import time
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.job import job_dir
+from twisted.internet import task
+
+from scrapy_crawler.documents import ShardWriter
+from scrapy_crawler.items import DocumentItem, FetchItem, UrlsItem, VisitItem
 
 
 class ScrapyCrawlerPipeline:
-    def process_item(self, item, spider):
+    # Writes the crawl logs (fetch, visit and urls CSV files). Rows are batched in memory on
+    # the reactor thread and handed to a writer thread once CSV_LOG_FLUSH_ROWS rows are
+    # buffered or every CSV_LOG_FLUSH_INTERVAL seconds; the files stay open for the whole crawl.
+    # CSV_LOG_FORMAT = "csv" quotes fields that need it (URLs with commas), "legacy" writes the
+    # old unquoted comma-joined lines. A crawl resumed from a JOBDIR appends to the files of the
+    # earlier runs instead of truncating them. With NEAR_DUPLICATE_ENABLED the visit log has a
+    # fifth column, the URL of the page a near-duplicate repeats (empty for other pages).
+
+    headers = {
+        FetchItem: ["URL", "Status"],
+        VisitItem: ["URL", "Size (Bytes)", "Outlinks", "Content-Type"],
+        UrlsItem: ["Encountered URL", "Indicator"],
+    }
+
+    def __init__(self, flush_rows=5000, flush_interval=5.0, log_format="csv", near_duplicates=False, crawler=None):
+        if log_format not in ("csv", "legacy"):
+            raise ValueError(f"CSV_LOG_FORMAT must be 'csv' or 'legacy', not {log_format!r}")
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.log_format = log_format
+        self.near_duplicates = near_duplicates
+        if near_duplicates:
+            self.headers = {**self.headers, VisitItem: self.headers[VisitItem] + ["Near Duplicate Of"]}
+        self.crawler = crawler
+        self.stats = crawler.stats if crawler is not None else None
+        self.jobdir = job_dir(crawler.settings) if crawler is not None else None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            flush_rows=settings.getint("CSV_LOG_FLUSH_ROWS", 5000),
+            flush_interval=settings.getfloat("CSV_LOG_FLUSH_INTERVAL", 5.0),
+            log_format=settings.get("CSV_LOG_FORMAT", "csv"),
+            near_duplicates=settings.getbool("NEAR_DUPLICATE_ENABLED"),
+            crawler=crawler,
+        )
+
+    # The spider argument is optional: newer Scrapy versions only pass it to methods that require it
+    def open_spider(self, spider=None):
+        spider = spider or self.crawler.spider
+        paths = {FetchItem: spider.fetch_file, VisitItem: spider.visit_file, UrlsItem: spider.urls_file}
+        # The marker is written by the first run of a job, so only resumed runs append
+        marker = os.path.join(self.jobdir, "csv_log.started") if self.jobdir else None
+        resume = marker is not None and os.path.exists(marker)
+        self.files = {}
+        self.buffers = {}
+        self.buffered = 0
+        for item_class, path in paths.items():
+            f = open(path, "a" if resume else "w", newline="")
+            self.files[item_class] = f
+            self.buffers[item_class] = []
+            if not resume:
+                self.write_rows(item_class, [self.headers[item_class]])
+        if marker is not None and not resume:
+            open(marker, "w").close()
+
+        self.batches = queue.Queue()
+        self.error = None
+        self.write_seconds = 0.0  # CPU time of the writer thread, reported as csv_log/write_cpu_seconds
+        self.writer = threading.Thread(target=self.write_batches, name="csv-log-writer", daemon=True)
+        self.writer.start()
+        self.timer = task.LoopingCall(self.flush)
+        self.timer.start(self.flush_interval, now=False)
+
+    def process_item(self, item, spider=None):
+        adapter = ItemAdapter(item)
+        if isinstance(item, FetchItem):
+            rows = [(adapter["url"], adapter["status"])]
+        elif isinstance(item, VisitItem):
+            rows = [(adapter["url"], f"{adapter['size']:.2f}", adapter["outlinks"], adapter["content_type"])]
+            if self.near_duplicates:
+                rows[0] += (adapter.get("near_duplicate_of") or "",)
+        elif isinstance(item, UrlsItem):
+            rows = adapter["urls"]
+        else:
+            return item
+        self.buffers[type(item)].extend(rows)
+        self.buffered += len(rows)
+        if self.buffered >= self.flush_rows:
+            self.flush()
         return item
+
+    def flush(self):
+        # Only hands the buffered rows over; the writes happen on the writer thread
+        for item_class, rows in self.buffers.items():
+            if rows:
+                self.batches.put((item_class, rows))
+                self.buffers[item_class] = []
+        if self.buffered and self.stats is not None:
+            self.stats.inc_value("csv_log/rows", self.buffered)
+            self.stats.inc_value("csv_log/flushes")
+        self.buffered = 0
+
+    def write_rows(self, item_class, rows):
+        f = self.files[item_class]
+        if self.log_format == "csv":
+            csv.writer(f, lineterminator="\n").writerows(rows)
+        else:
+            f.write("".join(",".join(map(str, row)) + "\n" for row in rows))
+
+    def write_batches(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                break
+            start = time.thread_time()
+            try:
+                self.write_rows(*batch)
+            except Exception as e:
+                # Reported when the spider closes; later batches are still attempted
+                self.error = e
+            self.write_seconds += time.thread_time() - start
+
+    def close_spider(self, spider=None):
+        if self.timer.running:
+            self.timer.stop()
+        self.flush()
+        self.batches.put(None)
+        # Waits for the batches still queued
+        self.writer.join()
+        for f in self.files.values():
+            f.close()
+        if self.stats is not None:
+            self.stats.set_value("csv_log/write_cpu_seconds", self.write_seconds)
+        if self.error is not None:
+            raise self.error
+
+
+class DocumentShardPipeline:
+    # Streams DocumentItems into gzip shards of "docID\tcontent" lines for the HW3 indexers
+    # (see documents.py). DOCUMENT_SHARDS_DIR gets the shards and manifest.json; a shard is
+    # closed and listed in the manifest once it holds DOCUMENT_SHARDS_MAX_BYTES of text, so
+    # `python segments.py INDEX add-shards DIR --follow` can index it during the crawl. A crawl
+    # resumed from a JOBDIR continues the shards and docIDs of its earlier runs.
+
+    def __init__(self, directory, max_bytes, crawler=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.crawler = crawler
+        self.stats = crawler.stats if crawler is not None else None
+        self.jobdir = job_dir(crawler.settings) if crawler is not None else None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("DOCUMENT_SHARDS_ENABLED"):
+            raise NotConfigured
+        return cls(
+            directory=settings.get("DOCUMENT_SHARDS_DIR", "shards"),
+            max_bytes=settings.getint("DOCUMENT_SHARDS_MAX_BYTES", 16 * 1024 * 1024),
+            crawler=crawler,
+        )
+
+    def open_spider(self, spider=None):
+        marker = os.path.join(self.jobdir, "document_shards.started") if self.jobdir else None
+        resume = marker is not None and os.path.exists(marker)
+        self.writer = ShardWriter(self.directory, self.max_bytes, resume=resume)
+        if marker is not None and not resume:
+            open(marker, "w").close()
+
+    def process_item(self, item, spider=None):
+        if not isinstance(item, DocumentItem):
+            return item
+        adapter = ItemAdapter(item)
+        shard = len(self.writer.manifest["shards"])
+        self.writer.write(adapter["url"], adapter["text"])
+        if self.stats is not None:
+            self.stats.inc_value("document_shards/documents")
+            if len(self.writer.manifest["shards"]) > shard:
+                self.stats.inc_value("document_shards/shards")
+        return item
+
+    def close_spider(self, spider=None):
+        closed = self.writer.rotate()
+        self.writer.close()
+        if self.stats is not None:
+            if closed is not None:
+                self.stats.inc_value("document_shards/shards")
+            self.stats.set_value("document_shards/next_doc_id", self.writer.manifest["next_doc_id"])
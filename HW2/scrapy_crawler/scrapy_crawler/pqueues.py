@@ -0,0 +1,45 @@
+from collections import Counter
+
+from scrapy.pqueues import DownloaderAwarePriorityQueue, DownloaderInterface
+
+
+class HostLoadDownloaderInterface(DownloaderInterface):
+    # Load of a slot relative to its own concurrency, rather than its raw number of active
+    # requests, and only for slots with room left: a slot already holding a queued request on
+    # top of a full window of downloads gets nothing more for now. Anything queued beyond that
+    # would wait a whole round trip, and a slow host's backlog delays the end of the crawl.
+    #
+    # The requests are counted in the downloader's active set rather than the slot's: the
+    # engine takes several requests from the scheduler in a row, and they only reach their slot
+    # after going through the downloader middlewares.
+
+    def concurrency(self, slot):
+        if slot in self.downloader.slots:
+            return self.downloader.slots[slot].concurrency
+        default = self.downloader.ip_concurrency or self.downloader.domain_concurrency
+        return self.downloader.per_slot_settings.get(slot, {}).get("concurrency", default)
+
+    def stats(self, possible_slots):
+        active = Counter(self.get_slot_key(request) for request in self.downloader.active)
+        stats = []
+        for slot in possible_slots:
+            concurrency = max(self.concurrency(slot), 1)
+            if active[slot] <= concurrency:
+                stats.append((active[slot] / concurrency, slot))
+        return stats
+
+
+class HostLoadPriorityQueue(DownloaderAwarePriorityQueue):
+    # DownloaderAwarePriorityQueue hands out requests for the slot with the fewest active
+    # downloads. With per-host concurrency (AdaptiveConcurrencyMiddleware) that is usually a
+    # slow host running one or two requests at a time, so its downloader queue keeps growing
+    # and takes up CONCURRENT_REQUESTS while fast hosts sit idle. This queue picks the host
+    # using the smallest share of its own concurrency and keeps the requests of saturated
+    # hosts in the scheduler until they have room; the engine asks again whenever a download
+    # finishes.
+    #
+    # The on-disk state is the same as DownloaderAwarePriorityQueue's.
+
+    def __init__(self, crawler, *args, **kwargs):
+        super().__init__(crawler, *args, **kwargs)
+        self._downloader_interface = HostLoadDownloaderInterface(crawler)
@@ -0,0 +1,175 @@
+# State of the re-crawl mode (RECRAWL_ENABLED), kept between crawls in a sqlite file.
+#
+# For every URL fetched with status 200 the state keeps its validators (ETag and
+# Last-Modified), a hash of its body, its size, and how many fetches found it changed. The
+# next crawl sends the validators as If-None-Match / If-Modified-Since, so an unchanged page
+# costs a 304 with no body, and starts from every known URL instead of only start_urls.
+#
+# Each URL's change rate is (changes + 1) / (fetches + 1): the share of its refetches that found
+# a new version, starting from 1/2 for a page fetched once. It is the request priority (section
+# fronts change on every crawl and go first), and URLs below min_change_rate (articles that
+# never change after publication) are only refetched once their last fetch is max_age seconds
+# old.
+
+import hashlib
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    size INTEGER,
+    fetches INTEGER,
+    changes INTEGER,
+    last_fetched REAL,
+    last_changed REAL
+)
+"""
+COLUMNS = ("etag", "last_modified", "content_hash", "size", "fetches", "changes", "last_fetched", "last_changed")
+
+
+def content_hash(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class RecrawlState:
+
+    def __init__(self, path, min_change_rate=0.1, max_age=7 * 24 * 3600, flush_rows=1000):
+        self.path = path
+        self.min_change_rate = min_change_rate
+        self.max_age = max_age
+        self.flush_rows = flush_rows
+        self.db = sqlite3.connect(path)
+        self.db.execute(SCHEMA)
+        # the whole table is read once; a crawl's lookups and updates then stay in memory
+        self.pages = {row[0]: dict(zip(COLUMNS, row[1:])) for row in self.db.execute(f"SELECT url, {', '.join(COLUMNS)} FROM pages")}
+        self.known = len(self.pages)
+        self.dirty = set()
+        self.conditional = 0
+        self.not_modified = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.new = 0
+        self.skipped = set()  # URLs not requested, however often they were linked
+        self.bytes_saved = 0  # stored sizes of the pages that came back 304
+
+    def change_rate(self, url):
+        page = self.pages.get(url)
+        if page is None:
+            return 1.0
+        return (page["changes"] + 1) / (page["fetches"] + 1)
+
+    def due(self, url, now=None):
+        # False for a URL unlikely to have changed since its last fetch
+        page = self.pages.get(url)
+        if page is None or self.change_rate(url) >= self.min_change_rate:
+            return True
+        return (now or time.time()) - page["last_fetched"] >= self.max_age
+
+    def prepare(self, request):
+        # The request with its validators and change-rate priority, or None when it is not due
+        url = request.url
+        if not self.due(url):
+            self.skipped.add(url)
+            return None
+        page = self.pages.get(url)
+        priority = request.priority + int(100 * self.change_rate(url))
+        if page is None:
+            return request.replace(priority=priority)
+        headers = request.headers.copy()
+        if page["etag"]:
+            headers.setdefault("If-None-Match", page["etag"])
+        if page["last_modified"]:
+            headers.setdefault("If-Modified-Since", page["last_modified"])
+        return request.replace(headers=headers, priority=priority)
+
+    def seeds(self):
+        # Known URLs, most likely to have changed first
+        return sorted(self.pages, key=self.change_rate, reverse=True)
+
+    def record_request(self, request):
+        if b"If-None-Match" in request.headers or b"If-Modified-Since" in request.headers:
+            self.conditional += 1
+
+    def record_not_modified(self, url):
+        page = self.pages.get(url)
+        if page is None:
+            return
+        self.not_modified += 1
+        self.bytes_saved += page["size"] or 0
+        page["fetches"] += 1
+        page["last_fetched"] = time.time()
+        self.mark(url)
+
+    def record_response(self, url, etag, last_modified, body):
+        # True if the page changed since the last crawl, False if not, None for a new URL
+        digest = content_hash(body)
+        now = time.time()
+        page = self.pages.get(url)
+        if page is None:
+            self.new += 1
+            changed = None
+            page = self.pages[url] = {"fetches": 0, "changes": 0, "last_changed": now}
+        else:
+            changed = digest != page["content_hash"]
+            if changed:
+                self.changed += 1
+                page["changes"] += 1
+                page["last_changed"] = now
+            else:
+                self.unchanged += 1
+        page.update(etag=etag, last_modified=last_modified, content_hash=digest, size=len(body), last_fetched=now)
+        page["fetches"] += 1
+        self.mark(url)
+        return changed
+
+    def mark(self, url):
+        self.dirty.add(url)
+        if len(self.dirty) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        rows = [(url, *(self.pages[url][column] for column in COLUMNS)) for url in self.dirty]
+        with self.db:
+            self.db.executemany(f"INSERT OR REPLACE INTO pages (url, {', '.join(COLUMNS)}) "
+                                f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", rows)
+        self.dirty.clear()
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def bytes_skipped(self):
+        # stored sizes of the pages not requested
+        return sum(self.pages[url]["size"] or 0 for url in self.skipped)
+
+    def report(self, bytes_downloaded):
+        # bytes_downloaded: response bytes of this crawl; a full crawl would also have
+        # downloaded the pages that came back 304 or were not requested
+        saved = self.bytes_saved + self.bytes_skipped()
+        full = bytes_downloaded + saved
+        lines = [
+            "Re-crawl:", "=========",
+            f"# URLs known from earlier crawls: {self.known}",
+            f"# Conditional requests: {self.conditional}",
+            f"# 304 Not Modified: {self.not_modified}",
+            f"# Changed pages: {self.changed}",
+            f"# Unchanged pages (200 with the same content): {self.unchanged}",
+            f"# New pages: {self.new}",
+            f"# Not requested (unlikely to have changed): {len(self.skipped)}",
+            f"# Bytes downloaded: {bytes_downloaded}",
+            f"# Bytes saved compared with a full crawl: {saved} of {full}"
+            + (f" ({100 * saved / full:.1f}%)" if full else ""),
+        ]
+        return "\n".join(lines) + "\n\n"
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            settings.get("RECRAWL_STATE", "recrawl_latimes.sqlite"),
+            min_change_rate=settings.getfloat("RECRAWL_MIN_CHANGE_RATE", 0.1),
+            max_age=settings.getfloat("RECRAWL_MAX_AGE", 7 * 24 * 3600),
+        )
@@ -0,0 +1,154 @@
+# Scheduler whose JOBDIR state survives a crawl that is killed (SIGKILL, out of memory, a
+# second Ctrl-C), not only one that is stopped gracefully (SCHEDULER).
+#
+# Scrapy writes the state of its disk queues (requests.queue/active.json) and the dupefilter
+# only when the spider closes. After a kill the queued requests are lost and the seen-set is
+# whatever was saved at the last graceful stop. So every request this scheduler queues is also
+# appended to JOBDIR/requests.journal, and every request it hands to the engine is marked done
+# there, one unbuffered write each. On open, the journal is replayed: the seen requests go into
+# the dupefilter, the pending ones back into freshly created disk queues. A request is marked
+# done before it is downloaded, so it is never requested twice; the requests being downloaded
+# when the crawl was killed are lost.
+#
+# The journal is compacted to the pending requests once it holds more done requests than
+# pending ones (and at least JOBDIR_CHECKPOINT_INTERVAL), right after the dupefilter saved its
+# state (its checkpoint() method; without one the journal is never compacted), and when the
+# spider closes. Without JOBDIR it is Scrapy's scheduler.
+
+import logging
+import os
+import pickle
+import shutil
+from collections import Counter
+
+from scrapy.core.scheduler import Scheduler
+from scrapy.utils.request import request_from_dict
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE = "requests.journal"
+
+
+def read_journal(path):
+    # ("+", fingerprint, request dict) for a queued request, ("-", fingerprint) for a done one; a
+    # record cut short by the kill ends the journal
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+            except pickle.UnpicklingError:
+                logger.warning("Ignoring a truncated record at the end of %s", path)
+                return
+
+
+def pending_records(path):
+    # the queued records without a done record, in queue order; a fingerprint queued twice (a
+    # retry) is done in the same order
+    done = Counter(record[1] for record in read_journal(path) if record[0] == "-")
+    for record in read_journal(path):
+        if record[0] == "+":
+            if done[record[1]]:
+                done[record[1]] -= 1
+            else:
+                yield record
+
+
+class JournaledScheduler(Scheduler):
+
+    def __init__(self, *args, checkpoint_interval=1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkpoint_interval = checkpoint_interval
+        self.journal_path = os.path.join(os.path.dirname(self.dqdir), JOURNAL_FILE) if self.dqdir else None
+        self.journal = None
+        self.done_since_checkpoint = 0
+        self.save_dupefilter = getattr(self.df, "checkpoint", None)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler = super().from_crawler(crawler)
+        scheduler.checkpoint_interval = crawler.settings.getint("JOBDIR_CHECKPOINT_INTERVAL", 1000)
+        return scheduler
+
+    def open(self, spider):
+        if self.journal_path is None:
+            return super().open(spider)
+        resumed = os.path.exists(self.journal_path)
+        if resumed:
+            # the journal has every pending request; the disk queues may be from an earlier stop
+            shutil.rmtree(self.dqdir)
+            os.makedirs(self.dqdir)
+        result = super().open(spider)
+        if resumed:
+            self.recover(spider)
+        self.checkpoint()
+        return result
+
+    def recover(self, spider):
+        for record in read_journal(self.journal_path):
+            if record[0] == "+" and not record[2]["dont_filter"]:
+                self.df.request_seen(request_from_dict(record[2], spider=spider))
+        pending = 0
+        for _, _, request_dict in pending_records(self.journal_path):
+            # past the dupefilter, which has just seen them
+            request = request_from_dict(request_dict, spider=spider)
+            if not self._dqpush(request):
+                self._mqpush(request)
+            pending += 1
+        logger.info("Recovered %d pending requests from %s", pending, self.journal_path)
+
+    def checkpoint(self):
+        # the dupefilter's state first: afterwards it is the only record of the done requests.
+        # Without a dupefilter checkpoint the journal keeps them, and is only rewritten on open,
+        # which drops a record a kill cut short
+        if self.journal is not None:
+            self.journal.close()
+        if os.path.exists(self.journal_path):
+            if self.save_dupefilter is not None:
+                self.save_dupefilter()
+            self.compact(keep_done=self.save_dupefilter is None)
+        self.journal = open(self.journal_path, "ab", buffering=0)
+        self.done_since_checkpoint = 0
+
+    def compact(self, keep_done=False):
+        records = read_journal(self.journal_path) if keep_done else pending_records(self.journal_path)
+        with open(self.journal_path + ".tmp", "wb") as f:
+            for record in records:
+                pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+
+    def write(self, record):
+        # one write() per record, so a kill leaves at most the last one incomplete
+        self.journal.write(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+
+    def enqueue_request(self, request):
+        if not super().enqueue_request(request):
+            return False
+        if self.journal is not None:
+            try:
+                request_dict = request.to_dict(spider=self.spider)
+            except ValueError:
+                # not serializable, so also kept in memory only by Scrapy's scheduler
+                return True
+            self.write(("+", self.crawler.request_fingerprinter.fingerprint(request), request_dict))
+        return True
+
+    def next_request(self):
+        request = super().next_request()
+        if request is not None and self.journal is not None:
+            self.write(("-", self.crawler.request_fingerprinter.fingerprint(request)))
+            self.done_since_checkpoint += 1
+            if self.save_dupefilter is not None and self.done_since_checkpoint >= max(self.checkpoint_interval, len(self)):
+                self.checkpoint()
+        return request
+
+    def close(self, reason):
+        # Scrapy's scheduler saves the dupefilter's state in close(), so only the journal is left
+        result = super().close(reason)
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+            if self.save_dupefilter is not None:
+                self.compact()
+        return result
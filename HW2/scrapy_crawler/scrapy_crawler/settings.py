@@ -47,24 +47,114 @@ ROBOTSTXT_OBEY = True
 #SPIDER_MIDDLEWARES = {
 #    "scrapy_crawler.middlewares.ScrapyCrawlerSpiderMiddleware": 543,
 #}
+# Next to the spider (after DepthMiddleware, 900), so it times the callback alone
+SPIDER_MIDDLEWARES = {
+    "scrapy_crawler.middlewares.StageTimingSpiderMiddleware": 950,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #DOWNLOADER_MIDDLEWARES = {
 #    "scrapy_crawler.middlewares.ScrapyCrawlerDownloaderMiddleware": 543,
 #}
+# Sees responses before RetryMiddleware (550) turns errors into retries
+DOWNLOADER_MIDDLEWARES = {
+    "scrapy_crawler.middlewares.AdaptiveConcurrencyMiddleware": 580,
+}
+
+# Per-host adaptive concurrency (see AdaptiveConcurrencyMiddleware), off by default. To use it,
+# also raise CONCURRENT_REQUESTS, which becomes the global cap, schedule by host load, and
+# enforce the per-host limits, which Scrapy's own downloader overshoots (see downloader.py; it
+# overrides Scrapy internals and refuses to start with any Scrapy but 2.19):
+#   ADAPTIVE_CONCURRENCY_ENABLED = True
+#   CONCURRENT_REQUESTS = 64
+#   SCHEDULER_PRIORITY_QUEUE = "scrapy_crawler.pqueues.HostLoadPriorityQueue"
+#   DOWNLOADER = "scrapy_crawler.downloader.SlotLimitedDownloader"
+ADAPTIVE_CONCURRENCY_ENABLED = False
+ADAPTIVE_CONCURRENCY_START = 2
+ADAPTIVE_CONCURRENCY_MIN = 1
+ADAPTIVE_CONCURRENCY_MAX = 4
+ADAPTIVE_CONCURRENCY_MAX_LATENCY = 2.0
+ADAPTIVE_CONCURRENCY_PROBE_WINDOWS = 0
+ADAPTIVE_CONCURRENCY_BACKOFF_DELAY = 0.25
+ADAPTIVE_CONCURRENCY_MAX_DELAY = 10.0
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
 #EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
 #}
+EXTENSIONS = {
+    "scrapy_crawler.instrumentation.StageTimings": 500,
+}
+
+# Per-stage latency histograms (DNS, scheduler queue, download, callback CPU, link extraction,
+# item pipelines) and sampled queue depths, off by default: a JSON snapshot in
+# STAGE_TIMINGS_FILE every STAGE_TIMINGS_INTERVAL seconds and a breakdown in the crawl report.
+# To use them, with DNS lookup times recorded by a resolver that wraps Scrapy's default one:
+#   STAGE_TIMINGS_ENABLED = True
+#   TWISTED_DNS_RESOLVER = "scrapy_crawler.instrumentation.TimedResolver"
+STAGE_TIMINGS_ENABLED = False
+STAGE_TIMINGS_FILE = "stage_timings_latimes.json"
+STAGE_TIMINGS_INTERVAL = 10.0
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "scrapy_crawler.pipelines.ScrapyCrawlerPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "scrapy_crawler.pipelines.ScrapyCrawlerPipeline": 300,
+    "scrapy_crawler.pipelines.DocumentShardPipeline": 400,
+}
+
+# Crawl log CSV files: rows buffered before a flush, seconds between flushes,
+# and "csv" (quoted where needed) or "legacy" (unquoted, as before)
+CSV_LOG_FLUSH_ROWS = 5000
+CSV_LOG_FLUSH_INTERVAL = 5.0
+CSV_LOG_FORMAT = "csv"
+
+# Duplicate request filter: a Bloom filter sized for BLOOM_DUPEFILTER_CAPACITY requests at
+# BLOOM_DUPEFILTER_ERROR_RATE false positives, saved in JOBDIR so a stopped crawl can resume
+# (scrapy crawl latimes -s JOBDIR=crawls/latimes-1)
+DUPEFILTER_CLASS = "scrapy_crawler.dupefilters.BloomDupeFilter"
+BLOOM_DUPEFILTER_CAPACITY = 1000000
+BLOOM_DUPEFILTER_ERROR_RATE = 0.0001
+
+# With JOBDIR, every queued request is journaled as well, so that a killed crawl also resumes
+# without refetching pages (see scheduler.py). Every JOBDIR_CHECKPOINT_INTERVAL pages the report
+# counters and near-duplicate state are saved, and at the earliest then the journal is compacted;
+# a kill loses the counters of the pages parsed since the last checkpoint
+SCHEDULER = "scrapy_crawler.scheduler.JournaledScheduler"
+JOBDIR_CHECKPOINT_INTERVAL = 1000
+
+# Crawl report counters: "exact" unique URL sets or "hll" (HyperLogLog) sketches,
+# and seconds between JSON snapshots of the report (0 disables them)
+CRAWL_STATS_UNIQUE = "exact"
+CRAWL_STATS_HLL_PRECISION = 14
+CRAWL_STATS_SNAPSHOT_INTERVAL = 0
+
+# Near-duplicate pages (tag pages, paginated listings, AMP and print variants): a SimHash of
+# every HTML page's text, looked up among the earlier pages. Pages within
+# NEAR_DUPLICATE_DISTANCE bits of one are flagged in the visit log and counted in the report,
+# and with NEAR_DUPLICATE_SKIP_OUTLINKS their links are not followed
+NEAR_DUPLICATE_ENABLED = False
+NEAR_DUPLICATE_DISTANCE = 3
+NEAR_DUPLICATE_SKIP_OUTLINKS = False
+
+# Main text of every HTML page as "docID\tcontent" lines, the input of the HW3 indexers, in
+# gzip shards of about DOCUMENT_SHARDS_MAX_BYTES of text each, listed in
+# DOCUMENT_SHARDS_DIR/manifest.json as they are completed (see DocumentShardPipeline)
+DOCUMENT_SHARDS_ENABLED = False
+DOCUMENT_SHARDS_DIR = "shards"
+DOCUMENT_SHARDS_MAX_BYTES = 16 * 1024 * 1024
+
+# Re-crawl mode: validators (ETag, Last-Modified), content hashes and change counts of every
+# page are kept in RECRAWL_STATE between crawls. The next crawl starts from all known pages,
+# sends conditional requests (304 responses are logged but not processed again) and orders
+# pages by change rate; pages changing on fewer than RECRAWL_MIN_CHANGE_RATE of their fetches
+# are only refetched after RECRAWL_MAX_AGE seconds
+RECRAWL_ENABLED = False
+RECRAWL_STATE = "recrawl_latimes.sqlite"
+RECRAWL_MIN_CHANGE_RATE = 0.1
+RECRAWL_MAX_AGE = 7 * 24 * 3600
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -1,9 +1,18 @@
+import os
+import time
 import scrapy
+from scrapy.link import Link
 from scrapy.spiders import CrawlSpider, Rule
-from scrapy.linkextractors import LinkExtractor
-from urllib.parse import urlparse
-import pandas as pd
-import os
+from twisted.internet import task
+from scrapy import signals
+from scrapy.utils.job import job_dir
+from scrapy_crawler.crawl_stats import CrawlStats
+from scrapy_crawler.documents import main_text
+from scrapy_crawler.items import DocumentItem, FetchItem, UrlsItem, VisitItem
+from scrapy_crawler.linkextractors import HostClassifier, SinglePassLinkExtractor
+from scrapy_crawler.neardup import NearDuplicateDetector
+from scrapy_crawler.recrawl import RecrawlState
+from scrapy_crawler.scheduler import JOURNAL_FILE
 
 class latimesSpider(CrawlSpider):
     name = "latimes"
@@ -11,11 +20,12 @@ class latimesSpider(CrawlSpider):
     start_urls = ["https://www.latimes.com/"]
     base_domain = "latimes.com"  # Base domain for checking internal/external links
 
-    # CSV Files
+    # CSV Files, written by ScrapyCrawlerPipeline
     fetch_file = "fetch_latimes.csv"
     visit_file = "visit_latimes.csv"
     urls_file = "urls_latimes.csv"
     report_file = "CrawlReport_latimes.txt"
+    snapshot_file = "CrawlReport_latimes.snapshot.json"  # live report counters, see CRAWL_STATS_SNAPSHOT_INTERVAL
 
     custom_settings = {
         "CLOSESPIDER_PAGECOUNT": 20000,  # Limit crawling to 20,000 pages
@@ -31,31 +41,139 @@ class latimesSpider(CrawlSpider):
     # Allowed file types for crawling
     allowed_file_types = (".html", ".htm", ".pdf", ".doc", ".docx",".jpg", ".jpeg", ".png", ".gif", ".tiff", ".webp")
 
+    # One pass over each page gives both the links to follow and parse_item's outlinks
+    link_extractor = SinglePassLinkExtractor(
+        allow=allowed_file_types,  # Restrict links to specific formats
+        tags=('a', 'img', 'source', 'video', 'audio', 'link', 'script'),
+        attrs=('href', 'src'),
+    )
+
+    # Set by the StageTimings extension when STAGE_TIMINGS_ENABLED
+    stage_timings = None
+
     rules = (
         Rule(
-            LinkExtractor(
-                allow=allowed_file_types,  # Restrict links to specific formats
-                tags=('a', 'img', 'source', 'video', 'audio', 'link', 'script'),
-                attrs=('href', 'src'),
-            ),
+            link_extractor,
             callback="parse_item",
             follow=True,
+            process_request="prepare_request",
         ),
     )
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, domain=None, start_url=None, allowed_domains=None, **kwargs):
+        # Another site: scrapy crawl latimes -a domain=example.com [-a start_url=https://www.example.com/]
+        # domain may carry a port (127.0.0.1:8000), so links on a local test site count as internal;
+        # allowed_domains is a comma-separated list of hosts, by default the domain's host
         super().__init__(*args, **kwargs)
-        
-        # Initialize CSV files with headers
-        with open(self.fetch_file, "w") as f:
-            f.write("URL,Status\n")
-        
-        with open(self.visit_file, "w") as f:
-            f.write("URL,Size (Bytes),Outlinks,Content-Type\n")
-        
-        with open(self.urls_file, "w") as f:
-            f.write("Encountered URL,Indicator\n")
-    
+        if domain:
+            self.base_domain = domain
+            self.allowed_domains = [domain.split(":")[0]]
+            self.start_urls = [start_url or f"https://{domain}/"]
+        elif start_url:
+            self.start_urls = [start_url]
+        if allowed_domains:
+            self.allowed_domains = allowed_domains.split(",")
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        # Callables returning extra crawl report sections, added by extensions (see StageTimings)
+        spider.report_sections = []
+        # Report counters, updated for every parsed page; crawl_stats.snapshot() is the live report.
+        # A crawl resumed from a JOBDIR (which has the scheduler's journal, see scheduler.py)
+        # continues the counters of its earlier runs, as of their last checkpoint
+        jobdir = job_dir(crawler.settings)
+        spider.stats_file = os.path.join(jobdir, "crawl_stats.pickle") if jobdir else None
+        spider.resumed = bool(jobdir) and os.path.exists(os.path.join(jobdir, JOURNAL_FILE))
+        if spider.stats_file and os.path.exists(spider.stats_file):
+            spider.crawl_stats = CrawlStats.load(spider.stats_file)
+        else:
+            spider.crawl_stats = CrawlStats.from_settings(crawler.settings)
+        spider.checkpoint_interval = crawler.settings.getint("JOBDIR_CHECKPOINT_INTERVAL", 1000)
+        spider.snapshot_interval = crawler.settings.getfloat("CRAWL_STATS_SNAPSHOT_INTERVAL", 0)
+        spider.snapshot_timer = None
+        crawler.signals.connect(spider.start_snapshots, signal=signals.spider_opened)
+        spider.classify_host = HostClassifier(spider.base_domain)  # "OK" (internal) or "N_OK"
+        spider.extract_documents = crawler.settings.getbool("DOCUMENT_SHARDS_ENABLED")  # DocumentItems for DocumentShardPipeline
+
+        # Near-duplicate detection (NEAR_DUPLICATE_ENABLED), also continued from the JOBDIR
+        spider.near_duplicates = None
+        spider.near_duplicates_file = os.path.join(jobdir, "near_duplicates.pickle") if jobdir else None
+        if crawler.settings.getbool("NEAR_DUPLICATE_ENABLED"):
+            if spider.near_duplicates_file and os.path.exists(spider.near_duplicates_file):
+                spider.near_duplicates = NearDuplicateDetector.load(spider.near_duplicates_file)
+            else:
+                spider.near_duplicates = NearDuplicateDetector(crawler.settings.getint("NEAR_DUPLICATE_DISTANCE", 3))
+            spider.skip_near_duplicate_outlinks = crawler.settings.getbool("NEAR_DUPLICATE_SKIP_OUTLINKS")
+            crawler.signals.connect(spider.record_request, signal=signals.request_reached_downloader)
+
+        # Re-crawl mode (RECRAWL_ENABLED): conditional requests for the pages of earlier crawls
+        spider.recrawl = RecrawlState.from_settings(crawler.settings) if crawler.settings.getbool("RECRAWL_ENABLED") else None
+        if spider.recrawl is not None:
+            crawler.signals.connect(spider.record_recrawl_request, signal=signals.request_reached_downloader)
+        return spider
+
+    # A resumed crawl continues from the requests pending in JOBDIR; the start URLs are not
+    # dupefiltered, so yielding them again would refetch them
+    async def start(self):
+        if not self.resumed:
+            async for item_or_request in super().start():
+                yield self.prepare_start_request(item_or_request)
+            for request in self.recrawl_seeds():
+                yield request
+
+    def start_requests(self):
+        # Scrapy versions before 2.13 call this instead of start()
+        if not self.resumed:
+            for request in super().start_requests():
+                yield self.prepare_start_request(request)
+            yield from self.recrawl_seeds()
+
+    def prepare_start_request(self, request):
+        # The start URLs are always fetched, conditionally if they were fetched before
+        if self.recrawl is None or not isinstance(request, scrapy.Request):
+            return request
+        return self.prepare_request(request, None) or request
+
+    def recrawl_seeds(self):
+        # In re-crawl mode the crawl also starts from every page of the earlier crawls that is due,
+        # most likely to have changed first, as the rule would request it
+        if self.recrawl is None:
+            return
+        for url in self.recrawl.seeds():
+            if url not in self.start_urls:
+                request = self.prepare_request(self._build_request(0, Link(url)), None)
+                if request is not None:
+                    yield request
+
+    def prepare_request(self, request, response):
+        # The rule's process_request: validators and change-rate priority, None if not due
+        if self.recrawl is None:
+            return request
+        return self.recrawl.prepare(request)
+
+    def record_recrawl_request(self, request, spider=None):
+        self.recrawl.record_request(request)
+
+    def start_snapshots(self, spider):
+        if self.snapshot_interval > 0:
+            self.snapshot_timer = task.LoopingCall(self.crawl_stats.write_snapshot, self.snapshot_file)
+            self.snapshot_timer.start(self.snapshot_interval, now=False)
+
+    def record_request(self, request, spider=None):
+        # Downloaded requests, so that skipped outlinks the crawl fetched anyway are not counted as avoided
+        self.near_duplicates.record_request(self.crawler.request_fingerprinter.fingerprint(request))
+
+    def _requests_to_follow(self, response):
+        # The links of a near-duplicate are those of the page it repeats, or of more near-duplicates
+        # (an AMP page links to other AMP pages), so with NEAR_DUPLICATE_SKIP_OUTLINKS they are dropped
+        requests = super()._requests_to_follow(response)
+        if self.near_duplicates is None or not self.skip_near_duplicate_outlinks or not response.meta.get("near_duplicate_of"):
+            yield from requests
+            return
+        for request in requests:
+            if request is not None:
+                self.near_duplicates.record_skipped(self.crawler.request_fingerprinter.fingerprint(request))
 
     def parse_item(self, response):
         
@@ -63,14 +181,28 @@ class latimesSpider(CrawlSpider):
         redirect_urls = response.meta.get("redirect_urls", [])  # Get previous URL(s) if redirected
 
         # Store all attempted URLs
-        with open(self.fetch_file, "a") as f:
-            f.write(f"{response.url},{response.status}\n")
+        yield FetchItem(url=response.url, status=response.status)
+        self.crawl_stats.record_fetch(response.status)
+        if self.stats_file and self.crawl_stats.fetches % self.checkpoint_interval == 0:
+            self.checkpoint()
+        encountered = []
+
+        # An unchanged page in re-crawl mode: logged as fetched, not processed again
+        if response.status == 304 and self.recrawl is not None:
+            self.recrawl.record_not_modified(response.url)
 
         # If successful (HTTP 200), process it for visit file
         if response.status == 200:
             content_size = len(response.body) if response.body else 0
 
-            outlinks = response.css("a::attr(href)").getall() or [] # Extract all outlinks
+            if self.recrawl is not None:
+                self.recrawl.record_response(response.url, response.headers.get("ETag", b"").decode(errors="ignore"),
+                                             response.headers.get("Last-Modified", b"").decode(errors="ignore"), response.body)
+
+            start = time.thread_time()
+            outlinks = self.link_extractor.page_links(response).outlinks  # All outlinks, already absolute
+            if self.stage_timings is not None:
+                self.stage_timings.record("link extraction cpu", time.thread_time() - start)
             
             # Extract Content-Type safely
             raw_content_type = response.headers.get("Content-Type", b"").decode(errors="ignore") if response.headers.get("Content-Type") else "unknown"
@@ -78,121 +210,80 @@ class latimesSpider(CrawlSpider):
             # Ensure we always get a valid content type
             content_type = raw_content_type.split(';')[0].strip() if raw_content_type else "unknown"
 
+            # Flag near-duplicates of earlier pages (also read by _requests_to_follow)
+            near_duplicate_of = None
+            if self.near_duplicates is not None and content_type == "text/html":
+                near_duplicate_of = self.near_duplicates.check(response.url, response.body)
+                if near_duplicate_of:
+                    response.meta["near_duplicate_of"] = near_duplicate_of
 
-            with open(self.visit_file, "a") as f:
-                f.write(f"{response.url},{content_size:.2f},{len(outlinks)},{content_type}\n")
+            yield VisitItem(url=response.url, size=content_size, outlinks=len(outlinks), content_type=content_type,
+                            near_duplicate_of=near_duplicate_of)
+            self.crawl_stats.record_visit(content_size, content_type)
 
-            # Store all encountered URLs with OK/N_OK indicator
-            for link in outlinks:
-                absolute_url = response.urljoin(link)
-                indicator = "OK" if urlparse(absolute_url).netloc.endswith(self.base_domain) else "N_OK"
+            # Main text for the HW3 indexers
+            if self.extract_documents and content_type == "text/html":
+                text = main_text(response)
+                if text:
+                    yield DocumentItem(url=response.url, text=text)
 
-                with open(self.urls_file, "a") as f:
-                    f.write(f"{absolute_url},{indicator}\n")
+            # Store all encountered URLs with OK/N_OK indicator
+            encountered = [(absolute_url, self.classify_host(absolute_url)) for absolute_url in outlinks]
 
         # If this response is a redirected URL, log both the original and the final URL
         if redirect_urls:
             for original_url in redirect_urls:
                 # Determine if the original URL is internal or external
-                redirect_indicator = "OK" if urlparse(original_url).netloc.endswith(self.base_domain) else "N_OK"
-                with open(self.urls_file, "a") as f:
-                    f.write(f"{original_url},{redirect_indicator}\n")
+                encountered.append((original_url, self.classify_host(original_url)))
+
+        # One item per page rather than one per outlink
+        if encountered:
+            yield UrlsItem(urls=encountered)
+            self.crawl_stats.record_urls(encountered)
 
 
+    def checkpoint(self):
+        # The JOBDIR state a resumed crawl continues from, every JOBDIR_CHECKPOINT_INTERVAL pages
+        # and at the end, so that a killed crawl only loses the counters since the last one
+        self.crawl_stats.save(self.stats_file)
+        if self.near_duplicates is not None and self.near_duplicates_file:
+            self.near_duplicates.save(self.near_duplicates_file)
+
     def closed(self, reason):
         """ Generates statistics and saves to CrawlReport_latimes.txt """
-        
-        # Read CSV files
-        fetch_df = pd.read_csv(self.fetch_file, on_bad_lines='skip') if os.path.exists(self.fetch_file) else pd.DataFrame(columns=["URL", "Status"])
-        visit_df = pd.read_csv(self.visit_file, on_bad_lines='skip') if os.path.exists(self.visit_file) else pd.DataFrame(columns=["URL", "Size (Bytes)", "Outlinks", "Content-Type"])
-        urls_df = pd.read_csv(self.urls_file, on_bad_lines='skip') if os.path.exists(self.urls_file) else pd.DataFrame(columns=["Encountered URL", "Indicator"])
-
-        # Major HTTP Status Code Descriptions
-        status_code_descriptions = {
-            200: "OK",
-            201: "Created",
-            204: "No Content",
-            301: "Moved Permanently",
-            302: "Found (Moved Temporarily)",
-            304: "Not Modified",
-            400: "Bad Request",
-            401: "Unauthorized",
-            403: "Forbidden",
-            404: "Not Found",
-            405: "Method Not Allowed",
-            408: "Request Timeout",
-            429: "Too Many Requests",
-            500: "Internal Server Error",
-            502: "Bad Gateway",
-            503: "Service Unavailable",
-            504: "Gateway Timeout",
-        }
-
-        visit_df["Size (Bytes)"] = visit_df["Size (Bytes)"].astype(float).round(2)
-        
-        # Fetch statistics
-        total_fetches = len(fetch_df)
-        successful_fetches = len(fetch_df[fetch_df["Status"].between(200, 299)])
-        failed_fetches = total_fetches - successful_fetches
-
-        # Outgoing URLs statistics
-        total_extracted = len(urls_df)
-        unique_extracted = urls_df["Encountered URL"].nunique()
-        unique_internal = len(urls_df[urls_df["Indicator"] == "OK"]["Encountered URL"].unique())
-        unique_external = len(urls_df[urls_df["Indicator"] == "N_OK"]["Encountered URL"].unique())
-
-
-        # HTTP Status Code Counts
-        status_counts = fetch_df["Status"].value_counts().to_dict()
-        # Format status codes with descriptions
-        formatted_status_codes = []
-        for code, count in sorted(status_counts.items()):  # Sort by status code
-            description = status_code_descriptions.get(code, "") 
-            formatted_status_codes.append(f"{code} {description}: {count}")
-
-        # File size distribution
-        file_sizes = visit_df["Size (Bytes)"].astype(float)
-        size_ranges = {
-            "< 1 KB": sum(file_sizes < 1024),  # Less than 1 KB (1024 bytes)
-            "1 KB - 10 KB": sum((file_sizes >= 1024) & (file_sizes < 10 * 1024)),  # 1 KB to 10 KB
-            "10 KB - 100 KB": sum((file_sizes >= 10 * 1024) & (file_sizes < 100 * 1024)),  # 10 KB to 100 KB
-            "100 KB - 1 MB": sum((file_sizes >= 100 * 1024) & (file_sizes < 1024 * 1024)),  # 100 KB to 1 MB
-            "> 1 MB": sum(file_sizes >= 1024 * 1024),  # Greater than 1 MB
-        }
-
-
-        # Content types encountered
-        content_types = visit_df["Content-Type"].value_counts().to_dict()
-
-        # Writing statistics to file
+
+        # Writing statistics to file; the counters were kept up to date during the crawl
         with open(self.report_file, "w") as f:
             f.write(f"Name: Komali Beeram\n")
             f.write(f"USC ID: 9327372983\n")
-            f.write(f"News site crawled: latimes.com\n")
-            f.write(f"Number of threads: {self.custom_settings['CONCURRENT_REQUESTS']}\n\n")
-
-            f.write("Fetch Statistics\n================\n")
-            f.write(f"# Fetches attempted: {total_fetches}\n")
-            f.write(f"# Fetches succeeded: {successful_fetches}\n")
-            f.write(f"# Fetches failed or aborted: {failed_fetches}\n\n")
-
-            f.write("Outgoing URLs:\n================\n")
-            f.write(f"Total URLs extracted: {total_extracted}\n")
-            f.write(f"# Unique URLs extracted: {unique_extracted}\n")
-            f.write(f"# Unique URLs within News Site: {unique_internal}\n")
-            f.write(f"# Unique URLs outside News Site: {unique_external}\n\n")
-
-            f.write("Status Codes:\n================\n")
-            f.write("\n".join(formatted_status_codes) + "\n\n")
-
-            f.write("File Sizes:\n================\n")
-            for size_range, count in size_ranges.items():
-                f.write(f"{size_range}: {count}\n")
-            f.write("\n")
-
-            f.write("Content Types:\n================\n")
-            for ctype, count in content_types.items():
-                f.write(f"{ctype}: {count}\n")
-            f.write("\n")
-
-        print(f"\nCrawl Report saved as {self.report_file}")
\ No newline at end of file
+            f.write(f"News site crawled: {self.base_domain}\n")
+            f.write(f"Number of threads: {self.settings.getint('CONCURRENT_REQUESTS')}\n\n")
+            f.write(self.crawl_stats.report())
+            if self.near_duplicates is not None:
+                f.write(self.near_duplicates.report())
+            if self.recrawl is not None:
+                f.write(self.recrawl.report(self.crawler.stats.get_value("downloader/response_bytes", 0)))
+            for section in self.report_sections:
+                f.write(section())
+        if self.stats_file:
+            self.checkpoint()
+        if self.near_duplicates is not None:
+            stats = self.crawler.stats
+            stats.set_value("near_duplicates/pages", self.near_duplicates.near_duplicates)
+            stats.set_value("near_duplicates/outlinks_skipped", self.near_duplicates.outlinks_skipped)
+            stats.set_value("near_duplicates/fetches_avoided", self.near_duplicates.fetches_avoided())
+
+        if self.recrawl is not None:
+            stats = self.crawler.stats
+            stats.set_value("recrawl/conditional_requests", self.recrawl.conditional)
+            stats.set_value("recrawl/not_modified", self.recrawl.not_modified)
+            stats.set_value("recrawl/changed", self.recrawl.changed)
+            stats.set_value("recrawl/skipped", len(self.recrawl.skipped))
+            stats.set_value("recrawl/bytes_saved", self.recrawl.bytes_saved + self.recrawl.bytes_skipped())
+            self.recrawl.close()
+
+        if self.snapshot_timer is not None and self.snapshot_timer.running:
+            self.snapshot_timer.stop()
+            self.crawl_stats.write_snapshot(self.snapshot_file)
+
+        print(f"\nCrawl Report saved as {self.report_file}")
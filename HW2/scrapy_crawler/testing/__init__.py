@@ -0,0 +1,5 @@
+# Local stand-in sites (mock_site, multi_host_site, synthetic_site), the crawl runner
+# (mock_crawl) and latimes page fixtures (latimes_pages) shared by the tests and the
+# benchmarks; the sites also run on their own, e.g.
+#
+#   python -m testing.mock_site --port 8000
@@ -0,0 +1,85 @@
+import csv
+import glob
+import os
+import random
+from urllib.parse import quote, unquote, urlparse
+
+from scrapy_crawler.spiders.news import latimesSpider
+
+# Saved or generated latimes pages for link extraction, and the two ways of extracting their
+# links: the old two passes (the rule's LinkExtractor, then response.css("a::attr(href)"),
+# response.urljoin and urlparse in parse_item) and one SinglePassLinkExtractor pass with
+# HostClassifier.
+#
+# Saved pages are one file per page named after its quoted URL. generate_fixtures() writes pages
+# shaped like the crawled ones instead: sizes and outlink counts drawn from visit_latimes.csv,
+# link targets from fetch_latimes.csv, plus the CDN images, scripts, stylesheets, social links
+# and inline JSON of a latimes page.
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EXTRACTOR_ARGS = dict(allow=latimesSpider.allowed_file_types, tags=('a', 'img', 'source', 'video', 'audio', 'link', 'script'),
+                      attrs=('href', 'src'))
+EXTERNAL = ["https://www.facebook.com/latimes", "https://twitter.com/latimes", "https://www.instagram.com/latimes/",
+            "https://www.youtube.com/user/losangelestimes", "https://apps.apple.com/us/app/los-angeles-times/id373238146",
+            "https://www.latimes.com/about/terms-of-service", "https://myaccount.latimes.com/",
+            "mailto:letters@latimes.com", "javascript:void(0)", "#main-content"]
+
+
+def generate_fixtures(directory, count, seed=0):
+    rng = random.Random(seed)
+    with open(os.path.join(PROJECT_DIR, "visit_latimes.csv"), newline="") as f:
+        pages = [row for row in list(csv.reader(f))[1:] if row[3] == "text/html"]
+    with open(os.path.join(PROJECT_DIR, "fetch_latimes.csv"), newline="") as f:
+        paths = [urlparse(row[0]).path for row in list(csv.reader(f))[1:]]
+    os.makedirs(directory, exist_ok=True)
+    for url, size, outlinks, _ in rng.sample(pages, count):
+        parts = ["<!DOCTYPE html><html lang='en'><head><meta charset='utf-8'><title>Los Angeles Times</title>"]
+        for i in range(25):
+            parts.append(f"<link rel='preload' as='script' href='https://ca-times.brightspotcdn.com/resource/00000-{i:04x}/bundle.min.js'>")
+            parts.append(f"<script src='/resource/{i:04x}/main.min.js' defer></script>")
+        parts.append("<link rel='stylesheet' href='/resource/styles/All.min.css'></head><body>")
+        for i in range(int(outlinks)):
+            kind = rng.random()
+            path = rng.choice(paths)
+            if kind < 0.45:
+                href = path
+            elif kind < 0.85:
+                href = "https://www.latimes.com" + path
+            elif kind < 0.87:
+                href = f"\n  {path}?utm_source=nav&utm_medium=a,b  "
+            else:
+                href = rng.choice(EXTERNAL)
+            rel = " rel='noopener nofollow'" if kind > 0.9 else ""
+            parts.append(f"<li class='nav-item'><a class='link' href='{href}'{rel}><span>Story headline {i} with a few more words</span></a></li>")
+            if i % 4 == 0:
+                image = f"https://ca-times.brightspotcdn.com/dims4/default/{rng.getrandbits(32):08x}/2147483647/strip/true/crop/5000x3333+0+0/resize/840x560!/quality/75/?url=https%3A%2F%2Fcalifornia-times-brightspot.s3.amazonaws.com%2F{rng.getrandbits(32):08x}.jpg"
+                parts.append(f"<picture><source srcset='{image} 1x' src='{image}' type='image/webp'><img src='{image}' alt='photo'></picture>")
+        body = "".join(parts)
+        padding = max(0, int(float(size)) - len(body) - 100)
+        blob = '{"items": [' + ",".join(f'{{"id": {i}, "text": "lorem ipsum dolor sit amet consectetur"}}' for i in range(padding // 60)) + "]}"
+        html = f"{body}<script type='application/json'>{blob}</script></body></html>"
+        with open(os.path.join(directory, quote(url, safe="") + ".html"), "w", encoding="utf-8") as f:
+            f.write(html)
+
+
+def load_fixtures(directory):
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, "rb") as f:
+            fixtures.append((unquote(os.path.basename(path)[:-len(".html")]), f.read()))
+    return fixtures
+
+
+def two_passes(response, extractor, base_domain):
+    links = extractor.extract_links(response)
+    rows = []
+    for href in response.css("a::attr(href)").getall():
+        absolute_url = response.urljoin(href)
+        rows.append((absolute_url, "OK" if urlparse(absolute_url).netloc.endswith(base_domain) else "N_OK"))
+    return links, rows
+
+
+def single_pass(response, extractor, classify_host):
+    page = extractor.page_links(response)
+    return page.links, [(url, classify_host(url)) for url in page.outlinks]
@@ -0,0 +1,113 @@
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+
+# Runs the latimes spider against a local site (see mock_site.py) in a child process, since
+# the Twisted reactor cannot be restarted, and returns the crawl's Scrapy stats plus the child's
+# CPU time (process/cpu_seconds) and peak RSS (process/max_rss_bytes).
+#
+#   python -m testing.mock_crawl --start-url http://127.0.0.1:8000/ [--pages N] [--set NAME=VALUE ...]
+#
+# --set values are parsed as JSON when possible (numbers, dicts for ITEM_PIPELINES, ...) and,
+# like `scrapy crawl -s`, take precedence over the spider's custom_settings.
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def mock_spider_class(pages=None):
+    from scrapy_crawler.spiders.news import latimesSpider
+
+    custom_settings = dict(latimesSpider.custom_settings)
+    if pages is not None:
+        custom_settings["CLOSESPIDER_PAGECOUNT"] = pages
+    else:
+        custom_settings.pop("CLOSESPIDER_PAGECOUNT", None)
+    return type("MockSiteSpider", (latimesSpider,), {"name": "mock_site", "custom_settings": custom_settings})
+
+
+def crawl(start_url, pages=None, settings=None, hosts=None):
+    from urllib.parse import urlparse
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "scrapy_crawler.settings")
+    project_settings = get_project_settings()
+    project_settings.set("LOG_LEVEL", "WARNING")
+    for name, value in (settings or {}).items():
+        project_settings.set(name, value, priority="cmdline")
+    process = CrawlerProcess(project_settings)
+    crawler = process.create_crawler(mock_spider_class(pages))
+    # netloc as the domain, so that links carrying the port count as internal
+    spider_args = {"domain": urlparse(start_url).netloc, "start_url": start_url}
+    if hosts:
+        spider_args["allowed_domains"] = ",".join(hosts)
+    process.crawl(crawler, **spider_args)
+    process.start()
+    return crawler.stats.get_stats()
+
+
+def start_crawl_process(start_url, run_dir, pages=None, settings=None, hosts=None, python_path=()):
+    # The running crawl, with run_dir as the working directory (CSV logs and report end up there);
+    # python_path has the directories of any modules named in settings, besides the project
+    command = [sys.executable, "-m", "testing.mock_crawl", "--start-url", start_url]
+    if pages is not None:
+        command += ["--pages", str(pages)]
+    if hosts:
+        command += ["--hosts", *hosts]
+    for name, value in (settings or {}).items():
+        command += ["--set", f"{name}={json.dumps(value)}"]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([PROJECT_DIR, *python_path, os.environ.get("PYTHONPATH", "")]),
+               SCRAPY_SETTINGS_MODULE="scrapy_crawler.settings")
+    return subprocess.Popen(command, cwd=run_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def run_crawl_process(start_url, run_dir, pages=None, settings=None, hosts=None, python_path=()):
+    # The stats of the finished crawl
+    process = start_crawl_process(start_url, run_dir, pages, settings, hosts, python_path)
+    stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"crawl failed:\n{stderr}")
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def read_log(run_dir, name="fetch"):
+    # The rows of a crawl's <name>_latimes.csv log, header included
+    with open(os.path.join(run_dir, f"{name}_latimes.csv"), newline="") as f:
+        return list(csv.reader(f))
+
+
+def fetched_urls(run_dir):
+    rows = read_log(run_dir)
+    return rows[0], [row[0] for row in rows[1:]]
+
+
+def read_report(run_dir):
+    with open(os.path.join(run_dir, "CrawlReport_latimes.txt")) as f:
+        return f.read()
+
+
+def parse_setting(assignment):
+    name, value = assignment.split("=", 1)
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="crawl a local mock site with the latimes spider")
+    parser.add_argument("--start-url", required=True)
+    parser.add_argument("--pages", type=int, default=None, help="CLOSESPIDER_PAGECOUNT (default: no limit)")
+    parser.add_argument("--hosts", nargs="+", default=None, help="allowed domains (default: the start URL's host)")
+    parser.add_argument("--set", action="append", default=[], type=parse_setting, help="NAME=VALUE Scrapy setting")
+    args = parser.parse_args()
+    stats = crawl(args.start_url, args.pages, dict(args.set), args.hosts)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    stats["process/cpu_seconds"] = usage.ru_utime + usage.ru_stime
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    stats["process/max_rss_bytes"] = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    print(json.dumps(stats, default=str))
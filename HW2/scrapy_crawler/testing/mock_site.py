@@ -0,0 +1,91 @@
+import argparse
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for a news site: /page/<n>.html for n < pages, each with `links` outlinks to
+# other pages, a few external links and a few URLs with commas in them. Pages are generated
+# deterministically from the page number, so every run crawls the same graph.
+#
+# /page/<n>,section.html is page n of a paginated section listing. Listing pages are
+# near-duplicates of each other, like tag pages or paginated listings: the same listing text
+# plus the page number, with links to other listing pages. Every tenth story links to one.
+
+EXTERNAL_LINKS = ["https://www.example.com/story.html", "https://twitter.com/share?a=1,2"]
+WORDS = [a + b + c for a in "bcdfglmnprst" for b in "aeiou" for c in "nrst"]
+
+
+def page_body(n, pages, links, size, section=False):
+    rng = random.Random(n)
+    anchors = []
+    for i in range(links):
+        target = rng.randrange(pages)
+        if i % 50 == 7:
+            href = EXTERNAL_LINKS[i % len(EXTERNAL_LINKS)]
+        elif section or (i % 50 == 13 and n % 10 == 0):
+            href = f"/page/{target},section.html"
+        else:
+            href = f"/page/{target}.html"
+        anchors.append(f'<a href="{href}">{"more" if section else f"story {target}"}</a>')
+    text_rng = random.Random(-1) if section else rng
+    filler = "<p>" + " ".join(WORDS[text_rng.randrange(len(WORDS))] for _ in range(size // 4)) + "</p>"
+    heading = f"<p>section page {n}</p>" if section else ""
+    return (f"<html><head><title>page {n}</title></head><body>{heading}{filler}"
+            f"{' '.join(anchors)}</body></html>").encode()
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    pages = 1000
+    links = 200
+    size = 20000
+    cache = {}
+    # requests per path, for checks that a crawl fetched every page once
+    hits = Counter()
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        path = self.path.split("?", 1)[0]
+        if path == "/":
+            path = "/page/0.html"
+        name = path[len("/page/"):-len(".html")] if path.startswith("/page/") and path.endswith(".html") else ""
+        # "/page/12,section.html" is page 12 of the section listing
+        number, _, section = name.partition(",")
+        if not number.isdigit() or int(number) >= self.pages:
+            self.send_error(404)
+            return
+        key = (int(number), bool(section))
+        if key not in self.cache:
+            self.cache[key] = page_body(key[0], self.pages, self.links, self.size, key[1])
+        body = self.cache[key]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_site(host="127.0.0.1", port=0, pages=1000, links=200, size=20000):
+    # Returns the running server; server.server_address has the actual port
+    handler = type("Handler", (MockSiteHandler,), {"pages": pages, "links": links, "size": size, "cache": {},
+                                                "hits": Counter()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve a deterministic mock news site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--links", type=int, default=200)
+    parser.add_argument("--size", type=int, default=20000, help="approximate page size in bytes")
+    args = parser.parse_args()
+    server = start_mock_site(args.host, args.port, args.pages, args.links, args.size)
+    print(f"Serving {args.pages} pages on http://{args.host}:{server.server_address[1]}/")
+    threading.Event().wait()
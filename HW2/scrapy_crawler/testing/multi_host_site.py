@@ -0,0 +1,98 @@
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Several loopback hosts (127.0.0.1, 127.0.0.2, ...) on one port, standing in for a news site and
+# its CDN/asset hosts. Every host has its own latency and capacity: requests beyond `capacity`
+# in flight at once are answered immediately with `overload_status` (429 with Retry-After, or
+# 503), like a rate-limited or overloaded server. Pages link to pages on all hosts.
+
+DEFAULT_HOSTS = [
+    {"host": "127.0.0.1", "latency": 0.25, "capacity": 32, "overload_status": 503},
+    {"host": "127.0.0.2", "latency": 0.50, "capacity": 16, "overload_status": 503},
+    {"host": "127.0.0.3", "latency": 0.30, "capacity": 4, "overload_status": 429},
+    {"host": "127.0.0.4", "latency": 3.00, "capacity": 4, "overload_status": 503},
+]
+
+
+def page_body(host_index, n, hosts, pages, links, port):
+    rng = random.Random(host_index * 1000003 + n)
+    anchors = []
+    for _ in range(links):
+        target = hosts[rng.randrange(len(hosts))]["host"]
+        anchors.append(f'<a href="http://{target}:{port}/page/{rng.randrange(pages)}.html">story</a>')
+    return f"<html><body><p>page {n} on {hosts[host_index]['host']}</p>{' '.join(anchors)}</body></html>".encode()
+
+
+def make_handler(host_index, hosts, pages, links, port):
+    config = hosts[host_index]
+    lock = threading.Lock()
+    state = {"in_flight": 0, "requests": 0, "overloaded": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        stats = state
+
+        def do_GET(self):
+            with lock:
+                state["requests"] += 1
+                overloaded = state["in_flight"] >= config["capacity"]
+                if overloaded:
+                    state["overloaded"] += 1
+                else:
+                    state["in_flight"] += 1
+            if overloaded:
+                self.send_response(config["overload_status"])
+                if config["overload_status"] == 429:
+                    self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            try:
+                time.sleep(config["latency"])
+                path = self.path.split("?", 1)[0]
+                number = path[len("/page/"):-len(".html")] if path.startswith("/page/") else "0" if path == "/" else ""
+                if not number.isdigit() or int(number) >= pages:
+                    self.send_error(404)
+                    return
+                body = page_body(host_index, int(number), hosts, pages, links, port)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            finally:
+                with lock:
+                    state["in_flight"] -= 1
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_multi_host_site(hosts=DEFAULT_HOSTS, pages=500, links=30, port=0):
+    # Returns the servers, one per host, all listening on the same port
+    servers = []
+    for index, config in enumerate(hosts):
+        server = ThreadingHTTPServer((config["host"], port), None)
+        port = server.server_address[1]
+        server.RequestHandlerClass = make_handler(index, hosts, pages, links, port)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve loopback hosts with their own latency and capacity")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pages", type=int, default=500, help="pages per host")
+    parser.add_argument("--links", type=int, default=30)
+    args = parser.parse_args()
+    start_multi_host_site(pages=args.pages, links=args.links, port=args.port)
+    for config in DEFAULT_HOSTS:
+        print(f"http://{config['host']}:{args.port}/  latency {config['latency'] * 1000:.0f} ms, "
+              f"capacity {config['capacity']}, then {config['overload_status']}")
+    threading.Event().wait()
@@ -0,0 +1,236 @@
+import argparse
+import math
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from testing.mock_site import WORDS
+
+# A configurable synthetic news site for crawl benchmarks. Every page is derived from the seed
+# and its number, so the same options always serve the same site:
+#
+#   /news/<n>.html   story or section page n < pages; its size is drawn from a log-normal
+#                    distribution around --size, its outlinks from the link graph
+#   /img/<n>.jpg     images linked from the pages (--image-ratio of the outlinks)
+#
+# The link graph is "uniform" (every page equally likely as a target) or "power-law" (page n
+# is chosen with weight 1/(n+1)^--skew, so a few section fronts get most of the links, as on a
+# news site); every page also links to the next one, so the whole site is reachable from the
+# front page. --external-ratio of the outlinks leave the site. A --redirect-ratio of the pages
+# answer 301 or 302 with a Location on another page, and --error-ratio answer 404, 500 or 503.
+# Every response waits --latency seconds on average (exponentially distributed), with at most
+# --capacity requests served at a time.
+#
+# The site changes by epochs (config.epoch, raised between crawls by re-crawl benchmarks): the
+# first --fronts pages (the most linked ones on the power-law graph, like section fronts) get new
+# text in every epoch, other pages in --change-ratio of the epochs. Pages carry an ETag and a
+# Last-Modified of their version and answer conditional requests for it with 304.
+
+STATUS_ERRORS = (404, 404, 500, 503)
+EXTERNAL_LINKS = ["https://www.example.com/world/story.html", "https://twitter.com/share?url=a,b",
+                  "https://www.facebook.com/sharer.php"]
+IMAGE = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 20
+
+
+class SiteConfig:
+
+    def __init__(self, pages=1000, links=50, size=30000, size_sigma=0.5, graph="power-law", skew=1.0,
+                 external_ratio=0.05, image_ratio=0.05, redirect_ratio=0.02, error_ratio=0.02,
+                 latency=0.0, capacity=64, seed=0, fronts=10, change_ratio=0.05, epoch=0):
+        if graph not in ("uniform", "power-law"):
+            raise ValueError(f"graph must be 'uniform' or 'power-law', not {graph!r}")
+        self.pages = pages
+        self.links = links
+        self.size = size
+        self.size_sigma = size_sigma
+        self.graph = graph
+        self.skew = skew
+        self.external_ratio = external_ratio
+        self.image_ratio = image_ratio
+        self.redirect_ratio = redirect_ratio
+        self.error_ratio = error_ratio
+        self.latency = latency
+        self.capacity = capacity
+        self.seed = seed
+        self.fronts = fronts
+        self.change_ratio = change_ratio
+        self.epoch = epoch
+        # cumulative weights of the power-law graph, shared by every page
+        self.cum_weights = None
+        if graph == "power-law":
+            total = 0.0
+            self.cum_weights = []
+            for n in range(pages):
+                total += 1 / (n + 1) ** skew
+                self.cum_weights.append(total)
+
+    def as_dict(self):
+        return {name: value for name, value in vars(self).items() if name != "cum_weights"}
+
+    def rng(self, n):
+        return random.Random(self.seed * 1000003 + n)
+
+    def status(self, n):
+        # (status, redirect target or None) of page n; the front page is always served
+        if n == 0:
+            return 200, None
+        rng = self.rng(-n)
+        draw = rng.random()
+        if draw < self.redirect_ratio:
+            return rng.choice((301, 302)), rng.randrange(self.pages)
+        if draw < self.redirect_ratio + self.error_ratio:
+            return rng.choice(STATUS_ERRORS), None
+        return 200, None
+
+    def version(self, n):
+        # epoch of the page's current text: the last epoch it changed in
+        for epoch in range(self.epoch, 0, -1):
+            if n < self.fronts or random.Random(f"{self.seed}:{n}:{epoch}").random() < self.change_ratio:
+                return epoch
+        return 0
+
+    def validators(self, n):
+        # (ETag, Last-Modified) of the page's current version
+        version = self.version(n)
+        return f'"{n}-{version}"', formatdate(1700000000 + version * 86400 + n, usegmt=True)
+
+    def page_size(self, n):
+        return max(500, int(self.size * math.exp(self.size_sigma * self.rng(-n - self.pages).gauss(0, 1))))
+
+    def page_body(self, n):
+        rng = self.rng(n)
+        if self.graph == "power-law":
+            targets = rng.choices(range(self.pages), cum_weights=self.cum_weights, k=self.links)
+        else:
+            targets = [rng.randrange(self.pages) for _ in range(self.links)]
+        anchors = []
+        for target in targets:
+            draw = rng.random()
+            if draw < self.external_ratio:
+                anchors.append(f'<a href="{rng.choice(EXTERNAL_LINKS)}">elsewhere</a>')
+            elif draw < self.external_ratio + self.image_ratio:
+                anchors.append(f'<img src="/img/{target}.jpg" alt="photo {target}">')
+            else:
+                anchors.append(f'<a href="/news/{target}.html">story {target}</a>')
+        if n + 1 < self.pages:
+            anchors.append(f'<a href="/news/{n + 1}.html">next story</a>')
+        links = " ".join(anchors)
+        head = f"<html><head><title>story {n}</title></head><body><article><h1>story {n}</h1><p>"
+        tail = f"</p></article><nav>{links}</nav></body></html>"
+        # words of WORDS are three letters and a space
+        words = max(0, self.page_size(n) - len(head) - len(tail)) // 4
+        text_rng = random.Random(f"{self.seed}:{n}:{self.version(n)}")
+        return (head + " ".join(text_rng.choices(WORDS, k=words)) + tail).encode()
+
+
+def make_handler(config):
+
+    class SyntheticSiteHandler(BaseHTTPRequestHandler):
+        # at most config.capacity requests are served at once; the others wait for a slot
+        slots = threading.BoundedSemaphore(config.capacity)
+        cache = {}
+        hits = Counter()
+
+        def do_GET(self):
+            with self.slots:
+                if config.latency:
+                    time.sleep(random.expovariate(1 / config.latency))
+                self.hits[self.path] += 1
+                self.respond(self.path.split("?", 1)[0])
+
+        def respond(self, path):
+            if path == "/":
+                path = "/news/0.html"
+            kind, _, name = path.strip("/").partition("/")
+            number = name.rsplit(".", 1)[0]
+            if kind not in ("news", "img") or not number.isdigit() or int(number) >= config.pages:
+                self.send_error(404)
+                return
+            n = int(number)
+            if kind == "img":
+                self.send_body(IMAGE, "image/jpeg")
+                return
+            status, target = config.status(n)
+            if status in (301, 302):
+                self.send_response(status)
+                self.send_header("Location", f"/news/{target}.html")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif status != 200:
+                self.send_error(status)
+            else:
+                etag, last_modified = config.validators(n)
+                if self.headers.get("If-None-Match") == etag or (
+                        "If-None-Match" not in self.headers and self.headers.get("If-Modified-Since") == last_modified):
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                key = (n, etag)
+                if key not in self.cache:
+                    self.cache[key] = config.page_body(n)
+                self.send_body(self.cache[key], "text/html; charset=utf-8", etag, last_modified)
+
+        def send_body(self, body, content_type, etag=None, last_modified=None):
+            self.send_response(200)
+            if etag:
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SyntheticSiteHandler
+
+
+def start_synthetic_site(config, host="127.0.0.1", port=0):
+    # Returns the running server; server.server_address has the actual port
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_site_args(parser):
+    defaults = SiteConfig()
+    parser.add_argument("--pages", type=int, default=defaults.pages, help="pages on the site")
+    parser.add_argument("--links", type=int, default=defaults.links, help="outlinks per page")
+    parser.add_argument("--size", type=int, default=defaults.size, help="median page size in bytes")
+    parser.add_argument("--size-sigma", type=float, default=defaults.size_sigma, help="sigma of the log-normal page sizes")
+    parser.add_argument("--graph", choices=["uniform", "power-law"], default=defaults.graph)
+    parser.add_argument("--skew", type=float, default=defaults.skew, help="exponent of the power-law graph")
+    parser.add_argument("--external-ratio", type=float, default=defaults.external_ratio)
+    parser.add_argument("--image-ratio", type=float, default=defaults.image_ratio)
+    parser.add_argument("--redirect-ratio", type=float, default=defaults.redirect_ratio)
+    parser.add_argument("--error-ratio", type=float, default=defaults.error_ratio)
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="mean seconds per response")
+    parser.add_argument("--capacity", type=int, default=defaults.capacity, help="requests served at a time")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--fronts", type=int, default=defaults.fronts, help="pages that change in every epoch")
+    parser.add_argument("--change-ratio", type=float, default=defaults.change_ratio,
+                        help="share of the epochs in which any other page changes")
+    parser.add_argument("--epoch", type=int, default=defaults.epoch)
+
+
+def site_config_from_args(args):
+    return SiteConfig(args.pages, args.links, args.size, args.size_sigma, args.graph, args.skew, args.external_ratio,
+                      args.image_ratio, args.redirect_ratio, args.error_ratio, args.latency, args.capacity, args.seed,
+                      args.fronts, args.change_ratio, args.epoch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve a synthetic news site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_site_args(parser)
+    args = parser.parse_args()
+    server = start_synthetic_site(site_config_from_args(args), args.host, args.port)
+    print(f"Serving {args.pages} pages on http://{args.host}:{server.server_address[1]}/")
+    threading.Event().wait()
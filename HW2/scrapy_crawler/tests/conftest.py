@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The project: scrapy_crawler, and the local stand-in sites and crawl runner of testing/
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "scrapy_crawler.settings")
@@ -0,0 +1,75 @@
+import pytest
+from scrapy.exceptions import NotSupported
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.test import get_crawler
+
+from scrapy_crawler import downloader
+from testing.mock_crawl import run_crawl_process
+from testing.multi_host_site import DEFAULT_HOSTS, start_multi_host_site
+
+# the configurations of benchmark_adaptive_concurrency.py
+CONFIGURATIONS = {
+    "fixed 7": {},
+    "adaptive": {"ADAPTIVE_CONCURRENCY_ENABLED": True, "CONCURRENT_REQUESTS": 64,
+                 "SCHEDULER_PRIORITY_QUEUE": "scrapy_crawler.pqueues.HostLoadPriorityQueue",
+                 "DOWNLOADER": "scrapy_crawler.downloader.SlotLimitedDownloader"},
+}
+
+
+def test_default_crawl_keeps_scrapys_downloader():
+    settings = get_project_settings()
+    assert not settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED")
+    assert settings.get("DOWNLOADER") == "scrapy.core.downloader.Downloader"
+
+
+def test_slot_limited_downloader_matches_installed_scrapy():
+    # the private Downloader API it overrides is still there
+    assert downloader.PRIVATE_API_AVAILABLE
+    assert downloader.scrapy_version() == downloader.TESTED_SCRAPY_VERSION
+
+
+def test_slot_limited_downloader_refuses_other_scrapy_versions(monkeypatch):
+    monkeypatch.setattr(downloader.scrapy, "__version__", "2.20.0")
+    with pytest.raises(NotSupported):
+        downloader.SlotLimitedDownloader(get_crawler())
+
+
+def test_adaptive_crawl_of_multi_host_site(tmp_path):
+    pages = 80
+    servers = start_multi_host_site(pages=pages)
+    try:
+        hosts = [config["host"] for config in DEFAULT_HOSTS]
+        start_url = f"http://{hosts[0]}:{servers[0].server_address[1]}/"
+        stats = run_crawl_process(start_url, str(tmp_path), pages, CONFIGURATIONS["adaptive"], hosts)
+    finally:
+        for server in servers:
+            server.shutdown()
+    assert stats["finish_reason"] == "closespider_pagecount"
+    assert stats.get("downloader/response_status_count/200", 0) >= pages
+    assert any(key.startswith("adaptive_concurrency/") for key in stats)
+
+
+def error_responses(stats):
+    return sum(count for key, count in stats.items() if key.startswith("downloader/response_status_count/")
+               and (key.endswith("/429") or key.rsplit("/", 1)[1].startswith("5")))
+
+
+def test_adaptive_crawl_is_faster_without_more_errors(tmp_path):
+    # benchmark_adaptive_concurrency.py on a smaller crawl
+    pages = 300
+    servers = start_multi_host_site(pages=pages)
+    try:
+        hosts = [config["host"] for config in DEFAULT_HOSTS]
+        start_url = f"http://{hosts[0]}:{servers[0].server_address[1]}/"
+        stats = {}
+        for name in ("fixed 7", "adaptive"):
+            run_dir = tmp_path / name.replace(" ", "_")
+            run_dir.mkdir()
+            stats[name] = run_crawl_process(start_url, str(run_dir), pages, CONFIGURATIONS[name], hosts)
+    finally:
+        for server in servers:
+            server.shutdown()
+    fixed, adaptive = stats["fixed 7"], stats["adaptive"]
+    assert (adaptive["downloader/response_status_count/200"] / adaptive["elapsed_time_seconds"]
+            >= fixed["downloader/response_status_count/200"] / fixed["elapsed_time_seconds"])
+    assert error_responses(adaptive) <= error_responses(fixed)
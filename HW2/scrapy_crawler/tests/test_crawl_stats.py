@@ -0,0 +1,114 @@
+import math
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from scrapy_crawler.crawl_stats import CrawlStats, ExactSet, HyperLogLog
+from testing.mock_crawl import read_report, run_crawl_process
+from testing.synthetic_site import SiteConfig, start_synthetic_site
+
+
+def csv_report(run_dir):
+    # The statistics sections as the spider's closed() used to write them, from the CSV logs
+    # with pandas
+    fetch_df = pd.read_csv(os.path.join(run_dir, "fetch_latimes.csv"), on_bad_lines='skip')
+    visit_df = pd.read_csv(os.path.join(run_dir, "visit_latimes.csv"), on_bad_lines='skip')
+    urls_df = pd.read_csv(os.path.join(run_dir, "urls_latimes.csv"), on_bad_lines='skip')
+    status_code_descriptions = {200: "OK", 201: "Created", 204: "No Content", 301: "Moved Permanently",
+                                302: "Found (Moved Temporarily)", 304: "Not Modified", 400: "Bad Request",
+                                401: "Unauthorized", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+                                408: "Request Timeout", 429: "Too Many Requests", 500: "Internal Server Error",
+                                502: "Bad Gateway", 503: "Service Unavailable", 504: "Gateway Timeout"}
+    visit_df["Size (Bytes)"] = visit_df["Size (Bytes)"].astype(float).round(2)
+    total_fetches = len(fetch_df)
+    successful_fetches = len(fetch_df[fetch_df["Status"].between(200, 299)])
+    status_counts = fetch_df["Status"].value_counts().to_dict()
+    file_sizes = visit_df["Size (Bytes)"].astype(float)
+    size_ranges = {
+        "< 1 KB": sum(file_sizes < 1024),
+        "1 KB - 10 KB": sum((file_sizes >= 1024) & (file_sizes < 10 * 1024)),
+        "10 KB - 100 KB": sum((file_sizes >= 10 * 1024) & (file_sizes < 100 * 1024)),
+        "100 KB - 1 MB": sum((file_sizes >= 100 * 1024) & (file_sizes < 1024 * 1024)),
+        "> 1 MB": sum(file_sizes >= 1024 * 1024),
+    }
+    report = "Fetch Statistics\n================\n"
+    report += f"# Fetches attempted: {total_fetches}\n"
+    report += f"# Fetches succeeded: {successful_fetches}\n"
+    report += f"# Fetches failed or aborted: {total_fetches - successful_fetches}\n\n"
+    report += "Outgoing URLs:\n================\n"
+    report += f"Total URLs extracted: {len(urls_df)}\n"
+    report += f"# Unique URLs extracted: {urls_df['Encountered URL'].nunique()}\n"
+    report += f"# Unique URLs within News Site: {len(urls_df[urls_df['Indicator'] == 'OK']['Encountered URL'].unique())}\n"
+    report += f"# Unique URLs outside News Site: {len(urls_df[urls_df['Indicator'] == 'N_OK']['Encountered URL'].unique())}\n\n"
+    report += "Status Codes:\n================\n"
+    report += "\n".join(f"{code} {status_code_descriptions.get(code, '')}: {count}"
+                        for code, count in sorted(status_counts.items())) + "\n\n"
+    report += "File Sizes:\n================\n"
+    report += "".join(f"{size_range}: {count}\n" for size_range, count in size_ranges.items()) + "\n"
+    report += "Content Types:\n================\n"
+    report += "".join(f"{ctype}: {count}\n" for ctype, count in visit_df["Content-Type"].value_counts().to_dict().items())
+    return report + "\n"
+
+
+def test_report_matches_the_csv_logs(tmp_path):
+    # errors, redirects, external links and page sizes across the size buckets
+    config = SiteConfig(pages=80, links=20, size=3000, size_sigma=1.5, redirect_ratio=0.05, error_ratio=0.1,
+                        image_ratio=0.1, external_ratio=0.1)
+    server = start_synthetic_site(config)
+    try:
+        run_crawl_process(f"http://127.0.0.1:{server.server_address[1]}/", str(tmp_path))
+    finally:
+        server.shutdown()
+    report = read_report(str(tmp_path))
+    # after the name, site and thread count
+    statistics = report.split("\n\n", 1)[1]
+    assert statistics == csv_report(str(tmp_path))
+    for section in ("404 Not Found", "< 1 KB", "10 KB - 100 KB", "301 Moved Permanently", "# Unique URLs outside News Site: 3"):
+        assert section in statistics
+
+
+def test_exact_and_hll_counts():
+    exact = CrawlStats()
+    hll = CrawlStats("hll")
+    rng = random.Random(0)
+    urls = [(f"https://www.latimes.com/story/{rng.randrange(30000)}", "OK") for _ in range(40000)]
+    urls += [(f"https://example.com/{n}", "N_OK") for n in range(500)]
+    for stats in (exact, hll):
+        stats.record_urls(urls)
+        stats.record_fetch(200)
+        stats.record_fetch(404)
+        stats.record_visit(2000, "text/html")
+    expected = {url for url, _ in urls}
+    assert len(exact.unique_urls) == len(expected)
+    assert len(exact.unique_external) == 500
+    snapshot = hll.snapshot()
+    assert snapshot["total_urls_extracted"] == len(urls)
+    assert snapshot["fetches_failed"] == 1
+    # within four standard errors of the sketch
+    bound = 4 * 1.04 / math.sqrt(2 ** 14)
+    assert abs(snapshot["unique_urls_extracted"] - len(expected)) <= bound * len(expected)
+    assert abs(snapshot["unique_urls_external"] - 500) <= bound * 500
+
+
+@pytest.mark.parametrize("precision", [10, 14])
+@pytest.mark.parametrize("n", [10, 1000, 20000, 200000])
+def test_hyperloglog_error_bound(precision, n):
+    sketch = HyperLogLog(precision)
+    exact = ExactSet()
+    for i in range(n):
+        # every value twice: duplicates must not count
+        for value in (f"url-{i}", f"url-{i}"):
+            sketch.add(value)
+            exact.add(value)
+    assert len(exact) == n
+    assert abs(len(sketch) - n) <= 4 * 1.04 / math.sqrt(2 ** precision) * n + 1
+
+
+def test_hyperloglog_precision_range():
+    for precision in (3, 19):
+        with pytest.raises(ValueError):
+            HyperLogLog(precision)
+    with pytest.raises(ValueError):
+        CrawlStats("approximate")
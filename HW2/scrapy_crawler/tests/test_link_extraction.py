@@ -0,0 +1,20 @@
+from scrapy.http import HtmlResponse
+from scrapy.linkextractors import LinkExtractor
+
+from scrapy_crawler.linkextractors import HostClassifier, SinglePassLinkExtractor
+from scrapy_crawler.spiders.news import latimesSpider
+from testing.latimes_pages import EXTRACTOR_ARGS, generate_fixtures, load_fixtures, single_pass, two_passes
+
+
+def test_single_pass_matches_two_passes(tmp_path):
+    generate_fixtures(str(tmp_path), 3)
+    base_domain = latimesSpider.base_domain
+    classify_host = HostClassifier(base_domain)
+    for url, body in load_fixtures(str(tmp_path)):
+        old_links, old_rows = two_passes(HtmlResponse(url, body=body, encoding="utf-8"), LinkExtractor(**EXTRACTOR_ARGS),
+                                         base_domain)
+        new_links, new_rows = single_pass(HtmlResponse(url, body=body, encoding="utf-8"),
+                                          SinglePassLinkExtractor(**EXTRACTOR_ARGS), classify_host)
+        assert [(link.url, link.text, link.nofollow) for link in new_links] == \
+            [(link.url, link.text, link.nofollow) for link in old_links]
+        assert new_rows == old_rows
@@ -0,0 +1,61 @@
+import random
+
+from scrapy_crawler.neardup import NearDuplicateDetector, SimHashIndex, hamming, simhash
+from testing.mock_crawl import read_log, run_crawl_process
+from testing.mock_site import start_mock_site
+
+
+def test_simhash_is_the_bitwise_majority():
+    rng = random.Random(0)
+    for n in (1, 2, 7, 100):
+        hashes = [rng.getrandbits(64) for _ in range(n)]
+        expected = sum(1 << bit for bit in range(64) if 2 * sum(h >> bit & 1 for h in hashes) > n)
+        assert simhash(hashes) == expected
+
+
+def test_index_finds_what_a_linear_scan_finds():
+    rng = random.Random(0)
+    distance = 3
+    fingerprints = [rng.getrandbits(64) for _ in range(2000)]
+    index = SimHashIndex(distance)
+    for i, fingerprint in enumerate(fingerprints):
+        index.add(fingerprint, i)
+    for i in range(400):
+        fingerprint = rng.getrandbits(64)
+        if i % 2 == 0:
+            fingerprint = fingerprints[rng.randrange(len(fingerprints))]
+            for bit in rng.sample(range(64), rng.randrange(distance + 1)):
+                fingerprint ^= 1 << bit
+        nearest = min(hamming(fingerprint, other) for other in fingerprints)
+        found = index.nearest(fingerprint)
+        if nearest > distance:
+            assert found is None
+        else:
+            assert found[1] == nearest == hamming(fingerprint, fingerprints[found[0]])
+
+
+def test_pages_without_text_are_not_fingerprinted():
+    detector = NearDuplicateDetector()
+    for n, body in enumerate([b"", b"<html><body><img src='a.jpg'></body></html>",
+                              b"<html><script>var a = 1;</script><p> - </p></html>", b""]):
+        assert detector.check(f"https://www.latimes.com/empty/{n}", body) is None
+    assert detector.pages == 0 and len(detector.index) == 0
+    story = b"<html><p>" + b" ".join(b"word%d" % n for n in range(200)) + b"</p></html>"
+    assert detector.check("https://www.latimes.com/story", story) is None
+    assert detector.check("https://www.latimes.com/story?amp", story) == "https://www.latimes.com/story"
+    assert detector.pages == 2 and detector.near_duplicates == 1
+
+
+def test_crawl_flags_only_listing_pages(tmp_path):
+    # on the mock site the only near-duplicates are the ",section" listing pages
+    server = start_mock_site(pages=60, links=20, size=2000)
+    try:
+        stats = run_crawl_process(f"http://127.0.0.1:{server.server_address[1]}/", str(tmp_path), None,
+                                  {"NEAR_DUPLICATE_ENABLED": True, "NEAR_DUPLICATE_SKIP_OUTLINKS": True})
+    finally:
+        server.shutdown()
+    # the URL and the page it is a near-duplicate of
+    flagged = [(row[0], row[4]) for row in read_log(str(tmp_path), "visit")[1:] if len(row) > 4 and row[4]]
+    assert flagged
+    assert stats["near_duplicates/pages"] == len(flagged)
+    assert all(",section" in url and ",section" in original for url, original in flagged)
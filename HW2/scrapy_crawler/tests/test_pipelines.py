@@ -0,0 +1,128 @@
+import csv
+import os
+
+import pytest
+
+from scrapy_crawler.items import FetchItem, UrlsItem, VisitItem
+from scrapy_crawler.pipelines import ScrapyCrawlerPipeline
+from testing.mock_crawl import run_crawl_process
+from testing.mock_site import start_mock_site
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ITEMS = [
+    FetchItem(url="https://www.latimes.com/a,b", status=200),
+    VisitItem(url="https://www.latimes.com/a,b", size=1234, outlinks=2, content_type="text/html"),
+    UrlsItem(urls=[("https://www.latimes.com/x", "OK"), ('https://example.com/say "hi"', "N_OK")]),
+    FetchItem(url="https://www.latimes.com/line\nbreak", status=404),
+    VisitItem(url='https://www.latimes.com/"quoted",page', size=0.5, outlinks=0,
+              content_type='multipart/mixed; boundary="a,b"'),
+    UrlsItem(urls=[("https://www.latimes.com/line\r\nbreak", "OK")]),
+]
+
+
+class Spider:
+    def __init__(self, directory, prefix=""):
+        self.fetch_file = os.path.join(directory, prefix + "fetch_latimes.csv")
+        self.visit_file = os.path.join(directory, prefix + "visit_latimes.csv")
+        self.urls_file = os.path.join(directory, prefix + "urls_latimes.csv")
+
+
+class BaselineWriterPipeline:
+    # The rows as the spider wrote them before ScrapyCrawlerPipeline, one open() per row, to
+    # baseline_*.csv next to the pipeline's files
+
+    def open_spider(self, spider):
+        self.spider = Spider(os.path.dirname(os.path.abspath(spider.fetch_file)), "baseline_")
+        with open(self.spider.fetch_file, "w") as f:
+            f.write("URL,Status\n")
+        with open(self.spider.visit_file, "w") as f:
+            f.write("URL,Size (Bytes),Outlinks,Content-Type\n")
+        with open(self.spider.urls_file, "w") as f:
+            f.write("Encountered URL,Indicator\n")
+
+    def process_item(self, item, spider):
+        if isinstance(item, FetchItem):
+            with open(self.spider.fetch_file, "a") as f:
+                f.write(f"{item['url']},{item['status']}\n")
+        elif isinstance(item, VisitItem):
+            with open(self.spider.visit_file, "a") as f:
+                f.write(f"{item['url']},{item['size']:.2f},{item['outlinks']},{item['content_type']}\n")
+        elif isinstance(item, UrlsItem):
+            for url, indicator in item["urls"]:
+                with open(self.spider.urls_file, "a") as f:
+                    f.write(f"{url},{indicator}\n")
+        return item
+
+
+def write_items(directory, items, **kwargs):
+    spider = Spider(directory)
+    pipeline = ScrapyCrawlerPipeline(**kwargs)
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    return spider
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_csv_format_round_trips(tmp_path):
+    spider = write_items(str(tmp_path), ITEMS)
+    assert read_rows(spider.fetch_file) == [["URL", "Status"], ["https://www.latimes.com/a,b", "200"],
+                                            ["https://www.latimes.com/line\nbreak", "404"]]
+    assert read_rows(spider.visit_file) == [
+        ["URL", "Size (Bytes)", "Outlinks", "Content-Type"],
+        ["https://www.latimes.com/a,b", "1234.00", "2", "text/html"],
+        ['https://www.latimes.com/"quoted",page', "0.50", "0", 'multipart/mixed; boundary="a,b"'],
+    ]
+    assert read_rows(spider.urls_file) == [["Encountered URL", "Indicator"], ["https://www.latimes.com/x", "OK"],
+                                           ['https://example.com/say "hi"', "N_OK"],
+                                           ["https://www.latimes.com/line\r\nbreak", "OK"]]
+
+
+def test_legacy_format_is_the_baseline_output(tmp_path):
+    spider = write_items(str(tmp_path), ITEMS, log_format="legacy")
+    baseline = BaselineWriterPipeline()
+    baseline.open_spider(spider)
+    for item in ITEMS:
+        baseline.process_item(item, spider)
+    for name in ("fetch_file", "visit_file", "urls_file"):
+        with open(getattr(spider, name), "rb") as f, open(getattr(baseline.spider, name), "rb") as expected:
+            assert f.read() == expected.read()
+
+
+def test_legacy_crawl_logs_are_the_baseline_output(tmp_path):
+    # both writers in the same crawl, so they get the same items in the same order
+    server = start_mock_site(pages=60, links=20, size=2000)
+    pipelines = {"scrapy_crawler.pipelines.ScrapyCrawlerPipeline": 300, "test_pipelines.BaselineWriterPipeline": 310}
+    try:
+        run_crawl_process(f"http://127.0.0.1:{server.server_address[1]}/", str(tmp_path), None,
+                          {"CSV_LOG_FORMAT": "legacy", "CSV_LOG_FLUSH_ROWS": 50, "ITEM_PIPELINES": pipelines},
+                          python_path=[TESTS_DIR])
+    finally:
+        server.shutdown()
+    for name in ("fetch", "visit", "urls"):
+        with open(tmp_path / f"{name}_latimes.csv", "rb") as f, open(tmp_path / f"baseline_{name}_latimes.csv", "rb") as expected:
+            content = f.read()
+            assert content.count(b"\n") > 1
+            assert content == expected.read()
+
+
+@pytest.mark.parametrize("flush_rows", [1, 7, 100000])
+def test_every_row_is_written_on_close(tmp_path, flush_rows):
+    items = [FetchItem(url=f"https://www.latimes.com/{n}", status=200) for n in range(1000)]
+    spider = Spider(str(tmp_path))
+    pipeline = ScrapyCrawlerPipeline(flush_rows=flush_rows, flush_interval=3600)
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+    if flush_rows > len(items):
+        # still buffered: no timer flush within the test, at most the header is on disk
+        with open(spider.fetch_file) as f:
+            assert "https://" not in f.read()
+    pipeline.close_spider(spider)
+    assert read_rows(spider.fetch_file)[1:] == [[item["url"], "200"] for item in items]
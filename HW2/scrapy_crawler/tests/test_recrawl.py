@@ -0,0 +1,122 @@
+import re
+import sqlite3
+
+from scrapy import Request
+
+from scrapy_crawler.crawl_stats import CrawlStats
+from scrapy_crawler.recrawl import RecrawlState
+from testing.mock_crawl import read_log, read_report, run_crawl_process
+from testing.synthetic_site import SiteConfig, start_synthetic_site
+
+
+def test_change_rate_and_seeds(tmp_path):
+    state = RecrawlState(str(tmp_path / "recrawl.sqlite"))
+    assert state.change_rate("http://a/") == 1.0
+    for body in (b"a", b"a", b"a"):
+        state.record_response("http://a/", "", "", body)
+    for body in (b"1", b"2", b"3"):
+        state.record_response("http://b/", "", "", body)
+    state.record_response("http://c/", "", "", b"c")
+    # (changes + 1) / (fetches + 1)
+    assert state.change_rate("http://a/") == 1 / 4
+    assert state.change_rate("http://b/") == 3 / 4
+    assert state.change_rate("http://c/") == 1 / 2
+    assert (state.new, state.changed, state.unchanged) == (3, 2, 2)
+    assert state.seeds() == ["http://b/", "http://c/", "http://a/"]
+    state.close()
+    # kept between crawls
+    state = RecrawlState(str(tmp_path / "recrawl.sqlite"))
+    assert state.known == 3
+    assert state.change_rate("http://b/") == 3 / 4
+
+
+def test_prepare_sends_validators_and_skips_pages_that_rarely_change(tmp_path):
+    state = RecrawlState(str(tmp_path / "recrawl.sqlite"), min_change_rate=0.4, max_age=3600)
+    state.record_response("http://a/", '"a-1"', "Tue, 14 Nov 2023 22:13:20 GMT", b"a")
+    state.record_response("http://a/", '"a-1"', "Tue, 14 Nov 2023 22:13:20 GMT", b"a")
+    state.record_response("http://b/", "", "Tue, 14 Nov 2023 22:13:20 GMT", b"b")
+
+    request = state.prepare(Request("http://new/", priority=5))
+    assert request.priority == 105
+    assert b"If-None-Match" not in request.headers
+    request = state.prepare(Request("http://b/"))
+    assert request.priority == 50
+    assert b"If-None-Match" not in request.headers
+    assert request.headers[b"If-Modified-Since"] == b"Tue, 14 Nov 2023 22:13:20 GMT"
+    state.record_request(request)
+    assert state.conditional == 1
+
+    # a changed on none of its refetches: not due until its last fetch is max_age old
+    assert state.prepare(Request("http://a/")) is None
+    assert state.skipped == {"http://a/"}
+    assert state.bytes_skipped() == 1
+    state.pages["http://a/"]["last_fetched"] -= 3600
+    request = state.prepare(Request("http://a/"))
+    assert request.headers[b"If-None-Match"] == b'"a-1"'
+    assert request.headers[b"If-Modified-Since"] == b"Tue, 14 Nov 2023 22:13:20 GMT"
+
+    state.record_not_modified("http://a/")
+    assert (state.not_modified, state.bytes_saved) == (1, 1)
+    assert state.pages["http://a/"]["fetches"] == 3
+
+
+def test_not_modified_is_not_a_failed_fetch():
+    stats = CrawlStats()
+    for status in (200, 304, 304, 404):
+        stats.record_fetch(status)
+    snapshot = stats.snapshot()
+    assert (snapshot["fetches_succeeded"], snapshot["fetches_not_modified"], snapshot["fetches_failed"]) == (1, 2, 1)
+    assert "# Fetches not modified (304): 2\n# Fetches failed or aborted: 1\n" in stats.report()
+    # and a crawl without 304s has the report it always had
+    assert "not modified" not in CrawlStats().report()
+
+
+def report_count(report, label):
+    return int(re.search(rf"^# {re.escape(label)}: (\d+)", report, re.M).group(1))
+
+
+def test_recrawl_of_a_changed_site(tmp_path):
+    config = SiteConfig(pages=60, links=15, size=2000, image_ratio=0.0, redirect_ratio=0.05, error_ratio=0.1,
+                        fronts=5, change_ratio=0.2)
+    server = start_synthetic_site(config)
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    state_path = str(tmp_path / "recrawl.sqlite")
+    settings = {"RECRAWL_ENABLED": True, "RECRAWL_STATE": state_path}
+    runs = [tmp_path / name for name in ("first", "second", "third")]
+    for run_dir in runs:
+        run_dir.mkdir()
+    try:
+        run_crawl_process(start_url, str(runs[0]), None, settings)
+        with sqlite3.connect(state_path) as db:
+            known = [url for url, in db.execute("SELECT url FROM pages")]
+
+        # every known page is requested with its validators; the unchanged ones come back 304
+        config.epoch = 1
+        stats = run_crawl_process(start_url, str(runs[1]), None, settings)
+        number = {url: int(url.rsplit("/", 1)[1].split(".")[0]) if url != start_url else 0 for url in known}
+        unchanged = {url for url in known if config.version(number[url]) == 0}
+        assert unchanged and len(unchanged) < len(known)
+        rows = read_log(str(runs[1]))[1:]
+        assert {url for url, status in rows if status == "304"} == unchanged
+        assert stats["recrawl/conditional_requests"] == len(known)
+        assert stats["recrawl/not_modified"] == len(unchanged)
+        assert stats["recrawl/changed"] == len(known) - len(unchanged)
+        report = read_report(str(runs[1]))
+        statuses = [int(status) for _, status in rows]
+        assert report_count(report, "Fetches attempted") == len(rows)
+        assert report_count(report, "Fetches succeeded") == sum(1 for status in statuses if 200 <= status <= 299)
+        assert report_count(report, "Fetches not modified (304)") == len(unchanged)
+        assert report_count(report, "Fetches failed or aborted") == sum(1 for status in statuses if not 200 <= status <= 299 and status != 304)
+        assert report_count(report, "304 Not Modified") == len(unchanged)
+
+        # pages unchanged in two fetches fall below the minimum change rate and are not requested
+        config.epoch = 2
+        hits = server.RequestHandlerClass.hits
+        hits.clear()
+        stats = run_crawl_process(start_url, str(runs[2]), None, dict(settings, RECRAWL_MIN_CHANGE_RATE=0.4))
+    finally:
+        server.shutdown()
+    skipped = unchanged - {start_url}
+    assert stats["recrawl/skipped"] == len(skipped)
+    assert not {url.split(str(server.server_address[1]), 1)[1] for url in skipped} & set(hits)
+    assert report_count(read_report(str(runs[2])), "Not requested (unlikely to have changed)") == len(skipped)
@@ -0,0 +1,96 @@
+import os
+import pickle
+import time
+
+import pytest
+
+from scrapy_crawler.scheduler import JOURNAL_FILE, pending_records
+from scrapy_crawler.spiders.news import latimesSpider
+from testing.mock_crawl import fetched_urls, read_report, run_crawl_process, start_crawl_process
+from testing.mock_site import start_mock_site
+
+
+def test_stopped_crawl_resumes_without_refetching(tmp_path):
+    # check_resume.py on a smaller site
+    pages = 60
+    server = start_mock_site(pages=pages, links=10, size=2000)
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    hits = server.RequestHandlerClass.hits
+    full_dir = tmp_path / "full"
+    resumed_dir = tmp_path / "resumed"
+    full_dir.mkdir()
+    resumed_dir.mkdir()
+    try:
+        run_crawl_process(start_url, str(full_dir))
+        _, expected = fetched_urls(str(full_dir))
+
+        hits.clear()
+        runs = 0
+        while True:
+            runs += 1
+            stats = run_crawl_process(start_url, str(resumed_dir), 25, {"JOBDIR": os.path.join(resumed_dir, "job")})
+            if stats["finish_reason"] != "closespider_pagecount" or runs > pages:
+                break
+    finally:
+        server.shutdown()
+
+    _, urls = fetched_urls(str(resumed_dir))
+    assert runs > 1
+    # the CSV header is written once
+    assert "URL" not in urls
+    assert not [path for path, count in hits.items() if count > 1]
+    assert len(urls) == len(set(urls))
+    assert set(urls) == set(expected)
+    assert read_report(str(resumed_dir)) == read_report(str(full_dir))
+
+
+@pytest.mark.parametrize("checkpoint_interval", [1000, 10])
+def test_killed_crawl_resumes_without_refetching(tmp_path, checkpoint_interval):
+    # killed twice, the second time after some checkpoints when the interval is 10
+    pages = 60
+    server = start_mock_site(pages=pages, links=20, size=2000)
+    port = server.server_address[1]
+    start_url = f"http://127.0.0.1:{port}/"
+    hits = server.RequestHandlerClass.hits
+    full_dir = tmp_path / "full"
+    resumed_dir = tmp_path / "resumed"
+    full_dir.mkdir()
+    resumed_dir.mkdir()
+    settings = {"JOBDIR": os.path.join(resumed_dir, "job"), "JOBDIR_CHECKPOINT_INTERVAL": checkpoint_interval}
+    try:
+        run_crawl_process(start_url, str(full_dir))
+        _, expected = fetched_urls(str(full_dir))
+
+        hits.clear()
+        for kill_after in (20, 60):
+            process = start_crawl_process(start_url, str(resumed_dir), None, settings)
+            while sum(hits.values()) < kill_after and process.poll() is None:
+                time.sleep(0.005)
+            assert process.poll() is None
+            process.kill()
+            process.communicate()
+        stats = run_crawl_process(start_url, str(resumed_dir), None, settings)
+    finally:
+        server.shutdown()
+
+    assert stats["finish_reason"] == "finished"
+    assert not [path for path, count in hits.items() if count > 1]
+    # only the requests being downloaded at a kill are never requested
+    expected_paths = {url.split(str(port), 1)[1] for url in expected} | {"/"}
+    assert set(hits) <= expected_paths
+    assert len(expected_paths - set(hits)) <= 2 * latimesSpider.custom_settings["CONCURRENT_REQUESTS"]
+    # the log rows still buffered at a kill are lost, the others are not repeated
+    _, urls = fetched_urls(str(resumed_dir))
+    assert len(urls) == len(set(urls))
+    assert set(urls) <= set(expected)
+
+
+def test_journal_ends_at_a_truncated_record(tmp_path):
+    path = str(tmp_path / JOURNAL_FILE)
+    with open(path, "wb") as f:
+        for record in [("+", b"a", {"url": "a"}), ("+", b"b", {"url": "b"}), ("-", b"a"), ("+", b"a", {"url": "a2"}),
+                       ("+", b"c", {"url": "c"})]:
+            f.write(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+        f.write(pickle.dumps(("+", b"d", {"url": "d"}), pickle.HIGHEST_PROTOCOL)[:-5])
+    # the retry of a is still pending
+    assert [record[2]["url"] for record in pending_records(path)] == ["b", "a2", "c"]
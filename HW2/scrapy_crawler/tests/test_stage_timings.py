@@ -0,0 +1,30 @@
+import json
+import os
+
+from scrapy.utils.project import get_project_settings
+
+from testing.mock_crawl import run_crawl_process
+from testing.mock_site import start_mock_site
+
+
+def test_default_crawl_keeps_scrapys_resolver():
+    settings = get_project_settings()
+    assert not settings.getbool("STAGE_TIMINGS_ENABLED")
+    assert settings.get("TWISTED_DNS_RESOLVER") == "scrapy.resolver.CachingThreadedResolver"
+
+
+def test_stage_timings_with_timed_resolver(tmp_path):
+    server = start_mock_site(pages=30, links=10, size=2000)
+    try:
+        # a host name, so the resolver is asked
+        start_url = f"http://localhost:{server.server_address[1]}/"
+        run_crawl_process(start_url, str(tmp_path), 30, {
+            "STAGE_TIMINGS_ENABLED": True,
+            "TWISTED_DNS_RESOLVER": "scrapy_crawler.instrumentation.TimedResolver",
+        })
+    finally:
+        server.shutdown()
+    with open(os.path.join(tmp_path, "stage_timings_latimes.json")) as f:
+        stages = json.load(f)["stages"]
+    assert stages["dns"]["count"] >= 1
+    assert stages["download"]["count"] >= 30
@@ -0,0 +1,152 @@
+import re
+
+#shared text analysis for the index jobs and the query tools: the default analyzer is the
+#original `re.sub(r'[^a-z\s]', ' ', text.lower()).split()` tokenization, with a bytes.translate
+#fast path for ASCII documents; stopwords, stemming and token filters are optional on top
+
+NON_LETTERS = re.compile(r'[^a-z\s]')
+#A-Z -> a-z, a-z kept, every other byte -> space
+ASCII_TABLE = bytes(c + 32 if 65 <= c <= 90 else c if 97 <= c <= 122 else 32 for c in range(256))
+
+STEMMERS = ("none", "s", "porter")
+
+#a short English stopword list; --stopword-file replaces it
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+""".split())
+
+
+def tokenize(text):
+    #lowercase runs of a-z; identical to the regex pipeline for every input
+    if text.isascii():
+        return text.encode().translate(ASCII_TABLE).decode().split()
+    #str.lower() can map non-ASCII characters into a-z (e.g. the Kelvin sign), so keep the original path
+    return NON_LETTERS.sub(' ', text.lower()).split()
+
+
+def s_stem(word):
+    #Harman's S-stemmer: only plural endings are removed
+    if word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if word.endswith("s") and not word.endswith(("us", "ss")):
+        return word[:-1]
+    return word
+
+
+def make_stemmer(name):
+    if name is None or name == "none":
+        return None
+    if name == "s":
+        return s_stem
+    if name == "porter":
+        try:
+            from nltk.stem.porter import PorterStemmer
+        except ImportError:
+            raise ImportError("--stemmer porter needs nltk (pip install nltk)")
+        return PorterStemmer().stem
+    raise ValueError(f"unknown stemmer {name!r}, expected one of {', '.join(STEMMERS)}")
+
+
+def min_length(n):
+    return lambda word: word if len(word) >= n else None
+
+
+def max_length(n):
+    return lambda word: word if len(word) <= n else None
+
+
+class StemCache(dict):
+    #words repeat a lot, so each distinct word is stemmed once
+
+    def __init__(self, stem):
+        super().__init__()
+        self.stem = stem
+
+    def __missing__(self, word):
+        stemmed = self[word] = self.stem(word)
+        return stemmed
+
+
+def load_stopwords(path):
+    with open(path) as f:
+        return frozenset(word for line in f for word in tokenize(line))
+
+
+class Analyzer:
+
+    def __init__(self, stopwords=None, stemmer=None, filters=()):
+        #filters: callables word -> word, or None to drop the word; they run after stopword
+        #removal and before stemming
+        self.stopwords = frozenset(stopwords) if stopwords else None
+        stem = make_stemmer(stemmer)
+        self.stems = StemCache(stem) if stem is not None else None
+        self.filters = list(filters)
+
+    def __call__(self, text):
+        words = tokenize(text)
+        if self.stopwords:
+            stopwords = self.stopwords
+            words = [word for word in words if word not in stopwords]
+        for token_filter in self.filters:
+            words = [word for word in map(token_filter, words) if word]
+        if self.stems is not None:
+            stems = self.stems
+            words = [stems[word] for word in words]
+        return words
+
+
+DEFAULT_ANALYZER = Analyzer()
+
+
+def add_analyzer_args(job):
+    #the same analysis options for every MRJob that tokenizes documents
+    job.add_passthru_arg('--stopwords', action='store_true',
+                         help='drop the built-in English stopwords')
+    job.add_file_arg('--stopword-file',
+                     help='drop the words of this file instead of the built-in stopwords')
+    job.add_passthru_arg('--stemmer', choices=STEMMERS, default='none',
+                         help='s: remove plural endings, porter: Porter stemmer (needs nltk)')
+    job.add_passthru_arg('--min-token-length', type=int, default=None,
+                         help='drop shorter tokens')
+    job.add_passthru_arg('--max-token-length', type=int, default=None,
+                         help='drop longer tokens')
+
+
+def make_analyzer(stopwords=False, stopword_file=None, stemmer=None, min_token_length=None, max_token_length=None):
+    words = load_stopwords(stopword_file) if stopword_file else STOPWORDS if stopwords else None
+    filters = []
+    if min_token_length:
+        filters.append(min_length(min_token_length))
+    if max_token_length:
+        filters.append(max_length(max_token_length))
+    return Analyzer(words, stemmer, filters)
+
+
+def analyzer_from_options(options):
+    return make_analyzer(options.stopwords, options.stopword_file, options.stemmer,
+                         options.min_token_length, options.max_token_length)
+
+
+def pop_analyzer_args(args):
+    #removes the analysis options from a sys.argv-style list; the query tools must be given
+    #the same options the index was built with
+    options = {}
+    if "--stopwords" in args:
+        args.remove("--stopwords")
+        options["stopwords"] = True
+    for flag, key, convert in (("--stopword-file", "stopword_file", str), ("--stemmer", "stemmer", str),
+                               ("--min-token-length", "min_token_length", int),
+                               ("--max-token-length", "max_token_length", int)):
+        if flag in args:
+            i = args.index(flag)
+            options[key] = convert(args[i + 1])
+            del args[i:i + 2]
+    return make_analyzer(**options)
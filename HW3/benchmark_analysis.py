@@ -0,0 +1,69 @@
+import re
+import sys
+import time
+from analysis import make_analyzer
+
+#usage: python benchmark_analysis.py <docID\tcontent files> [--repeat N]
+#MB/s of every analyzer configuration over the document contents, with the original
+#re.sub + split tokenization as the baseline; the default analyzer must match it exactly
+
+CONFIGURATIONS = [
+    ("default", {}),
+    ("stopwords", {"stopwords": True}),
+    ("min length 3", {"min_token_length": 3}),
+    ("s-stemmer", {"stemmer": "s"}),
+    ("porter", {"stemmer": "porter"}),
+    ("stopwords + s-stemmer + length", {"stopwords": True, "stemmer": "s", "min_token_length": 3,
+                                        "max_token_length": 20}),
+]
+
+
+def baseline(content):
+    return re.sub(r'[^a-z\s]', ' ', content.lower()).split()
+
+
+def throughput(analyze, documents, megabytes, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for content in documents:
+            analyze(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return megabytes / best
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 3
+    if "--repeat" in args:
+        i = args.index("--repeat")
+        repeat = int(args[i + 1])
+        del args[i:i + 2]
+    if not args:
+        sys.exit("usage: benchmark_analysis.py <input files> [--repeat N]")
+    documents = []
+    for path in args:
+        with open(path) as f:
+            documents.extend(line.strip().split('\t', 1)[1] for line in f if '\t' in line)
+    megabytes = sum(len(content.encode()) for content in documents) / 1e6
+    print(f"{len(documents)} documents, {megabytes:.1f} MB, best of {repeat}")
+
+    print(f"{'configuration':<32}{'MB/s':>8}{'tokens':>11}")
+    base = throughput(baseline, documents, megabytes, repeat)
+    print(f"{'re.sub + split (baseline)':<32}{base:>8.1f}{sum(len(baseline(c)) for c in documents):>11}")
+    for name, options in CONFIGURATIONS:
+        try:
+            analyzer = make_analyzer(**options)
+        except ImportError as e:
+            print(f"{name:<32}{'skipped':>8}  ({e})")
+            continue
+        speed = throughput(analyzer, documents, megabytes, repeat)
+        print(f"{name:<32}{speed:>8.1f}{sum(len(analyzer(c)) for c in documents):>11}")
+        if not options:
+            identical = all(analyzer(content) == baseline(content) for content in documents)
+            print(f"{'  identical to baseline':<32}{str(identical):>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import io
+import os
+import time
+from local_indexer import JOBS, build_index, job_inputs, make_job
+
+#usage: python benchmark_local_indexer.py [--max-workers N] [--check] [job options] <docID\tcontent files>
+#reports docs/sec of local_indexer.py for 1..N processes; --check also runs the mrjob inline
+#runner once and verifies the output is byte for byte identical
+
+
+def mrjob_output(job_name, job_args):
+    job = make_job(job_name, ["--no-conf"] + list(job_args))
+    with job.make_runner() as runner:
+        runner.run()
+        return b"".join(runner.cat_output()).decode("utf_8")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--job", choices=sorted(JOBS), default="unigram")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--check", action="store_true")
+    args, job_args = parser.parse_known_args()
+    inputs = job_inputs(args.job, job_args)
+
+    expected = None
+    if args.check:
+        start = time.perf_counter()
+        expected = mrjob_output(args.job, job_args)
+        print(f"mrjob inline runner: {time.perf_counter() - start:.2f} s")
+
+    print(f"{'workers':>8}{'seconds':>10}{'docs/s':>12}{'speedup':>10}{'identical':>11}")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        out = io.StringIO()
+        start = time.perf_counter()
+        docs, _ = build_index(args.job, job_args, inputs, out, workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        identical = "-" if expected is None else str(out.getvalue() == expected)
+        print(f"{workers:>8}{elapsed:>10.2f}{docs / elapsed:>12.0f}{baseline / elapsed:>9.2f}x{identical:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import random
+import sys
+import time
+from collections import Counter
+from analysis import tokenize
+from phrase_matcher import PhraseMatcher
+
+#usage: python benchmark_phrase_matcher.py <docID\tcontent file> [max phrases]
+#throughput of the Aho-Corasick phrase matcher for phrase lists of 5 up to 100k phrases of 2-4 words
+#(drawn from the corpus so that they actually match), against the n-gram string set lookup it replaces
+
+SIZES = [5, 100, 1000, 10000, 100000]
+SEED = 572
+
+
+def make_phrases(documents, size):
+    rng = random.Random(SEED)
+    phrases = set()
+    while len(phrases) < size:
+        words = documents[rng.randrange(len(documents))]
+        n = rng.randint(2, 4)
+        if len(words) > n:
+            start = rng.randrange(len(words) - n)
+            phrases.add(' '.join(words[start:start + n]))
+    return sorted(phrases)
+
+
+def naive_matches(words, phrases, lengths):
+    #one string per word and phrase length; the same (end position, longest first) order as the matcher
+    for end in range(len(words)):
+        for n in lengths:
+            if end + 1 >= n:
+                phrase = ' '.join(words[end + 1 - n:end + 1])
+                if phrase in phrases:
+                    yield phrase
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("usage: benchmark_phrase_matcher.py <input> [max phrases]")
+    max_phrases = int(sys.argv[2]) if len(sys.argv) > 2 else SIZES[-1]
+    with open(sys.argv[1]) as f:
+        documents = [tokenize(line.split('\t', 1)[1]) for line in f if '\t' in line]
+    tokens = sum(len(words) for words in documents)
+    print(f"{len(documents)} documents, {tokens} tokens")
+    print(f"{'phrases':>8}{'build ms':>10}{'states':>9}{'matcher tok/s':>15}{'naive tok/s':>13}{'matches':>10}{'identical':>11}")
+
+    for size in SIZES:
+        if size > max_phrases:
+            break
+        phrases = make_phrases(documents, size)
+        start = time.perf_counter()
+        matcher = PhraseMatcher(phrases)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = Counter()
+        for words in documents:
+            found.update(matcher.matches(words))
+        elapsed = time.perf_counter() - start
+
+        phrase_set = set(matcher.phrases)
+        lengths = sorted({p.count(' ') + 1 for p in phrase_set}, reverse=True)
+        start = time.perf_counter()
+        expected = Counter()
+        for words in documents:
+            expected.update(naive_matches(words, phrase_set, lengths))
+        naive = time.perf_counter() - start
+
+        print(f"{size:>8}{1000 * build:>10.1f}{len(matcher.goto):>9}{tokens / elapsed:>15.0f}"
+              f"{tokens / naive:>13.0f}{sum(found.values()):>10}{str(found == expected):>11}")
+
+
+if __name__ == '__main__':
+    main()
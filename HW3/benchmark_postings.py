@@ -0,0 +1,75 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from postings_codec import (PostingsReader, format_binary_line, index_size, load_text_index,
+                            parse_postings, parse_text_line, pack_index)
+
+#usage: python benchmark_postings.py <text index produced by unigram_index.py/bigram_index.py> [lookups]
+
+LOOKUP_SEED = 572
+
+
+def text_lookup(path, term):
+    #what a reader of the text output has to do: scan lines until the term shows up, then parse it
+    prefix = term + " -> "
+    postings = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith(prefix):
+                postings.extend(parse_text_line(line)[1])
+            elif postings:
+                #a streamed term's block lines are consecutive
+                break
+    return postings
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(text_path, lookups):
+    with open(text_path) as f:
+        lines = [line for line in f if line.strip()]
+    text_index = load_text_index(text_path)
+    terms = list(text_index)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, "index")
+        binary_lines = (format_binary_line(*parse_text_line(line)) for line in lines)
+        pack_index(binary_lines, prefix)
+
+        text_bytes = os.path.getsize(text_path)
+        binary_bytes = index_size(prefix)
+
+        #full decode of every posting list
+        text_postings, text_decode = timed(lambda: [(t, parse_postings(text_index[t])) for t in terms])
+        with PostingsReader(prefix) as reader:
+            binary_postings, binary_decode = timed(lambda: [(t, reader.postings(t)) for t in terms])
+        n_postings = sum(len(p) for _, p in text_postings)
+        for (term, text_p), (_, binary_p) in zip(text_postings, binary_postings):
+            if [(int(p[0]), *p[1:]) for p in text_p] != binary_p:
+                sys.exit(f"binary postings for {term!r} do not match the text index")
+
+        #single-term lookups
+        sample = random.Random(LOOKUP_SEED).choices(terms, k=lookups)
+        _, text_lookups = timed(lambda: [text_lookup(text_path, t) for t in sample])
+        with PostingsReader(prefix) as reader:
+            _, binary_lookups = timed(lambda: [reader.postings(t) for t in sample])
+
+    print(f"Terms: {len(terms)}  Postings: {n_postings}")
+    print(f"{'':24}{'text':>14}{'binary':>14}{'ratio':>10}")
+    print(f"{'Size (bytes)':24}{text_bytes:>14}{binary_bytes:>14}{text_bytes / binary_bytes:>9.2f}x")
+    print(f"{'Full decode (s)':24}{text_decode:>14.4f}{binary_decode:>14.4f}{text_decode / binary_decode:>9.2f}x")
+    print(f"{'Postings/s decoded':24}{n_postings / text_decode:>14.0f}{n_postings / binary_decode:>14.0f}")
+    print(f"{f'{lookups} lookups (ms/term)':24}{1000 * text_lookups / lookups:>14.3f}"
+          f"{1000 * binary_lookups / lookups:>14.3f}{text_lookups / binary_lookups:>9.2f}x")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        sys.exit("usage: python benchmark_postings.py <text index> [lookups]")
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) == 3 else 200)
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+from ranked_query import DEFAULT_K, RankedIndex
+
+#usage: python benchmark_ranking.py <unigram index> [queries file] [repeats]
+#the default workload is the HW1 query set
+
+QUERIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "HW1", "100QueriesSet4.txt")
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run(index, queries, method, repeats):
+    latencies = []
+    index.postings_scored = 0
+    results = {}
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            results[query] = index.search(query, DEFAULT_K, method)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return results, latencies, index.postings_scored / repeats
+
+
+def main(index_path, queries_path, repeats):
+    with open(queries_path) as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    for scoring in ("bm25", "tfidf"):
+        index = RankedIndex.from_file(index_path, scoring)
+        #warm the per-term cache so both methods are timed on decoded postings
+        for query in queries:
+            index.query_terms(query)
+
+        print(f"{scoring.upper()} top-{DEFAULT_K}, {len(queries)} queries x {repeats}")
+        print(f"{'method':12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'QPS':>10}{'scored':>12}")
+        baseline = None
+        for method in ("exhaustive", "wand"):
+            results, latencies, scored = run(index, queries, method, repeats)
+            total = sum(latencies)
+            print(f"{method:12}{1000 * total / len(latencies):>10.3f}{1000 * percentile(latencies, 0.5):>10.3f}"
+                  f"{1000 * percentile(latencies, 0.95):>10.3f}{1000 * percentile(latencies, 0.99):>10.3f}"
+                  f"{len(latencies) / total:>10.0f}{scored:>12.0f}")
+            if baseline is None:
+                baseline = results
+            elif results != baseline:
+                differing = sum(results[q] != baseline[q] for q in queries)
+                print(f"  warning: {differing} queries ranked differently from exhaustive evaluation")
+        print()
+
+
+if __name__ == '__main__':
+    if not 2 <= len(sys.argv) <= 4:
+        sys.exit("usage: python benchmark_ranking.py <unigram index> [queries file] [repeats]")
+    main(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else QUERIES_PATH,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 5)
@@ -1,32 +1,108 @@
 from mrjob.job import MRJob
 from mrjob.step import MRStep
 from mrjob.protocol import RawValueProtocol
-import re
-from collections import defaultdict
+import resource
+from collections import Counter, defaultdict
+from analysis import add_analyzer_args, analyzer_from_options
+from docid_map import DocIdMap
+from phrase_matcher import PhraseMatcher, load_phrases
+from postings_codec import sort_postings, format_line, merge_sorted_postings, format_blocks
 
 SELECTED_BIGRAMS = {"computer science", "information retrieval","power politics", "los angeles", "bruce willis"}
 
 class MRBigramIndex(MRJob):
     OUTPUT_PROTOCOL = RawValueProtocol
+    FILES = ['analysis.py', 'postings_codec.py', 'docid_map.py', 'phrase_matcher.py']
+
+    def configure_args(self):
+        super(MRBigramIndex, self).configure_args()
+        self.add_passthru_arg('--output-format', choices=['text', 'binary'], default='text',
+                              help='text: "bigram -> doc:count, ..." lines, binary: vbyte postings for postings_codec.py pack')
+        self.add_passthru_arg('--job-mode', choices=['two-pass', 'single-pass'], default='two-pass',
+                              help='single-pass counts bigrams per document in the mapper and skips the counting step')
+        self.add_file_arg('--phrases',
+                          help='file with one phrase (of any length) per line to index instead of SELECTED_BIGRAMS')
+        self.add_file_arg('--docid-map',
+                          help='dense docID map from docid_map.py; postings use the integer IDs')
+        self.add_passthru_arg('--stream-postings', action='store_true',
+                              help='secondary sort on docID and write postings in blocks instead of buffering each bigram')
+        self.add_passthru_arg('--block-size', type=int, default=10000,
+                              help='postings per output line with --stream-postings')
+        self.add_passthru_arg('--report-rss', type=int, default=None, metavar='MIN_POSTINGS',
+                              help='report the reducer peak RSS as a job counter for each bigram with at least MIN_POSTINGS postings')
+        add_analyzer_args(self)
+
+    def sort_values(self):
+        #with --stream-postings the values of every key reach the reducer sorted by docID
+        return self.options.stream_postings
 
     def steps(self):
+        output_reducer = self.reducer_output_streaming if self.options.stream_postings else self.reducer_output
+        if self.options.job_mode == 'single-pass':
+            return [
+                MRStep(mapper_init=self.init_mapper, mapper=self.mapper_combined,
+                       mapper_final=self.report_shuffle_counters, reducer_init=self.init_shuffle_counters,
+                       reducer=output_reducer, reducer_final=self.report_shuffle_counters)
+            ]
         return [
-            MRStep(mapper=self.mapper,reducer=self.reducer_counts),
-            MRStep(reducer=self.reducer_output)
+            MRStep(mapper_init=self.init_mapper, mapper=self.mapper,
+                   mapper_final=self.report_shuffle_counters, reducer_init=self.init_shuffle_counters,
+                   reducer=self.reducer_counts, reducer_final=self.report_shuffle_counters),
+            MRStep(reducer=output_reducer)
         ]
 
+    def init_mapper(self):
+        self.init_shuffle_counters()
+        self.docids = DocIdMap(self.options.docid_map) if self.options.docid_map else None
+        self.analyzer = analyzer_from_options(self.options)
+        phrases = load_phrases(self.options.phrases) if self.options.phrases else sorted(SELECTED_BIGRAMS)
+        #phrases go through the same analyzer as the documents
+        self.matcher = PhraseMatcher(phrases, self.analyzer)
+
+    def mapper_docID(self, docID):
+        #dense integer ID; zero-padded when the secondary sort compares values as strings
+        if self.docids is None:
+            return docID
+        dense = self.docids.to_dense(docID)
+        return f"{dense:0{self.docids.width}d}" if self.options.stream_postings else dense
+
+    def init_shuffle_counters(self):
+        self.shuffled = 0
+        self.shuffled_two_pass = 0
+
+    def report_shuffle_counters(self):
+        self.increment_counter('shuffle', 'records shuffled', self.shuffled)
+        self.increment_counter('shuffle', 'records shuffled by two-pass mode', self.shuffled_two_pass)
+
+    def selected_bigrams(self, content):
+        #one pass of the phrase automaton over the document's words
+        return self.matcher.matches(self.analyzer(content))
+
     def mapper(self, _, line):
         if '\t' in line:
             docID, content = line.strip().split('\t', 1)
-            content = re.sub(r'[^a-z\s]', ' ', content.lower())
-            words = content.split()
-            for i in range(len(words) - 1):
-                bigram = f"{words[i]} {words[i+1]}"
-                if bigram in SELECTED_BIGRAMS:
-                    yield (bigram, docID), 1
+            docID = self.mapper_docID(docID)
+            for bigram in self.selected_bigrams(content):
+                self.shuffled += 1
+                self.shuffled_two_pass += 1
+                yield (bigram, docID), 1
+
+    def mapper_combined(self, _, line):
+        if '\t' in line:
+            docID, content = line.strip().split('\t', 1)
+            docID = self.mapper_docID(docID)
+            counts = Counter(self.selected_bigrams(content))
+            #two-pass mode shuffles every match, then every distinct (bigram, docID) count; a docID
+            #can come back on another line, so the output reducer counts those (count_two_pass_postings)
+            self.shuffled += len(counts)
+            self.shuffled_two_pass += sum(counts.values())
+            for bigram, count in counts.items():
+                yield bigram, (docID, count)
 
     def reducer_counts(self, key, values):
         bigram, docID = key
+        self.shuffled += 1
+        self.shuffled_two_pass += 1
         yield bigram, (docID, sum(values))
 
     def reducer_output(self, bigram, doc_counts):
@@ -34,8 +110,35 @@ class MRBigramIndex(MRJob):
         for docID, count in doc_counts:
             count_dict[docID] += count
         
-        sorted_postings = sorted(count_dict.items())
-        postings_str = ', '.join(f"{doc}:{count}" for doc, count in sorted_postings)
-        yield None, f"{bigram} -> {postings_str}"
+        sorted_postings = sort_postings(count_dict, self.options.output_format)
+        yield None, format_line(bigram, sorted_postings, self.options.output_format)
+        self.count_two_pass_postings(len(sorted_postings))
+        self.report_rss(bigram, len(sorted_postings))
+
+    def numeric_docIDs(self):
+        return self.options.output_format == 'binary' or bool(self.options.docid_map)
+
+    def reducer_output_streaming(self, bigram, doc_counts):
+        #postings arrive in docID order, so each block is written as soon as it is full
+        postings = merge_sorted_postings(doc_counts, self.numeric_docIDs(), False)
+        written = 0
+        for line, block_postings in format_blocks(bigram, postings, self.options.output_format, self.options.block_size):
+            written += block_postings
+            yield None, line
+        self.count_two_pass_postings(written)
+        self.report_rss(bigram, written)
+
+    def count_two_pass_postings(self, postings):
+        #in single-pass mode, the (bigram, docID) counts two-pass mode would have shuffled into this
+        #step: one per posting, docIDs repeated across lines merged
+        if self.options.job_mode == 'single-pass':
+            self.shuffled_two_pass += postings
+
+    def report_rss(self, bigram, postings):
+        #ru_maxrss is the peak of the whole reducer process so far (KB on Linux, bytes on macOS)
+        if self.options.report_rss is not None and postings >= self.options.report_rss:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.increment_counter('peak reducer RSS after term', f"{bigram} ({postings} postings)", peak)
 
-MRBigramIndex.run()
+if __name__ == '__main__':
+    MRBigramIndex.run()
@@ -0,0 +1,58 @@
+import gzip
+import sys
+
+#pre-pass that gives every document a dense integer ID (0, 1, 2, ... in input order) and
+#persists the mapping as "dense\texternal" lines; the index jobs take it with --docid-map
+#and the query tools use it to translate results back to the original docIDs
+
+
+def open_input(path):
+    return gzip.open(path, "rt") if path.endswith(".gz") else open(path)
+
+
+def build_docid_map(paths, map_path):
+    dense = {}
+    with open(map_path, "w") as out:
+        for path in paths:
+            with open_input(path) as f:
+                for line in f:
+                    if '\t' not in line:
+                        continue
+                    docID = line.strip().split('\t', 1)[0]
+                    if docID not in dense:
+                        dense[docID] = len(dense)
+                        out.write(f"{dense[docID]}\t{docID}\n")
+    return len(dense)
+
+
+class DocIdMap:
+
+    def __init__(self, path):
+        self.dense = {}
+        self.external = []
+        with open(path) as f:
+            for line in f:
+                dense, docID = line.rstrip('\n').split('\t', 1)
+                if int(dense) != len(self.external):
+                    raise ValueError(f"{path} is not a dense docID map: expected {len(self.external)}, got {dense}")
+                self.dense[docID] = len(self.external)
+                self.external.append(docID)
+        #digits of the largest dense ID, for shuffles that sort values as strings
+        self.width = len(str(max(len(self.external) - 1, 0)))
+
+    def __len__(self):
+        return len(self.external)
+
+    def to_dense(self, docID):
+        return self.dense[docID]
+
+    def to_external(self, dense):
+        return self.external[int(dense)]
+
+
+if __name__ == '__main__':
+    #usage: python docid_map.py <docID\tcontent files...> <map file>
+    if len(sys.argv) < 3:
+        sys.exit("usage: docid_map.py <input files...> <map file>")
+    n = build_docid_map(sys.argv[1:-1], sys.argv[-1])
+    print(f"Assigned {n} dense docIDs in {sys.argv[-1]}")
@@ -0,0 +1,198 @@
+import argparse
+import gzip
+import heapq
+import importlib
+import os
+import pickle
+import sys
+import tempfile
+from itertools import groupby
+from multiprocessing import Pool
+
+#native local backend for the index jobs: the input is split into byte ranges, a process pool
+#runs the job's in-mapper-combining mapper over each range and flushes sorted runs to disk,
+#and a streaming k-way merge feeds the job's own output reducer, so the lines written are
+#exactly what the mrjob inline runner produces for the same options
+
+JOBS = {
+    "unigram": ("unigram_index", "MRUnigramIndex"),
+    "bigram": ("bigram_index", "MRBigramIndex"),
+}
+
+#postings buffered per worker before a sorted run is flushed
+DEFAULT_RUN_SIZE = 1000000
+#byte-range shards per worker, so a slow shard does not leave the other cores idle
+SHARDS_PER_WORKER = 4
+#smallest byte range worth a task of its own
+MIN_SHARD_BYTES = 1 << 20
+
+
+def make_job(job_name, job_args):
+    module_name, class_name = JOBS[job_name]
+    job = getattr(importlib.import_module(module_name), class_name)(args=list(job_args))
+    job.init_mapper()
+    return job
+
+
+def plan_shards(paths, workers, min_shard_bytes=MIN_SHARD_BYTES):
+    #(path, start, end) byte ranges; gzip input cannot be split and is one shard per file
+    shards = []
+    total = sum(os.path.getsize(p) for p in paths)
+    shard_bytes = max(min_shard_bytes, total // (workers * SHARDS_PER_WORKER) + 1)
+    for path in paths:
+        size = os.path.getsize(path)
+        if path.endswith(".gz"):
+            shards.append((path, 0, None))
+            continue
+        for start in range(0, size, shard_bytes):
+            shards.append((path, start, min(start + shard_bytes, size)))
+    return shards
+
+
+def read_shard(path, start, end):
+    #a line belongs to the shard its first byte falls in
+    if end is None:
+        with gzip.open(path, "rb") as f:
+            yield from f
+        return
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line
+
+
+def shuffle_term_key(job):
+    #mrjob's shuffle orders keys by their internal-protocol (JSON) encoding, not the term itself:
+    #the closing quote puts "los angeles times" before "los angeles"
+    write = job.internal_protocol().write
+    return lambda term: write(term, None).split(b"\t", 1)[0]
+
+
+def shuffle_sort_key(job):
+    #mrjob's secondary sort orders values by their internal-protocol encoding
+    write = job.internal_protocol().write
+    return lambda record: write(record[0], record[1])
+
+
+def flush_run(job, buffer, tmp_dir):
+    #one pickled (shuffle key, term, values) record per term, in shuffle key order
+    fd, run_path = tempfile.mkstemp(suffix=".run", dir=tmp_dir)
+    term_key = shuffle_term_key(job)
+    sort_key = shuffle_sort_key(job) if job.sort_values() else None
+    with os.fdopen(fd, "wb") as f:
+        for key, term in sorted((term_key(term), term) for term in buffer):
+            values = buffer[term]
+            if sort_key is not None:
+                values.sort(key=lambda value: sort_key((term, value)))
+            pickle.dump((key, term, values), f, pickle.HIGHEST_PROTOCOL)
+    return run_path
+
+
+def index_shard(task):
+    job_name, job_args, tmp_dir, run_size, (path, start, end) = task
+    job = make_job(job_name, job_args)
+    protocol = job.input_protocol()
+    buffer = {}
+    buffered = 0
+    docs = 0
+    runs = []
+    for raw in read_shard(path, start, end):
+        _, line = protocol.read(raw.rstrip(b"\n"))
+        docs += 1
+        for term, value in job.mapper_combined(None, line):
+            buffer.setdefault(term, []).append(value)
+            buffered += 1
+        if buffered >= run_size:
+            runs.append(flush_run(job, buffer, tmp_dir))
+            buffer = {}
+            buffered = 0
+    if buffer:
+        runs.append(flush_run(job, buffer, tmp_dir))
+    return runs, docs, job.shuffled
+
+
+def read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def merge_runs(job, run_paths, out):
+    #runs are merged on the encoded shuffle keys they were sorted by, so the terms reach the
+    #reducer in the same order as in the mrjob job
+    reducer = job.steps()[-1]['reducer']
+    sort_key = shuffle_sort_key(job) if job.sort_values() else None
+    runs = [read_run(path) for path in run_paths]
+    for _, group in groupby(heapq.merge(*runs, key=lambda r: r[0]), key=lambda r: r[0]):
+        group = list(group)
+        term = group[0][1]
+        if sort_key is not None:
+            #each run is already sorted, so the secondary sort is a merge as well
+            values = heapq.merge(*(run_values for _, _, run_values in group),
+                                 key=lambda value, term=term: sort_key((term, value)))
+        else:
+            values = (value for _, _, run_values in group for value in run_values)
+        for _, line in reducer(term, values):
+            out.write(line)
+            out.write("\n")
+
+
+def build_index(job_name, job_args, paths, out, workers=None, run_size=DEFAULT_RUN_SIZE, tmp_dir=None,
+                min_shard_bytes=MIN_SHARD_BYTES):
+    #returns (documents, records shuffled through the sorted runs)
+    workers = workers or os.cpu_count()
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as run_dir:
+        tasks = [(job_name, job_args, run_dir, run_size, shard)
+                 for shard in plan_shards(paths, workers, min_shard_bytes)]
+        run_paths = []
+        docs = 0
+        shuffled = 0
+        if workers == 1:
+            results = map(index_shard, tasks)
+            for runs, shard_docs, shard_shuffled in results:
+                run_paths.extend(runs)
+                docs += shard_docs
+                shuffled += shard_shuffled
+        else:
+            with Pool(workers) as pool:
+                for runs, shard_docs, shard_shuffled in pool.imap_unordered(index_shard, tasks):
+                    run_paths.extend(runs)
+                    docs += shard_docs
+                    shuffled += shard_shuffled
+        merge_runs(make_job(job_name, job_args), run_paths, out)
+    return docs, shuffled
+
+
+def job_inputs(job_name, job_args):
+    #input paths are the job's own positional arguments, so job options with values pass through untouched
+    return make_job(job_name, job_args).options.args
+
+
+if __name__ == '__main__':
+    #usage: python local_indexer.py [--job unigram|bigram] [--workers N] [-o FILE] [job options] <inputs...>
+    parser = argparse.ArgumentParser(description="multi-core local backend for unigram_index.py/bigram_index.py; "
+                                                 "other options and the docID\\tcontent input files go to the job")
+    parser.add_argument("--job", choices=sorted(JOBS), default="unigram")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--run-size", type=int, default=DEFAULT_RUN_SIZE, help="postings per sorted run")
+    parser.add_argument("--min-shard-bytes", type=int, default=MIN_SHARD_BYTES, help="smallest input byte range per task")
+    args, job_args = parser.parse_known_args()
+    inputs = job_inputs(args.job, job_args)
+    if not inputs:
+        parser.error("no input files")
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    docs, shuffled = build_index(args.job, job_args, inputs, out, args.workers, args.run_size,
+                                 min_shard_bytes=args.min_shard_bytes)
+    if args.output:
+        out.close()
+    print(f"Indexed {docs} documents, {shuffled} records through sorted runs", file=sys.stderr)
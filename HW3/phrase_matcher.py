@@ -0,0 +1,99 @@
+import sys
+from analysis import DEFAULT_ANALYZER
+
+#token-level Aho-Corasick automaton: phrases of any length are compiled once into a trie over
+#word IDs with failure links, and a document is scanned once, left to right, with one dict lookup
+#per word and no per-pair strings; phrase files have one phrase per line
+
+
+def load_phrases(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+class PhraseMatcher:
+
+    def __init__(self, phrases, analyzer=DEFAULT_ANALYZER):
+        self.analyzer = analyzer
+        #word -> word ID, only for words that occur in some phrase
+        self.vocab = {}
+        #per state: {word ID: next state}; state 0 is the root
+        self.goto = [{}]
+        self.fail = [0]
+        #per state: phrases ending there, including those reached through failure links
+        self.output = [()]
+        self.phrases = []
+        for phrase in phrases:
+            self.add(phrase)
+        self.build()
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def add(self, phrase):
+        words = self.analyzer(phrase)
+        if not words:
+            return
+        state = 0
+        for word in words:
+            word_id = self.vocab.setdefault(word, len(self.vocab))
+            next_state = self.goto[state].get(word_id)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][word_id] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = next_state
+        phrase = ' '.join(words)
+        if phrase not in self.output[state]:
+            self.output[state] = (phrase,)
+            self.phrases.append(phrase)
+
+    def build(self):
+        #breadth-first, so the failure state of every node is final before its children need it
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word_id, child in self.goto[state].items():
+                if state:
+                    fallback = self.fail[state]
+                    while fallback and word_id not in self.goto[fallback]:
+                        fallback = self.fail[fallback]
+                    self.fail[child] = self.goto[fallback].get(word_id, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+                queue.append(child)
+
+    def matches(self, words):
+        #yields every phrase occurrence in a list of tokens, longest first at each end position
+        vocab = self.vocab
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        state = 0
+        for word in words:
+            word_id = vocab.get(word)
+            if word_id is None:
+                #a word outside every phrase can only restart the automaton
+                state = 0
+                continue
+            while state and word_id not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word_id, 0)
+            if output[state]:
+                yield from output[state]
+
+    def match_text(self, text):
+        return self.matches(self.analyzer(text))
+
+
+if __name__ == '__main__':
+    #usage: python phrase_matcher.py <phrase file> < docID\tcontent lines
+    #prints "docID\tphrase" for every phrase occurrence
+    if len(sys.argv) != 2:
+        sys.exit("usage: phrase_matcher.py <phrase file> < input")
+    matcher = PhraseMatcher(load_phrases(sys.argv[1]))
+    for line in sys.stdin:
+        if '\t' in line:
+            docID, content = line.strip().split('\t', 1)
+            for phrase in matcher.match_text(content):
+                print(f"{docID}\t{phrase}")
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+from analysis import DEFAULT_ANALYZER, pop_analyzer_args
+from docid_map import DocIdMap
+from postings_codec import (TERMS_EXT, PostingsReader, format_text_line, load_text_index,
+                            parse_postings, parse_text_line)
+
+#usage: python phrase_query.py <positional index> [--docid-map FILE] "los angeles" "computer science" ...
+#       python phrase_query.py --stats <positional index>
+#the index is the output of `unigram_index.py --positions` (text) or a prefix packed by postings_codec.py;
+#--docid-map translates dense docIDs back to the original ones, and the analysis options
+#(--stopwords, --stemmer, ...) must be the ones the index was built with
+
+
+class PositionalIndex:
+
+    def __init__(self, path, analyzer=DEFAULT_ANALYZER):
+        self.analyzer = analyzer
+        if os.path.exists(path + TERMS_EXT):
+            self.reader = PostingsReader(path)
+            self.lines = None
+        else:
+            #keep the raw lines and only parse the terms a query touches
+            self.reader = None
+            self.lines = load_text_index(path)
+
+    def postings(self, term):
+        #returns {docID: positions}
+        if self.reader is not None:
+            postings = self.reader.postings(term)
+        elif term in self.lines:
+            postings = parse_postings(self.lines[term])
+        else:
+            postings = []
+        if postings and len(postings[0]) != 3:
+            raise ValueError(f"index has no positions for {term!r}; rebuild it with --positions")
+        return {doc: positions for doc, _, positions in postings}
+
+    def phrase(self, phrase):
+        #returns (docID, occurrences) sorted by docID for every document containing the phrase
+        terms = self.analyzer(phrase)
+        if not terms:
+            return []
+        postings = {}
+        for term in set(terms):
+            postings[term] = self.postings(term)
+            if not postings[term]:
+                return []
+
+        #intersect documents starting from the rarest term
+        docs = set(min(postings.values(), key=len))
+        for term_postings in postings.values():
+            docs.intersection_update(term_postings)
+            if not docs:
+                return []
+
+        results = []
+        for doc in docs:
+            starts = postings[terms[0]][doc]
+            for offset, term in enumerate(terms[1:], 1):
+                positions = set(postings[term][doc])
+                starts = [p for p in starts if p + offset in positions]
+                if not starts:
+                    break
+            if starts:
+                results.append((doc, len(starts)))
+        results.sort()
+        return results
+
+
+def positions_overhead(path):
+    #size of a positional text index against the same index with the positions stripped
+    with_positions = 0
+    without_positions = 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            term, postings = parse_text_line(line)
+            with_positions += len(line.encode())
+            without_positions += len(format_text_line(term, [p[:2] for p in postings]).encode()) + 1
+    return with_positions, without_positions
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == "--stats":
+        with_positions, without_positions = positions_overhead(sys.argv[2])
+        print(f"Index with positions: {with_positions} bytes")
+        print(f"Index without positions: {without_positions} bytes")
+        print(f"Positions overhead: {with_positions - without_positions} bytes "
+              f"({100.0 * (with_positions - without_positions) / without_positions:.1f}%)")
+    elif len(sys.argv) >= 2:
+        args = sys.argv[1:]
+        docids = None
+        if "--docid-map" in args:
+            i = args.index("--docid-map")
+            docids = DocIdMap(args[i + 1])
+            del args[i:i + 2]
+        analyzer = pop_analyzer_args(args)
+        start = time.perf_counter()
+        index = PositionalIndex(args[0], analyzer)
+        print(f"Loaded index in {1000 * (time.perf_counter() - start):.1f} ms", file=sys.stderr)
+        phrases = args[1:] or [line.strip() for line in sys.stdin if line.strip()]
+        for phrase in phrases:
+            start = time.perf_counter()
+            results = index.phrase(phrase)
+            elapsed = 1000 * (time.perf_counter() - start)
+            if docids:
+                results = sorted((docids.to_external(doc), count) for doc, count in results)
+            print(format_text_line(' '.join(analyzer(phrase)), results))
+            print(f"{phrase!r}: {len(results)} documents in {elapsed:.2f} ms", file=sys.stderr)
+    else:
+        sys.exit("usage: phrase_query.py <index> [--docid-map FILE] [analysis options] [phrase ...] | --stats <index>")
@@ -0,0 +1,287 @@
+import base64
+import os
+import sys
+from itertools import accumulate
+from operator import sub
+
+#file extensions of a packed binary index
+POSTINGS_EXT = ".postings"
+TERMS_EXT = ".terms"
+
+TEXT_SEPARATOR = " -> "
+
+#pseudo-term holding docID:length postings; tokens are [a-z]+ so it can never clash with a word
+DOC_LENGTHS_TERM = "__doclen__"
+
+
+def vbyte_encode(numbers, out=None):
+    #variable-byte encoding: 7 bits per byte, high bit set on the last byte of a number
+    if out is None:
+        out = bytearray()
+    for n in numbers:
+        if n < 0:
+            raise ValueError(f"cannot vbyte-encode negative number {n}")
+        while n >= 128:
+            out.append(n & 127)
+            n >>= 7
+        out.append(n | 128)
+    return out
+
+
+def vbyte_decode(data, offset=0, count=None):
+    #returns (numbers, next offset); decodes everything after offset when count is None
+    numbers = []
+    n = 0
+    shift = 0
+    end = len(data)
+    while offset < end and (count is None or len(numbers) < count):
+        b = data[offset]
+        offset += 1
+        if b & 128:
+            numbers.append(n | ((b & 127) << shift))
+            n = 0
+            shift = 0
+        else:
+            n |= b << shift
+            shift += 7
+    return numbers, offset
+
+
+def encode_postings(postings):
+    #postings: (docID, count) or (docID, count, positions) tuples sorted by numeric docID
+    #layout: df, has positions, then per posting: docID gap, count[, position gaps]
+    has_positions = bool(postings) and len(postings[0]) == 3
+    out = vbyte_encode((len(postings), int(has_positions)))
+    prev = 0
+    for posting in postings:
+        doc, count = int(posting[0]), posting[1]
+        if doc < prev:
+            raise ValueError("postings must be sorted by numeric docID before encoding")
+        vbyte_encode((doc - prev, count), out)
+        prev = doc
+        if has_positions:
+            vbyte_encode(map(sub, posting[2], [0] + posting[2][:-1]), out)
+    return bytes(out)
+
+
+def decode_postings(blob):
+    #a blob holds one or more blocks of a single posting list (streamed output writes one
+    #block per line), each starting with its own (df, has positions) header
+    numbers = []
+    append = numbers.append
+    n = 0
+    shift = 0
+    for b in blob:
+        if b & 128:
+            append(n | ((b & 127) << shift))
+            n = 0
+            shift = 0
+        else:
+            n |= b << shift
+            shift += 7
+    postings = []
+    i = 0
+    while i < len(numbers):
+        df, has_positions = numbers[i], numbers[i + 1]
+        i += 2
+        if not has_positions:
+            end = i + 2 * df
+            docs = accumulate(numbers[i:end:2])
+            postings.extend(zip(docs, numbers[i + 1:end:2]))
+            i = end
+            continue
+        doc = 0
+        for _ in range(df):
+            doc += numbers[i]
+            count = numbers[i + 1]
+            postings.append((doc, count, list(accumulate(numbers[i + 2:i + 2 + count]))))
+            i += 2 + count
+    return postings
+
+
+def format_posting(posting):
+    #doc:count, or doc:count:p1 p2 ... for a positional index
+    if len(posting) == 3:
+        return f"{posting[0]}:{posting[1]}:{' '.join(map(str, posting[2]))}"
+    return f"{posting[0]}:{posting[1]}"
+
+
+def format_text_line(term, postings):
+    postings_str = ', '.join(map(format_posting, postings))
+    return f"{term}{TEXT_SEPARATOR}{postings_str}"
+
+
+def parse_text_line(line):
+    term, postings_str = line.rstrip('\n').split(TEXT_SEPARATOR, 1)
+    postings = []
+    for posting in postings_str.split(', '):
+        fields = posting.split(':')
+        if len(fields) == 3:
+            postings.append((fields[0], int(fields[1]), [int(p) for p in fields[2].split()]))
+        else:
+            postings.append((fields[0], int(fields[1])))
+    return term, postings
+
+
+def format_binary_line(term, postings):
+    #line-safe record emitted by the MR jobs; pack_index() turns these into the binary index
+    return f"{term}\t{base64.b64encode(encode_postings(postings)).decode('ascii')}"
+
+
+def parse_binary_line(line):
+    term, blob = line.rstrip('\n').split('\t', 1)
+    return term, base64.b64decode(blob)
+
+
+def sort_postings(count_dict, output_format, positions_dict=None):
+    #text output keeps the original string order of docIDs, binary output needs numeric order
+    if output_format == "binary":
+        docs = sorted(count_dict, key=int)
+        key = int
+    else:
+        docs = sorted(count_dict)
+        key = str
+    if positions_dict is not None:
+        return [(key(doc), count_dict[doc], sorted(positions_dict[doc])) for doc in docs]
+    return [(key(doc), count_dict[doc]) for doc in docs]
+
+
+def format_line(term, postings, output_format):
+    if output_format == "binary":
+        return format_binary_line(term, postings)
+    return format_text_line(term, postings)
+
+
+def merge_sorted_postings(values, numeric, with_positions):
+    #values arrive sorted by docID (secondary sort); adjacent repeats of a docID are combined
+    #numeric docIDs (binary output, dense IDs) are compared and written as integers
+    key = int if numeric else str
+    previous = None
+    for value in values:
+        doc = key(value[0])
+        if previous is not None and doc == previous[0]:
+            previous[1] += value[1]
+            if with_positions:
+                previous[2].extend(value[2])
+            continue
+        if previous is not None:
+            if doc < previous[0]:
+                raise ValueError(f"docID {doc} arrived after {previous[0]}; streamed numeric output "
+                                 "needs docIDs whose string order is their numeric order")
+            yield tuple(previous[:2]) + ((sorted(previous[2]),) if with_positions else ())
+        previous = [doc, value[1], list(value[2])] if with_positions else [doc, value[1]]
+    if previous is not None:
+        yield tuple(previous[:2]) + ((sorted(previous[2]),) if with_positions else ())
+
+
+def format_blocks(term, postings, output_format, block_size):
+    #yields (line, postings in it) for every block_size postings, so a term never has to fit in memory
+    block = []
+    for posting in postings:
+        block.append(posting)
+        if len(block) >= block_size:
+            yield format_line(term, block, output_format), len(block)
+            block = []
+    if block:
+        yield format_line(term, block, output_format), len(block)
+
+
+def load_text_index(path):
+    #term -> unparsed postings strings; a streamed term spans several lines
+    index = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                term, postings_str = line.rstrip('\n').split(TEXT_SEPARATOR, 1)
+                index.setdefault(term, []).append(postings_str)
+    return index
+
+
+def parse_postings(postings_strs):
+    return parse_text_line(TEXT_SEPARATOR + ', '.join(postings_strs))[1]
+
+
+def pack_index(lines, prefix):
+    #writes <prefix>.postings (concatenated blobs) and <prefix>.terms (term, offset, length, df)
+    #the input lines are the job output of --output-format=binary, in any order; the
+    #consecutive block lines of a streamed term are stored back to back as one entry
+    entries = []
+    offset = 0
+    with open(prefix + POSTINGS_EXT, "wb") as postings_file:
+        for line in lines:
+            if not line.strip():
+                continue
+            term, blob = parse_binary_line(line)
+            (df,), _ = vbyte_decode(blob, 0, 1)
+            postings_file.write(blob)
+            if entries and entries[-1][0] == term:
+                _, start, length, previous_df = entries[-1]
+                entries[-1] = (term, start, length + len(blob), previous_df + df)
+            else:
+                entries.append((term, offset, len(blob), df))
+            offset += len(blob)
+    entries.sort()
+    with open(prefix + TERMS_EXT, "w") as terms_file:
+        for term, start, length, df in entries:
+            terms_file.write(f"{term}\t{start}\t{length}\t{df}\n")
+    return len(entries)
+
+
+class PostingsReader:
+    #random access to a packed index: only the requested term's bytes are read and decoded
+
+    def __init__(self, prefix):
+        self.terms = {}
+        with open(prefix + TERMS_EXT) as terms_file:
+            for line in terms_file:
+                term, start, length, df = line.rstrip('\n').split('\t')
+                self.terms[term] = (int(start), int(length), int(df))
+        self.postings_file = open(prefix + POSTINGS_EXT, "rb")
+
+    def __contains__(self, term):
+        return term in self.terms
+
+    def __len__(self):
+        return len(self.terms)
+
+    def df(self, term):
+        entry = self.terms.get(term)
+        return entry[2] if entry else 0
+
+    def postings(self, term):
+        entry = self.terms.get(term)
+        if entry is None:
+            return []
+        start, length, _ = entry
+        self.postings_file.seek(start)
+        return decode_postings(self.postings_file.read(length))
+
+    def close(self):
+        self.postings_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def index_size(prefix):
+    return os.path.getsize(prefix + POSTINGS_EXT) + os.path.getsize(prefix + TERMS_EXT)
+
+
+if __name__ == '__main__':
+    #usage: python postings_codec.py pack <job output files...> <prefix>
+    #       python postings_codec.py lookup <prefix> <term>
+    if len(sys.argv) >= 4 and sys.argv[1] == "pack":
+        def read_lines(paths):
+            for path in paths:
+                with open(path) as f:
+                    yield from f
+        n = pack_index(read_lines(sys.argv[2:-1]), sys.argv[-1])
+        print(f"Packed {n} terms into {sys.argv[-1]}{POSTINGS_EXT} ({index_size(sys.argv[-1])} bytes)")
+    elif len(sys.argv) == 4 and sys.argv[1] == "lookup":
+        with PostingsReader(sys.argv[2]) as reader:
+            print(format_text_line(sys.argv[3], reader.postings(sys.argv[3])))
+    else:
+        sys.exit("usage: postings_codec.py pack <files...> <prefix> | lookup <prefix> <term>")
@@ -0,0 +1,204 @@
+import heapq
+import math
+import os
+import sys
+from bisect import bisect_left
+from collections import Counter
+from analysis import DEFAULT_ANALYZER, pop_analyzer_args
+from docid_map import DocIdMap
+from postings_codec import DOC_LENGTHS_TERM, TERMS_EXT, PostingsReader, load_text_index, parse_postings
+
+#usage: python ranked_query.py <unigram index> [--tfidf] [--exhaustive] [-k 10] [--docid-map FILE] "query one" ...
+#the index is the output of `unigram_index.py --doc-lengths` (text) or a prefix packed by postings_codec.py;
+#--docid-map translates dense docIDs back to the original ones, and the analysis options
+#(--stopwords, --stemmer, ...) must be the ones the index was built with
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+DEFAULT_K = 10
+
+
+class TermPostings:
+    #one query term's postings as parallel arrays over dense document numbers
+
+    def __init__(self, docs, tfs, idf, upper_bound):
+        self.docs = docs
+        self.tfs = tfs
+        self.idf = idf
+        self.upper_bound = upper_bound
+
+
+class RankedIndex:
+
+    def __init__(self, lookup, doc_lengths, scoring="bm25", analyzer=DEFAULT_ANALYZER):
+        #lookup(term) -> [(docID, count, ...)]; doc_lengths: {docID: number of tokens}
+        if scoring not in ("bm25", "tfidf"):
+            raise ValueError(f"unknown scoring {scoring!r}")
+        self.lookup = lookup
+        self.scoring = scoring
+        self.analyzer = analyzer
+        self.doc_ids = sorted(doc_lengths)
+        self.doc_numbers = {doc: n for n, doc in enumerate(self.doc_ids)}
+        self.doc_lengths = [doc_lengths[doc] for doc in self.doc_ids]
+        self.n_docs = len(self.doc_ids)
+        self.avg_length = sum(self.doc_lengths) / self.n_docs if self.n_docs else 0.0
+        #BM25 length normalisation, precomputed per document
+        self.length_norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length) if self.avg_length else BM25_K1
+                             for length in self.doc_lengths]
+        self.cache = {}
+        self.postings_scored = 0
+
+    @classmethod
+    def from_file(cls, path, scoring="bm25", analyzer=DEFAULT_ANALYZER):
+        if os.path.exists(path + TERMS_EXT):
+            reader = PostingsReader(path)
+            lookup = reader.postings
+            terms = list(reader.terms)
+        else:
+            #keep the raw lines and only parse the terms a query touches
+            lines = load_text_index(path)
+            lookup = lambda term: parse_postings(lines[term]) if term in lines else []
+            terms = list(lines)
+
+        if DOC_LENGTHS_TERM in terms:
+            doc_lengths = {doc: length for doc, length, *_ in lookup(DOC_LENGTHS_TERM)}
+        else:
+            #index built without --doc-lengths: every token is in some posting, so sum the counts
+            doc_lengths = Counter()
+            for term in terms:
+                for doc, count, *_ in lookup(term):
+                    doc_lengths[doc] += count
+        return cls(lookup, doc_lengths, scoring, analyzer)
+
+    def term_score(self, tf, doc, idf):
+        if self.scoring == "bm25":
+            return idf * tf * (BM25_K1 + 1) / (tf + self.length_norms[doc])
+        return idf * (1 + math.log(tf))
+
+    def term_postings(self, term):
+        if term in self.cache:
+            return self.cache[term]
+        postings = sorted((self.doc_numbers[doc], count) for doc, count, *_ in self.lookup(term)
+                          if doc in self.doc_numbers)
+        if not postings:
+            self.cache[term] = None
+            return None
+        df = len(postings)
+        if self.scoring == "bm25":
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+        else:
+            idf = math.log(self.n_docs / df)
+        docs = [doc for doc, _ in postings]
+        tfs = [count for _, count in postings]
+        upper_bound = max(self.term_score(tf, doc, idf) for doc, tf in postings)
+        self.cache[term] = TermPostings(docs, tfs, idf, upper_bound)
+        return self.cache[term]
+
+    def query_terms(self, query):
+        #(postings, query term frequency) for the query terms present in the index
+        weights = Counter(self.analyzer(query))
+        terms = []
+        for term, qtf in sorted(weights.items()):
+            postings = self.term_postings(term)
+            if postings is not None:
+                terms.append((postings, qtf))
+        return terms
+
+    def results(self, heap):
+        #heap holds (score, -doc); ties go to the smaller document number
+        return [(self.doc_ids[-neg_doc], score) for score, neg_doc in sorted(heap, reverse=True)]
+
+    def search(self, query, k=DEFAULT_K, method="wand"):
+        if method == "wand":
+            return self.search_wand(query, k)
+        if method == "exhaustive":
+            return self.search_exhaustive(query, k)
+        raise ValueError(f"unknown method {method!r}")
+
+    def search_exhaustive(self, query, k=DEFAULT_K):
+        #term-at-a-time: score every posting of every query term
+        scores = {}
+        for postings, qtf in self.query_terms(query):
+            idf = postings.idf
+            for doc, tf in zip(postings.docs, postings.tfs):
+                scores[doc] = scores.get(doc, 0.0) + qtf * self.term_score(tf, doc, idf)
+            self.postings_scored += len(postings.docs)
+        heap = heapq.nlargest(k, ((score, -doc) for doc, score in scores.items()))
+        return self.results(heap)
+
+    def search_wand(self, query, k=DEFAULT_K):
+        #document-at-a-time WAND: a document is only scored when the upper bounds of the
+        #terms pointing at or before it could beat the current k-th best score
+        cursors = [[0, postings, qtf, qtf * postings.upper_bound, i]
+                   for i, (postings, qtf) in enumerate(self.query_terms(query))]
+        heap = []
+        threshold = -1.0
+
+        while cursors:
+            cursors.sort(key=lambda c: c[1].docs[c[0]])
+            #find the pivot: first cursor where the accumulated upper bound beats the threshold
+            bound = 0.0
+            pivot = None
+            for i, cursor in enumerate(cursors):
+                bound += cursor[3]
+                if bound > threshold:
+                    pivot = i
+                    break
+            if pivot is None:
+                break
+            pivot_doc = cursors[pivot][1].docs[cursors[pivot][0]]
+
+            if cursors[0][1].docs[cursors[0][0]] == pivot_doc:
+                #all cursors up to the pivot are on the pivot document: score it fully
+                contributions = []
+                for cursor in cursors:
+                    position, postings, qtf, _, term_number = cursor
+                    if postings.docs[position] != pivot_doc:
+                        break
+                    contributions.append((term_number, qtf * self.term_score(postings.tfs[position], pivot_doc, postings.idf)))
+                    self.postings_scored += 1
+                    cursor[0] += 1
+                #add in query term order so scores match search_exhaustive() bit for bit
+                score = 0.0
+                for _, contribution in sorted(contributions):
+                    score += contribution
+                entry = (score, -pivot_doc)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+                if len(heap) == k:
+                    threshold = heap[0][0]
+            else:
+                #skip the cursors before the pivot forward to the pivot document
+                for cursor in cursors[:pivot]:
+                    cursor[0] = bisect_left(cursor[1].docs, pivot_doc, cursor[0])
+            cursors = [c for c in cursors if c[0] < len(c[1].docs)]
+
+        return self.results(heap)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    k = DEFAULT_K
+    if "-k" in args:
+        i = args.index("-k")
+        k = int(args[i + 1])
+        del args[i:i + 2]
+    docids = None
+    if "--docid-map" in args:
+        i = args.index("--docid-map")
+        docids = DocIdMap(args[i + 1])
+        del args[i:i + 2]
+    analyzer = pop_analyzer_args(args)
+    scoring = "tfidf" if "--tfidf" in args else "bm25"
+    method = "exhaustive" if "--exhaustive" in args else "wand"
+    args = [a for a in args if a not in ("--tfidf", "--exhaustive")]
+    if not args:
+        sys.exit("usage: ranked_query.py <index> [--tfidf] [--exhaustive] [-k N] [--docid-map FILE] [analysis options] [query ...]")
+    index = RankedIndex.from_file(args[0], scoring, analyzer)
+    queries = args[1:] or [line.strip() for line in sys.stdin if line.strip()]
+    for query in queries:
+        print(query)
+        for rank, (doc, score) in enumerate(index.search(query, k, method), 1):
+            print(f"{rank}\t{docids.to_external(doc) if docids else doc}\t{score:.4f}")
@@ -0,0 +1,347 @@
+import argparse
+import heapq
+import json
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from analysis import DEFAULT_ANALYZER, STEMMERS, analyzer_from_options
+from docid_map import open_input
+from postings_codec import (DOC_LENGTHS_TERM, POSTINGS_EXT, TERMS_EXT, PostingsReader,
+                            format_binary_line, pack_index)
+from ranked_query import RankedIndex
+
+#incremental index: every batch of docID\tcontent lines becomes an immutable packed segment,
+#deletes and replaced documents go to a per-segment .del file, and a tiered merge policy
+#combines small segments into larger ones
+#
+#the manifest lists the segments and the .del file of each; a .del file is never changed but
+#written anew under the next generation, so a change is: new segment files, new .del files, then
+#the manifest in one os.replace. A crash before that leaves the previous index, plus files no
+#manifest names
+
+MANIFEST = "segments.json"
+#written by the HW2 crawler's DocumentShardPipeline next to its gzip shards of docID\tcontent lines
+CRAWL_MANIFEST = "manifest.json"
+DELETES_EXT = ".del"
+
+#merge MERGE_FACTOR segments of the same tier; tier = log_MERGE_FACTOR(live docs / MIN_TIER_DOCS)
+MERGE_FACTOR = 10
+MIN_TIER_DOCS = 100
+#rewrite a segment on its own once this fraction of its documents has been deleted
+MAX_DELETED_RATIO = 0.5
+
+
+def index_documents(lines, analyzer=DEFAULT_ANALYZER):
+    #in-process equivalent of `unigram_index.py --doc-lengths --output-format binary`, with the
+    #same analysis options
+    documents = {}
+    for line in lines:
+        if '\t' in line:
+            docID, content = line.strip().split('\t', 1)
+            #a document appearing twice in one batch keeps its last version
+            documents[int(docID)] = content
+    postings = defaultdict(list)
+    for docID in sorted(documents):
+        words = analyzer(documents[docID])
+        postings[DOC_LENGTHS_TERM].append((docID, len(words)))
+        for word, count in Counter(words).items():
+            postings[word].append((docID, count))
+    for word in sorted(postings):
+        yield format_binary_line(word, postings[word])
+
+
+class Segment:
+
+    def __init__(self, directory, name, deletes=None):
+        self.name = name
+        self.directory = directory
+        self.prefix = os.path.join(directory, name)
+        self.reader = PostingsReader(self.prefix)
+        self.doc_lengths = dict(self.reader.postings(DOC_LENGTHS_TERM))
+        #file name of the committed .del file, and whether deleted has changed since
+        self.deletes = deletes
+        self.changed = False
+        self.deleted = set()
+        if deletes is not None:
+            with open(os.path.join(directory, deletes)) as f:
+                self.deleted = {int(line) for line in f if line.strip()}
+
+    @property
+    def live_docs(self):
+        return len(self.doc_lengths) - len(self.deleted)
+
+    def is_live(self, docID):
+        return docID in self.doc_lengths and docID not in self.deleted
+
+    def delete(self, doc_ids):
+        #the postings stay untouched; the deletes are written by the index's next commit
+        doc_ids = [docID for docID in doc_ids if self.is_live(docID)]
+        if doc_ids:
+            self.deleted.update(doc_ids)
+            self.changed = True
+        return len(doc_ids)
+
+    def write_deletes(self, generation):
+        #returns the .del file it replaces
+        old, self.deletes = self.deletes, f"{self.name}_{generation:06d}{DELETES_EXT}"
+        with open(os.path.join(self.directory, self.deletes), "w") as f:
+            f.writelines(f"{docID}\n" for docID in sorted(self.deleted))
+            f.flush()
+            os.fsync(f.fileno())
+        self.changed = False
+        return old
+
+    def postings(self, term):
+        postings = self.reader.postings(term)
+        if self.deleted:
+            postings = [p for p in postings if p[0] not in self.deleted]
+        return postings
+
+    def files(self):
+        files = [self.prefix + ext for ext in (POSTINGS_EXT, TERMS_EXT)]
+        if self.deletes is not None:
+            files.append(os.path.join(self.directory, self.deletes))
+        return files
+
+    def close(self):
+        self.reader.close()
+
+
+class SegmentedIndex:
+
+    def __init__(self, directory, auto_merge=True, analyzer=DEFAULT_ANALYZER):
+        self.directory = directory
+        self.auto_merge = auto_merge
+        #documents added with add_documents; the index should always be opened with the same one
+        self.analyzer = analyzer
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        else:
+            manifest = {"generation": 0, "segments": []}
+        self.generation = manifest["generation"]
+        #crawl shards already added (crawl_id/shard name), so add_shards can be called again as the
+        #crawl goes on, and after a new crawl of the same directory
+        self.ingested = manifest.get("ingested", [])
+        deletes = manifest.get("deletes")
+        if deletes is None:
+            #written before .del files had generations: one seg_NNNNNN.del per segment
+            deletes = {name: name + DELETES_EXT for name in manifest["segments"]
+                       if os.path.exists(os.path.join(directory, name + DELETES_EXT))}
+        self.segments = [Segment(directory, name, deletes.get(name)) for name in manifest["segments"]]
+
+    def commit(self):
+        #the segments' changed deletes go to new .del files first, then the manifest naming them is
+        #replaced atomically, so a crash leaves the previous segments with their previous deletes
+        replaced = []
+        for segment in self.segments:
+            if segment.changed:
+                self.generation += 1
+                replaced.append(segment.write_deletes(self.generation))
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"generation": self.generation, "segments": [s.name for s in self.segments],
+                       "deletes": {s.name: s.deletes for s in self.segments if s.deletes is not None},
+                       "ingested": self.ingested}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        for deletes in replaced:
+            if deletes is not None:
+                os.remove(os.path.join(self.directory, deletes))
+
+    def new_segment_name(self):
+        self.generation += 1
+        return f"seg_{self.generation:06d}"
+
+    def write_segment(self, lines):
+        name = self.new_segment_name()
+        pack_index(lines, os.path.join(self.directory, name))
+        return Segment(self.directory, name)
+
+    def add(self, segment):
+        #documents in the new segment replace any older live version; the segment's files are
+        #already written, and the commit writes the older segments' deletes with the manifest
+        for older in self.segments:
+            older.delete(segment.doc_lengths)
+        self.segments.append(segment)
+        self.commit()
+        if self.auto_merge:
+            self.maybe_merge()
+        return segment
+
+    def add_documents(self, lines):
+        #cost is proportional to the batch: only the new lines are tokenized and written
+        return self.add(self.write_segment(index_documents(lines, self.analyzer)))
+
+    def add_job_output(self, lines):
+        #output of `unigram_index.py --doc-lengths --output-format binary` for a large batch
+        return self.add(self.write_segment(lines))
+
+    def add_shards(self, shard_dir):
+        #one segment per completed crawl shard not added yet; returns the new segments and
+        #whether the crawl has finished (no more shards will be listed)
+        path = os.path.join(shard_dir, CRAWL_MANIFEST)
+        if not os.path.exists(path):
+            return [], False
+        with open(path) as f:
+            crawl = json.load(f)
+        added = []
+        for shard in crawl["shards"]:
+            shard_path = os.path.realpath(os.path.join(shard_dir, shard["name"]))
+            #a new crawl reuses the shard names; crawls before crawl_id are known by their paths
+            key = f"{crawl['crawl_id']}/{shard['name']}" if "crawl_id" in crawl else shard_path
+            if key in self.ingested:
+                continue
+            #recorded by the commit in add(); a shard added twice replaces its own documents, and a
+            #page crawled again keeps its docID, so its new version replaces the old one
+            self.ingested.append(key)
+            added.append(self.add_documents(read_lines([shard_path])))
+        return added, crawl["complete"]
+
+    def delete(self, doc_ids):
+        doc_ids = [int(docID) for docID in doc_ids]
+        deleted = sum(segment.delete(doc_ids) for segment in self.segments)
+        if deleted:
+            self.commit()
+        if self.auto_merge:
+            self.maybe_merge()
+        return deleted
+
+    def postings(self, term):
+        #live postings of every segment, in docID order
+        return list(heapq.merge(*(segment.postings(term) for segment in self.segments)))
+
+    def doc_lengths(self):
+        lengths = {}
+        for segment in self.segments:
+            for docID, length in segment.doc_lengths.items():
+                if docID not in segment.deleted:
+                    lengths[docID] = length
+        return lengths
+
+    def ranked_index(self, scoring="bm25"):
+        return RankedIndex(self.postings, self.doc_lengths(), scoring, self.analyzer)
+
+    def tier(self, segment):
+        return int(math.log(max(segment.live_docs, 1) / MIN_TIER_DOCS, MERGE_FACTOR)) if segment.live_docs > MIN_TIER_DOCS else 0
+
+    def merge_candidates(self):
+        #tiered policy: MERGE_FACTOR segments of one tier, or a single segment that is mostly deleted
+        tiers = defaultdict(list)
+        for segment in self.segments:
+            tiers[self.tier(segment)].append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= MERGE_FACTOR:
+                return tiers[tier][:MERGE_FACTOR]
+        for segment in self.segments:
+            if segment.deleted and len(segment.deleted) >= MAX_DELETED_RATIO * len(segment.doc_lengths):
+                return [segment]
+        return []
+
+    def maybe_merge(self):
+        merges = 0
+        candidates = self.merge_candidates()
+        while candidates:
+            self.merge(candidates)
+            merges += 1
+            candidates = self.merge_candidates()
+        return merges
+
+    def merge(self, segments=None):
+        #k-way merge of the sources' term tables; deleted documents are dropped for good
+        segments = list(segments if segments is not None else self.segments)
+        if not segments:
+            return None
+        terms = sorted(set().union(*(s.reader.terms for s in segments)))
+
+        def merged_lines():
+            for term in terms:
+                postings = list(heapq.merge(*(s.postings(term) for s in segments)))
+                if postings:
+                    yield format_binary_line(term, postings)
+
+        merged = self.write_segment(merged_lines())
+        position = self.segments.index(segments[0])
+        self.segments = [s for s in self.segments if s not in segments]
+        if merged.doc_lengths:
+            self.segments.insert(position, merged)
+        else:
+            segments.append(merged)
+            merged = None
+        self.commit()
+        for segment in segments:
+            segment.close()
+            for path in segment.files():
+                if os.path.exists(path):
+                    os.remove(path)
+        return merged
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+
+def read_lines(paths):
+    for path in paths:
+        with open_input(path) as f:
+            yield from f
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="incremental segmented unigram index")
+    parser.add_argument("directory")
+    parser.add_argument("--no-merge", action="store_true", help="do not run the merge policy after changes")
+    #the analysis options of unigram_index.py; give the same ones to every command on an index
+    parser.add_argument("--stopwords", action="store_true", help="drop the built-in English stopwords")
+    parser.add_argument("--stopword-file", help="drop the words of this file instead of the built-in stopwords")
+    parser.add_argument("--stemmer", choices=STEMMERS, default="none",
+                        help="s: remove plural endings, porter: Porter stemmer (needs nltk)")
+    parser.add_argument("--min-token-length", type=int, default=None, help="drop shorter tokens")
+    parser.add_argument("--max-token-length", type=int, default=None, help="drop longer tokens")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("add", help="index docID\\tcontent files as a new segment").add_argument("files", nargs="+")
+    commands.add_parser("add-job-output", help="add the output of unigram_index.py --doc-lengths --output-format binary").add_argument("files", nargs="+")
+    add_shards = commands.add_parser("add-shards", help="add the completed shards of a crawl (DOCUMENT_SHARDS_DIR)")
+    add_shards.add_argument("shard_dir")
+    add_shards.add_argument("--follow", action="store_true", help="keep adding shards until the crawl finishes")
+    add_shards.add_argument("--poll", type=float, default=5.0, help="seconds between manifest checks with --follow")
+    commands.add_parser("delete", help="delete documents by docID").add_argument("doc_ids", nargs="+")
+    commands.add_parser("merge", help="merge every segment into one")
+    commands.add_parser("search", help="BM25 top-10 across all segments").add_argument("queries", nargs="+")
+    commands.add_parser("info", help="list segments")
+    args = parser.parse_args()
+
+    index = SegmentedIndex(args.directory, auto_merge=not args.no_merge, analyzer=analyzer_from_options(args))
+    if args.command == "add":
+        segment = index.add_documents(read_lines(args.files))
+        print(f"Added {segment.name} with {len(segment.doc_lengths)} documents")
+    elif args.command == "add-job-output":
+        segment = index.add_job_output(read_lines(args.files))
+        print(f"Added {segment.name} with {len(segment.doc_lengths)} documents")
+    elif args.command == "add-shards":
+        while True:
+            added, complete = index.add_shards(args.shard_dir)
+            for segment in added:
+                print(f"Added {segment.name} with {len(segment.doc_lengths)} documents")
+            if complete or not args.follow:
+                break
+            time.sleep(args.poll)
+    elif args.command == "delete":
+        print(f"Deleted {index.delete(args.doc_ids)} documents")
+    elif args.command == "merge":
+        merged = index.merge()
+        print(f"Merged into {merged.name}" if merged else "Nothing to merge")
+    elif args.command == "search":
+        ranked = index.ranked_index()
+        for query in args.queries:
+            print(query)
+            for rank, (doc, score) in enumerate(ranked.search(query), 1):
+                print(f"{rank}\t{doc}\t{score:.4f}")
+    if args.command != "search":
+        for segment in index.segments:
+            print(f"{segment.name}\tdocs={len(segment.doc_lengths)}\tdeleted={len(segment.deleted)}\ttier={index.tier(segment)}")
+    index.close()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+#the HW3 modules import each other as top-level modules, as when run from HW3/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+from analysis import make_analyzer, tokenize
+from benchmark_analysis import baseline
+
+TEXTS = [
+    "Los Angeles Times: the LA Lakers won 102-99!",
+    "e-mail\taddresses\nand\r\nline breaks\x0b\x0c",
+    "café naïve ÉCOLE straße",
+    #the Kelvin sign and the dotted capital I lowercase into a-z
+    "Kelvin İstanbul",
+    "",
+    "   ",
+]
+
+
+def random_texts(n=500):
+    rng = random.Random(0)
+    alphabet = "abcXYZ 09-_.,\t\néKİ  "
+    return ["".join(rng.choices(alphabet, k=rng.randint(0, 40))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("text", TEXTS + random_texts())
+def test_default_analyzer_matches_regex_tokenization(text):
+    assert tokenize(text) == baseline(text)
+    assert make_analyzer()(text) == baseline(text)
@@ -0,0 +1,89 @@
+import gzip
+
+import pytest
+
+from docid_map import DocIdMap, build_docid_map
+from local_indexer import make_job
+from postings_codec import parse_text_line
+
+WORDS = ["los", "angeles", "times", "computer", "science", "lakers"]
+
+
+def write_docs(path, n):
+    #docIDs whose string order is not their input order, every word in several documents
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(f"doc{(i * 7) % n}-{i}\t{' '.join(WORDS[(i + j) % len(WORDS)] for j in range(4))}\n")
+
+
+def run(job_name, args):
+    job = make_job(job_name, ["--no-conf"] + args)
+    with job.make_runner() as runner:
+        runner.run()
+        return b"".join(runner.cat_output()).decode("utf_8").splitlines()
+
+
+def postings_by_term(lines):
+    #{term: [(docID, count), ...]} in output order, a term's block lines concatenated
+    index = {}
+    for line in lines:
+        term, postings = parse_text_line(line)
+        index.setdefault(term, []).extend(postings)
+    return index
+
+
+def test_build_docid_map(tmp_path):
+    first, second, path = tmp_path / "a.txt", tmp_path / "b.txt.gz", str(tmp_path / "map.txt")
+    first.write_text("x\tone\nno tab here\ny\ttwo\nx\tthree\n")
+    with gzip.open(second, "wt") as f:
+        f.write("z\tfour\ny\tfive\n")
+    assert build_docid_map([str(first), str(second)], path) == 3
+    docids = DocIdMap(path)
+    assert len(docids) == 3
+    assert [docids.to_dense(doc) for doc in ("x", "y", "z")] == [0, 1, 2]
+    assert docids.to_external("2") == "z"
+    assert docids.width == 1
+
+
+def test_docid_map_must_be_dense(tmp_path):
+    path = tmp_path / "map.txt"
+    path.write_text("0\ta\n2\tb\n")
+    with pytest.raises(ValueError):
+        DocIdMap(str(path))
+
+
+@pytest.mark.parametrize("n, width", [(1, 1), (10, 1), (11, 2), (100, 2), (101, 3)])
+def test_width_grows_past_a_power_of_ten(tmp_path, n, width):
+    docs, path = tmp_path / "docs.txt", str(tmp_path / "map.txt")
+    write_docs(docs, n)
+    build_docid_map([str(docs)], path)
+    assert DocIdMap(path).width == width
+
+
+@pytest.mark.parametrize("job_name, options", [
+    ("unigram", []),
+    ("unigram", ["--stream-postings", "--block-size", "3"]),
+    ("unigram", ["--job-mode", "single-pass"]),
+    ("bigram", ["--phrases", "PHRASES"]),
+    ("bigram", ["--phrases", "PHRASES", "--stream-postings"]),
+])
+@pytest.mark.parametrize("n", [9, 12, 105])
+def test_docid_map_postings_match_external_docids(tmp_path, job_name, options, n):
+    #12 and 105 documents cross a power of ten, so streamed postings only come out in dense
+    #order if the padded IDs sort as strings in numeric order
+    docs, map_path, phrases = tmp_path / "docs.txt", str(tmp_path / "map.txt"), tmp_path / "phrases.txt"
+    write_docs(docs, n)
+    phrases.write_text("los angeles\ncomputer science\nlakers los\n")
+    options = [str(phrases) if option == "PHRASES" else option for option in options]
+    build_docid_map([str(docs)], map_path)
+    docids = DocIdMap(map_path)
+
+    plain = postings_by_term(run(job_name, options + [str(docs)]))
+    dense = postings_by_term(run(job_name, options + ["--docid-map", map_path, str(docs)]))
+    assert plain
+    for postings in dense.values():
+        doc_ids = [int(doc) for doc, _ in postings]
+        assert doc_ids == sorted(doc_ids)
+    mapped = {term: [(docids.to_external(doc), count) for doc, count in postings] for term, postings in dense.items()}
+    assert {term: sorted(postings) for term, postings in mapped.items()} == \
+        {term: sorted(postings) for term, postings in plain.items()}
@@ -0,0 +1,42 @@
+import pytest
+
+from local_indexer import make_job
+
+#d1 comes back on a later line, so some of its (term, docID) counts are merged across lines
+DOCS = [
+    ("d1", "los angeles times and the los angeles lakers"),
+    ("d2", "computer science and information retrieval"),
+    ("d1", "los angeles again with computer science"),
+    ("d3", "bruce willis in los angeles"),
+]
+
+
+def run(job_name, job_args):
+    #(output, {counter: total over every step}) of the mrjob inline runner
+    job = make_job(job_name, ["--no-conf"] + job_args)
+    with job.make_runner() as runner:
+        runner.run()
+        output = b"".join(runner.cat_output()).decode("utf_8")
+        totals = {}
+        for step in runner.counters():
+            for name, value in step.get("shuffle", {}).items():
+                totals[name] = totals.get(name, 0) + value
+    return output, totals
+
+
+@pytest.mark.parametrize("job_name, options", [
+    ("unigram", []),
+    ("unigram", ["--doc-lengths"]),
+    ("unigram", ["--positions", "--stream-postings"]),
+    ("bigram", []),
+    ("bigram", ["--stream-postings"]),
+])
+def test_single_pass_matches_two_pass(tmp_path, job_name, options):
+    docs = tmp_path / "docs.txt"
+    docs.write_text("".join(f"{doc}\t{text}\n" for doc, text in DOCS))
+    two_pass, two_pass_counters = run(job_name, options + ["--job-mode", "two-pass", str(docs)])
+    single_pass, single_pass_counters = run(job_name, options + ["--job-mode", "single-pass", str(docs)])
+    assert single_pass == two_pass
+    #the estimate of what two-pass mode shuffles is exact even with a repeated docID
+    assert single_pass_counters["records shuffled by two-pass mode"] == two_pass_counters["records shuffled"]
+    assert single_pass_counters["records shuffled"] < two_pass_counters["records shuffled"]
@@ -0,0 +1,75 @@
+import gzip
+import io
+
+import pytest
+
+from benchmark_local_indexer import mrjob_output
+import local_indexer
+from local_indexer import build_index, plan_shards, read_shard
+
+DOCS = [
+    ("d1", "The Los Angeles Times covers Los Angeles and the los angeles times building"),
+    ("d2", "Information retrieval and computer science at the Los Angeles campus"),
+    ("d3", "Bruce Willis in Los Angeles; power politics in the Los Angeles Times"),
+    ("d4", "the the los the los angeles computer science information retrieval"),
+]
+PHRASES = ["los angeles", "los angeles times", "the", "the los", "computer science", "bruce willis"]
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    docs = tmp_path / "docs.txt"
+    docs.write_text("".join(f"{doc}\t{text}\n" for doc, text in DOCS))
+    phrases = tmp_path / "phrases.txt"
+    phrases.write_text("\n".join(PHRASES) + "\n")
+    return str(docs), str(phrases)
+
+
+@pytest.mark.parametrize("job, options", [
+    ("unigram", []),
+    ("unigram", ["--stream-postings"]),
+    ("bigram", []),
+    ("bigram", ["--phrases", "PHRASES"]),
+    ("bigram", ["--phrases", "PHRASES", "--stream-postings"]),
+])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_local_indexer_matches_mrjob(inputs, job, options, workers):
+    docs, phrases = inputs
+    job_args = [phrases if option == "PHRASES" else option for option in options] + [docs]
+    expected = mrjob_output(job, job_args)
+    #a run per document, so the merge has to interleave runs
+    out = io.StringIO()
+    build_index(job, job_args, [docs], out, workers, run_size=1)
+    assert out.getvalue() == expected
+
+
+def test_shards_split_lines_once(inputs):
+    docs, _ = inputs
+    with open(docs, "rb") as f:
+        lines = f.readlines()
+    #every shard size puts boundaries inside lines, right after newlines and at line starts
+    for min_shard_bytes in range(1, sum(map(len, lines)) + 1):
+        shards = plan_shards([docs], 1, min_shard_bytes)
+        assert [start for _, start, _ in shards[1:]] == [end for _, _, end in shards[:-1]]
+        assert [line for shard in shards for line in read_shard(*shard)] == lines
+
+
+@pytest.mark.parametrize("job, options", [("unigram", []), ("bigram", ["--phrases", "PHRASES"])])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_local_indexer_matches_mrjob_with_many_shards(inputs, tmp_path, monkeypatch, job, options, workers):
+    docs, phrases = inputs
+    #the documents again under other docIDs, gzipped: one shard however small they are
+    with open(docs) as f:
+        lines = f.readlines()
+    more = tmp_path / "more.txt.gz"
+    with gzip.open(more, "wt") as f:
+        f.write("".join(f"x{line}" for line in lines))
+    job_args = [phrases if option == "PHRASES" else option for option in options] + [docs, str(more)]
+    #shards of 10 bytes, most of them starting inside a line
+    monkeypatch.setattr(local_indexer, "SHARDS_PER_WORKER", 1000)
+    shards = plan_shards([docs, str(more)], workers, 10)
+    assert len(shards) == -(-sum(map(len, lines)) // 10) + 1
+    expected = mrjob_output(job, job_args)
+    out = io.StringIO()
+    build_index(job, job_args, [docs, str(more)], out, workers, run_size=5, min_shard_bytes=10)
+    assert out.getvalue() == expected
@@ -0,0 +1,27 @@
+import random
+
+from analysis import tokenize
+from benchmark_phrase_matcher import make_phrases, naive_matches
+from phrase_matcher import PhraseMatcher
+
+WORDS = "the los angeles times lakers new york city of computer science a b".split()
+
+
+def test_matcher_finds_what_the_ngram_lookup_finds():
+    rng = random.Random(0)
+    documents = [rng.choices(WORDS, k=rng.randint(0, 30)) for _ in range(300)]
+    #overlapping phrases and phrases inside longer ones
+    extra = ["los angeles", "los angeles times", "angeles times", "new york", "new york city",
+             "york city of", "a a", "a a a"]
+    for size in (5, 50):
+        matcher = PhraseMatcher(make_phrases(documents, size) + extra)
+        phrases = set(matcher.phrases)
+        lengths = sorted({phrase.count(" ") + 1 for phrase in phrases}, reverse=True)
+        for words in documents:
+            assert list(matcher.matches(words)) == list(naive_matches(words, phrases, lengths))
+
+
+def test_match_text_analyzes_the_text():
+    matcher = PhraseMatcher(["Los Angeles", "angeles TIMES"])
+    text = "The Los-Angeles Times"
+    assert list(matcher.match_text(text)) == list(matcher.matches(tokenize(text)))
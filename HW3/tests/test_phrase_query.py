@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from analysis import DEFAULT_ANALYZER
+from local_indexer import make_job
+from phrase_query import PositionalIndex, positions_overhead
+from postings_codec import pack_index, parse_text_line
+
+WORDS = ["los", "angeles", "times", "lakers", "computer", "science", "the"]
+
+
+def documents():
+    rng = random.Random(0)
+    #numeric docIDs, which the binary format needs
+    docs = {str(doc): " ".join(rng.choices(WORDS, k=rng.randint(1, 30))) for doc in range(150)}
+    #repeated terms, overlapping matches and a phrase right at the end of a document
+    docs.update({"900": "los los los angeles", "901": "Computer Science at the LA Times: computer science",
+                 "902": "the lakers beat the los angeles"})
+    return docs
+
+
+def run(args):
+    job = make_job("unigram", ["--no-conf"] + args)
+    with job.make_runner() as runner:
+        runner.run()
+        return b"".join(runner.cat_output())
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("positional")
+    docs = directory / "docs.txt"
+    docs.write_text("".join(f"{doc}\t{text}\n" for doc, text in documents().items()))
+    (directory / "index.txt").write_bytes(run(["--positions", str(docs)]))
+    (directory / "plain.txt").write_bytes(run([str(docs)]))
+    binary = run(["--positions", "--output-format", "binary", str(docs)]).decode("utf_8").splitlines()
+    pack_index(binary, str(directory / "packed"))
+    return directory
+
+
+def brute_force(phrase):
+    #occurrences of the phrase in each document's token list, overlapping ones included
+    terms = DEFAULT_ANALYZER(phrase)
+    results = []
+    for doc, text in documents().items():
+        tokens = DEFAULT_ANALYZER(text)
+        count = sum(tokens[i:i + len(terms)] == terms for i in range(len(tokens) - len(terms) + 1))
+        if terms and count:
+            results.append((doc, count))
+    return sorted(results)
+
+
+def phrases():
+    rng = random.Random(1)
+    generated = [" ".join(rng.choices(WORDS, k=rng.randint(1, 4))) for _ in range(60)]
+    return generated + ["los los", "los los los", "computer science", "the los angeles", "times computer science",
+                        "lakers unknown", "unknown", "", "LOS Angeles!"]
+
+
+def test_positions_output_matches_token_positions(built):
+    docs = documents()
+    seen = set()
+    for line in (built / "index.txt").read_text().splitlines():
+        term, postings = parse_text_line(line)
+        for doc, count, positions in postings:
+            tokens = DEFAULT_ANALYZER(docs[doc])
+            assert positions == [i for i, token in enumerate(tokens) if token == term]
+            assert count == len(positions)
+            seen.add((term, doc))
+    assert seen == {(token, doc) for doc, text in docs.items() for token in DEFAULT_ANALYZER(text)}
+
+
+@pytest.mark.parametrize("index_name", ["index.txt", "packed"])
+def test_phrase_matches_brute_force(built, index_name):
+    index = PositionalIndex(str(built / index_name))
+    #the text index keeps docIDs as strings, the packed one as integers
+    doc_type = str if index_name == "index.txt" else int
+    for phrase in phrases():
+        assert index.phrase(phrase) == sorted((doc_type(doc), count) for doc, count in brute_force(phrase)), phrase
+    assert (doc_type("900"), 1) in index.phrase("los los los")
+    assert (doc_type("900"), 2) in index.phrase("los los")
+    assert (doc_type("901"), 2) in index.phrase("computer science")
+    assert (doc_type("902"), 1) in index.phrase("los angeles")
+    assert index.phrase("lakers unknown") == []
+
+
+def test_index_without_positions_is_rejected(built):
+    with pytest.raises(ValueError):
+        PositionalIndex(str(built / "plain.txt")).phrase("los angeles")
+
+
+def test_positions_overhead(built):
+    with_positions, without_positions = positions_overhead(str(built / "index.txt"))
+    assert with_positions == (built / "index.txt").stat().st_size
+    #stripping the positions gives the output of the job without --positions
+    assert without_positions == (built / "plain.txt").stat().st_size
+    assert with_positions > without_positions
@@ -0,0 +1,59 @@
+import pytest
+
+from local_indexer import make_job
+from postings_codec import (PostingsReader, decode_postings, encode_postings, load_text_index, pack_index,
+                            parse_postings, vbyte_decode, vbyte_encode)
+
+#single-digit docIDs, whose string order is their numeric order as streamed binary output needs
+DOCS = [
+    ("1", "los angeles times and the los angeles lakers"),
+    ("2", "computer science and information retrieval"),
+    ("3", "los angeles again with computer science"),
+    ("5", "bruce willis in los angeles"),
+    ("8", "the the the times"),
+]
+
+
+def run(job_name, job_args):
+    job = make_job(job_name, ["--no-conf"] + job_args)
+    with job.make_runner() as runner:
+        runner.run()
+        return b"".join(runner.cat_output()).decode("utf_8")
+
+
+def test_vbyte_round_trip():
+    numbers = [0, 1, 127, 128, 255, 16383, 16384, 2 ** 32, 2 ** 63]
+    assert vbyte_decode(vbyte_encode(numbers)) == (numbers, len(vbyte_encode(numbers)))
+    with pytest.raises(ValueError):
+        vbyte_encode([-1])
+
+
+@pytest.mark.parametrize("postings", [
+    [],
+    [(0, 1), (3, 2), (300, 1)],
+    [(2, 3, [0, 5, 400]), (1000, 1, [7])],
+])
+def test_postings_round_trip(postings):
+    assert decode_postings(encode_postings(postings)) == postings
+
+
+@pytest.mark.parametrize("job_name, options", [
+    ("unigram", []),
+    ("unigram", ["--positions", "--doc-lengths"]),
+    ("unigram", ["--stream-postings", "--block-size", "2"]),
+    ("bigram", []),
+])
+def test_packed_index_matches_text_index(tmp_path, job_name, options):
+    docs = tmp_path / "docs.txt"
+    docs.write_text("".join(f"{doc}\t{text}\n" for doc, text in DOCS))
+    text = tmp_path / "index.txt"
+    text.write_text(run(job_name, options + [str(docs)]))
+    binary = run(job_name, options + ["--output-format", "binary", str(docs)])
+    prefix = str(tmp_path / "index")
+    text_index = load_text_index(str(text))
+    assert pack_index(binary.splitlines(), prefix) == len(text_index)
+    with PostingsReader(prefix) as reader:
+        for term, postings_strs in text_index.items():
+            expected = sorted((int(doc), *rest) for doc, *rest in parse_postings(postings_strs))
+            assert reader.postings(term) == expected
+            assert reader.df(term) == len(expected)
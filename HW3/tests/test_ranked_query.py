@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from local_indexer import make_job
+from ranked_query import RankedIndex
+
+#skewed word frequencies, so that WAND has common terms to skip and many tied scores to break
+WORDS = ["los", "angeles", "times", "computer", "science", "information", "retrieval", "bruce",
+         "willis", "lakers", "music", "history", "weather", "recipe", "football", "movie"]
+
+
+@pytest.fixture(scope="module")
+def index_path(tmp_path_factory):
+    rng = random.Random(0)
+    docs = tmp_path_factory.mktemp("ranking") / "docs.txt"
+    with open(docs, "w") as f:
+        for doc in range(300):
+            words = rng.choices(WORDS, weights=range(len(WORDS), 0, -1), k=rng.randint(1, 40))
+            f.write(f"d{doc}\t{' '.join(words)}\n")
+    job = make_job("unigram", ["--no-conf", "--doc-lengths", str(docs)])
+    path = docs.with_name("index.txt")
+    with job.make_runner() as runner:
+        runner.run()
+        path.write_bytes(b"".join(runner.cat_output()))
+    return str(path)
+
+
+def queries():
+    rng = random.Random(1)
+    queries = [" ".join(rng.choices(WORDS, k=rng.randint(1, 4))) for _ in range(100)]
+    #repeated terms, and terms the index does not have
+    return queries + ["los los angeles", "science fiction", "unknown words only", ""]
+
+
+@pytest.mark.parametrize("scoring", ["bm25", "tfidf"])
+@pytest.mark.parametrize("k", [1, 3, 10])
+def test_wand_matches_exhaustive(index_path, scoring, k):
+    index = RankedIndex.from_file(index_path, scoring)
+    for query in queries():
+        assert index.search(query, k, "wand") == index.search(query, k, "exhaustive"), query
+
+
+def test_wand_scores_fewer_postings(index_path):
+    index = RankedIndex.from_file(index_path)
+    scored = {}
+    for method in ("exhaustive", "wand"):
+        index.postings_scored = 0
+        for query in queries():
+            index.search(query, 3, method)
+        scored[method] = index.postings_scored
+    assert scored["wand"] < scored["exhaustive"]
@@ -0,0 +1,196 @@
+import os
+import random
+import sys
+
+import pytest
+
+import segments
+from analysis import make_analyzer
+from local_indexer import make_job
+from segments import SegmentedIndex
+
+#the crawler's shard writer, whose output add_shards reads
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                "HW2", "scrapy_crawler"))
+from scrapy_crawler.documents import ShardWriter  # noqa: E402
+
+
+def crawl(directory, pages):
+    writer = ShardWriter(directory, max_bytes=40)
+    doc_ids = {url: writer.write(url, text) for url, text in pages}
+    writer.close()
+    return doc_ids
+
+
+def docs_with(index, term):
+    return {docID for docID, _ in index.postings(term)}
+
+
+def test_two_crawls_ingested_in_a_row(tmp_path):
+    shards, index_dir = str(tmp_path / "shards"), str(tmp_path / "index")
+    first = crawl(shards, [("http://a/", "apple banana"), ("http://b/", "cherry old"), ("http://c/", "banana")])
+    index = SegmentedIndex(index_dir, auto_merge=False)
+    added, complete = index.add_shards(shards)
+    assert added and complete
+
+    #a new crawl of the same directory restarts the shard names
+    second = crawl(shards, [("http://d/", "durian"), ("http://b/", "cherry new")])
+    assert second["http://b/"] == first["http://b/"]
+    assert second["http://d/"] not in first.values()
+    added, _ = index.add_shards(shards)
+    assert added
+    assert docs_with(index, "durian") == {second["http://d/"]}
+    #the page crawled again replaces its old version; the others stay
+    assert docs_with(index, "old") == set()
+    assert docs_with(index, "new") == {first["http://b/"]}
+    assert docs_with(index, "banana") == {first["http://a/"], first["http://c/"]}
+    assert index.add_shards(shards)[0] == []
+    index.close()
+
+    #the ingested shards are remembered across reopening the index
+    index = SegmentedIndex(index_dir, auto_merge=False)
+    assert index.add_shards(shards)[0] == []
+    assert docs_with(index, "durian") == {second["http://d/"]}
+    index.close()
+
+
+def batch(docs):
+    return [f"{docID}\t{text}\n" for docID, text in docs]
+
+
+def test_merge_candidates_take_merge_factor_segments_of_a_tier(tmp_path):
+    index = SegmentedIndex(str(tmp_path), auto_merge=False)
+    for docID in range(segments.MERGE_FACTOR - 1):
+        index.add_documents(batch([(docID, "small segment")]))
+    assert index.merge_candidates() == []
+    #a segment of the next tier does not count towards the small ones
+    index.add_documents(batch([(1000 + docID, "large segment") for docID in range(segments.MIN_TIER_DOCS * segments.MERGE_FACTOR)]))
+    assert index.tier(index.segments[-1]) == 1
+    assert index.merge_candidates() == []
+    index.add_documents(batch([(500, "small segment")]))
+    candidates = index.merge_candidates()
+    assert len(candidates) == segments.MERGE_FACTOR
+    assert all(index.tier(segment) == 0 for segment in candidates)
+    assert index.maybe_merge() == 1
+    assert len(index.segments) == 2
+    assert len(docs_with(index, "small")) == segments.MERGE_FACTOR
+    index.close()
+
+
+def test_mostly_deleted_segment_is_expunged(tmp_path):
+    index = SegmentedIndex(str(tmp_path))
+    index.add_documents(batch([(1, "apple"), (2, "apple banana"), (3, "banana"), (4, "cherry")]))
+    index.add_documents(batch([(5, "durian")]))
+    old_name = index.segments[0].name
+    assert index.delete([1]) == 1
+    assert index.segments[0].name == old_name
+    #half of its documents deleted: rewritten without them
+    assert index.delete([2, 7]) == 1
+    assert old_name not in [segment.name for segment in index.segments]
+    assert not any(segment.deleted for segment in index.segments)
+    assert docs_with(index, "apple") == set()
+    assert docs_with(index, "banana") == {3}
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(old_name)]
+    index.close()
+
+
+def test_replaced_document_across_segments(tmp_path):
+    index = SegmentedIndex(str(tmp_path), auto_merge=False)
+    index.add_documents(batch([(1, "apple apple"), (2, "banana")]))
+    index.add_documents(batch([(3, "cherry")]))
+    index.add_documents(batch([(1, "banana cherry durian")]))
+    assert docs_with(index, "apple") == set()
+    assert docs_with(index, "banana") == {1, 2}
+    assert index.postings("cherry") == [(1, 1), (3, 1)]
+    assert index.doc_lengths() == {1: 3, 2: 1, 3: 1}
+    index.close()
+    #the deletes are committed with the manifest
+    index = SegmentedIndex(str(tmp_path), auto_merge=False)
+    assert docs_with(index, "apple") == set()
+    assert index.doc_lengths() == {1: 3, 2: 1, 3: 1}
+    index.close()
+
+
+def test_delete_and_search_after_merge(tmp_path):
+    index = SegmentedIndex(str(tmp_path), auto_merge=False)
+    index.add_documents(batch([(1, "los angeles times"), (2, "los angeles lakers")]))
+    index.add_documents(batch([(3, "lakers win again"), (4, "angeles weather")]))
+    merged = index.merge()
+    assert index.segments == [merged]
+    assert index.delete([3]) == 1
+    results = [doc for doc, _ in index.ranked_index().search("lakers")]
+    assert results == [2]
+    index.close()
+    index = SegmentedIndex(str(tmp_path), auto_merge=False)
+    assert [doc for doc, _ in index.ranked_index().search("lakers")] == [2]
+    assert docs_with(index, "angeles") == {1, 2, 4}
+    index.close()
+
+
+def test_crash_before_the_manifest_leaves_the_previous_index(tmp_path, monkeypatch):
+    index = SegmentedIndex(str(tmp_path), auto_merge=False)
+    index.add_documents(batch([(1, "old version"), (2, "other")]))
+
+    def crash(src, dst):
+        raise OSError("crashed")
+    monkeypatch.setattr(segments.os, "replace", crash)
+    with pytest.raises(OSError):
+        index.add_documents(batch([(1, "new version")]))
+    monkeypatch.undo()
+    index.close()
+    index = SegmentedIndex(str(tmp_path), auto_merge=False)
+    assert len(index.segments) == 1
+    assert docs_with(index, "old") == {1}
+    assert docs_with(index, "new") == set()
+    index.close()
+
+
+def test_segments_match_a_from_scratch_build(tmp_path, monkeypatch):
+    #small tiers so that the random batches go through several merges and expunges
+    monkeypatch.setattr(segments, "MERGE_FACTOR", 3)
+    monkeypatch.setattr(segments, "MIN_TIER_DOCS", 5)
+    rng = random.Random(0)
+    words = ["los", "angeles", "times", "lakers", "computer", "science", "music", "weather"]
+    index = SegmentedIndex(str(tmp_path / "segments"))
+    documents = {}
+    for _ in range(40):
+        docs = [(rng.randrange(120), " ".join(rng.choices(words, k=rng.randint(1, 8)))) for _ in range(rng.randint(1, 6))]
+        index.add_documents(batch(docs))
+        documents.update(docs)
+        if rng.random() < 0.3:
+            deleted = rng.sample(sorted(documents), 3)
+            index.delete(deleted)
+            for docID in deleted:
+                del documents[docID]
+    assert len(index.segments) < 40
+
+    docs_path = tmp_path / "docs.txt"
+    docs_path.write_text("".join(batch(sorted(documents.items()))))
+    job = make_job("unigram", ["--no-conf", "--doc-lengths", "--output-format", "binary", str(docs_path)])
+    with job.make_runner() as runner:
+        runner.run()
+        output = b"".join(runner.cat_output()).decode("utf_8").splitlines()
+    scratch = SegmentedIndex(str(tmp_path / "scratch"), auto_merge=False)
+    scratch.add_job_output(output)
+
+    terms = set().union(*(segment.reader.terms for segment in index.segments + scratch.segments))
+    assert terms > set(words)
+    for term in terms:
+        assert index.postings(term) == scratch.postings(term), term
+    assert index.doc_lengths() == scratch.doc_lengths()
+    index.close()
+    index = SegmentedIndex(str(tmp_path / "segments"))
+    assert all(index.postings(term) == scratch.postings(term) for term in terms)
+    index.close()
+    scratch.close()
+
+
+def test_documents_go_through_the_index_analyzer(tmp_path):
+    analyzer = make_analyzer(stopwords=True, stemmer="s")
+    index = SegmentedIndex(str(tmp_path), auto_merge=False, analyzer=analyzer)
+    index.add_documents(batch([(1, "the lakers and the times"), (2, "a laker")]))
+    assert docs_with(index, "the") == set()
+    assert docs_with(index, "laker") == {1, 2}
+    assert index.doc_lengths() == {1: 2, 2: 1}
+    assert sorted(doc for doc, _ in index.ranked_index().search("Lakers")) == [1, 2]
+    index.close()
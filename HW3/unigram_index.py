@@ -1,39 +1,173 @@
 from mrjob.job import MRJob
 from mrjob.step import MRStep
 from mrjob.protocol import RawValueProtocol
-import re
-from collections import defaultdict
+import resource
+from collections import Counter, defaultdict
+from analysis import add_analyzer_args, analyzer_from_options
+from docid_map import DocIdMap
+from postings_codec import DOC_LENGTHS_TERM, sort_postings, format_line, merge_sorted_postings, format_blocks
 
 class MRUnigramIndex(MRJob):
     OUTPUT_PROTOCOL = RawValueProtocol
+    FILES = ['analysis.py', 'postings_codec.py', 'docid_map.py']
+
+    def configure_args(self):
+        super(MRUnigramIndex, self).configure_args()
+        self.add_passthru_arg('--output-format', choices=['text', 'binary'], default='text',
+                              help='text: "word -> doc:count, ..." lines, binary: vbyte postings for postings_codec.py pack')
+        self.add_passthru_arg('--job-mode', choices=['two-pass', 'single-pass'], default='two-pass',
+                              help='single-pass counts words per document in the mapper and skips the counting step')
+        self.add_passthru_arg('--positions', action='store_true',
+                              help='record token positions per document for phrase_query.py')
+        self.add_passthru_arg('--doc-lengths', action='store_true',
+                              help=f'also output a {DOC_LENGTHS_TERM} line of doc:length postings for ranked_query.py')
+        self.add_file_arg('--docid-map',
+                          help='dense docID map from docid_map.py; postings use the integer IDs')
+        self.add_passthru_arg('--stream-postings', action='store_true',
+                              help='secondary sort on docID and write postings in blocks instead of buffering each word')
+        self.add_passthru_arg('--block-size', type=int, default=10000,
+                              help='postings per output line with --stream-postings')
+        self.add_passthru_arg('--report-rss', type=int, default=None, metavar='MIN_POSTINGS',
+                              help='report the reducer peak RSS as a job counter for each word with at least MIN_POSTINGS postings')
+        add_analyzer_args(self)
+
+    def sort_values(self):
+        #with --stream-postings the values of every key reach the reducer sorted by docID
+        return self.options.stream_postings
 
     def steps(self):
+        output_reducer = self.reducer_output_streaming if self.options.stream_postings else self.reducer_output
+        if self.options.job_mode == 'single-pass':
+            return [
+                MRStep(mapper_init=self.init_mapper, mapper=self.mapper_combined,
+                       mapper_final=self.report_shuffle_counters, reducer_init=self.init_shuffle_counters,
+                       reducer=output_reducer, reducer_final=self.report_shuffle_counters)
+            ]
         return [
-            MRStep(mapper=self.mapper, reducer=self.reducer_counts),
-            MRStep(reducer=self.reducer_output)
+            MRStep(mapper_init=self.init_mapper, mapper=self.mapper,
+                   mapper_final=self.report_shuffle_counters, reducer_init=self.init_shuffle_counters,
+                   reducer=self.reducer_counts, reducer_final=self.report_shuffle_counters),
+            MRStep(reducer=output_reducer)
         ]
 
+    def init_mapper(self):
+        self.init_shuffle_counters()
+        self.docids = DocIdMap(self.options.docid_map) if self.options.docid_map else None
+        self.analyzer = analyzer_from_options(self.options)
+
+    def mapper_docID(self, docID):
+        #dense integer ID; zero-padded when the secondary sort compares values as strings
+        if self.docids is None:
+            return docID
+        dense = self.docids.to_dense(docID)
+        return f"{dense:0{self.docids.width}d}" if self.options.stream_postings else dense
+
+    def init_shuffle_counters(self):
+        #shuffled records are tallied locally and reported once per task
+        self.shuffled = 0
+        self.shuffled_two_pass = 0
+
+    def report_shuffle_counters(self):
+        self.increment_counter('shuffle', 'records shuffled', self.shuffled)
+        self.increment_counter('shuffle', 'records shuffled by two-pass mode', self.shuffled_two_pass)
+
     def mapper(self, _, line):
         #clean data and split words
         if '\t' in line:
             docID, content = line.strip().split('\t', 1)
-            content = re.sub(r'[^a-z\s]', ' ', content.lower())
-            words = content.split()
-            for word in words:
-                yield (word, docID), 1
+            docID = self.mapper_docID(docID)
+            words = self.analyzer(content)
+            self.shuffled += len(words)
+            self.shuffled_two_pass += len(words)
+            if self.options.doc_lengths:
+                self.shuffled += 1
+                self.shuffled_two_pass += 1
+                yield (DOC_LENGTHS_TERM, docID), len(words)
+            if self.options.positions:
+                for position, word in enumerate(words):
+                    yield (word, docID), position
+            else:
+                for word in words:
+                    yield (word, docID), 1
+
+    def mapper_combined(self, _, line):
+        #each line is a whole document, so term frequencies can be summed before the shuffle
+        if '\t' in line:
+            docID, content = line.strip().split('\t', 1)
+            docID = self.mapper_docID(docID)
+            words = self.analyzer(content)
+            if self.options.doc_lengths:
+                self.shuffled += 1
+                self.shuffled_two_pass += 1
+                yield DOC_LENGTHS_TERM, (docID, len(words))
+            #two-pass mode shuffles every token, then every distinct (word, docID) count; a docID can
+            #come back on another line, so the output reducer counts those (count_two_pass_postings)
+            if self.options.positions:
+                positions = defaultdict(list)
+                for position, word in enumerate(words):
+                    positions[word].append(position)
+                self.shuffled += len(positions)
+                self.shuffled_two_pass += len(words)
+                for word, word_positions in positions.items():
+                    yield word, (docID, len(word_positions), word_positions)
+            else:
+                counts = Counter(words)
+                self.shuffled += len(counts)
+                self.shuffled_two_pass += len(words)
+                for word, count in counts.items():
+                    yield word, (docID, count)
 
     def reducer_counts(self, key, values):
         word, docID = key
-        yield word, (docID, sum(values))
+        #every (word, docID) count is shuffled again into the output step
+        self.shuffled += 1
+        self.shuffled_two_pass += 1
+        if self.options.positions and word != DOC_LENGTHS_TERM:
+            positions = sorted(values)
+            yield word, (docID, len(positions), positions)
+        else:
+            yield word, (docID, sum(values))
 
     def reducer_output(self, word, doc_counts):
         #sort the doc ids and output to file
         count_dict = defaultdict(int)
-        for docID, count in doc_counts:
-            count_dict[docID] += count
-        
-        sorted_postings = sorted(count_dict.items())
-        postings_str = ', '.join(f"{doc}:{count}" for doc, count in sorted_postings)
-        yield None, f"{word} -> {postings_str}"
-
-MRUnigramIndex.run()
+        positions_dict = defaultdict(list) if self.options.positions and word != DOC_LENGTHS_TERM else None
+        for posting in doc_counts:
+            docID = posting[0]
+            count_dict[docID] += posting[1]
+            if positions_dict is not None:
+                positions_dict[docID].extend(posting[2])
+
+        sorted_postings = sort_postings(count_dict, self.options.output_format, positions_dict)
+        yield None, format_line(word, sorted_postings, self.options.output_format)
+        self.count_two_pass_postings(len(sorted_postings))
+        self.report_rss(word, len(sorted_postings))
+
+    def numeric_docIDs(self):
+        return self.options.output_format == 'binary' or bool(self.options.docid_map)
+
+    def reducer_output_streaming(self, word, doc_counts):
+        #postings arrive in docID order, so each block is written as soon as it is full
+        with_positions = self.options.positions and word != DOC_LENGTHS_TERM
+        postings = merge_sorted_postings(doc_counts, self.numeric_docIDs(), with_positions)
+        written = 0
+        for line, block_postings in format_blocks(word, postings, self.options.output_format, self.options.block_size):
+            written += block_postings
+            yield None, line
+        self.count_two_pass_postings(written)
+        self.report_rss(word, written)
+
+    def count_two_pass_postings(self, postings):
+        #in single-pass mode, the (word, docID) counts two-pass mode would have shuffled into this
+        #step: one per posting, docIDs repeated across lines merged
+        if self.options.job_mode == 'single-pass':
+            self.shuffled_two_pass += postings
+
+    def report_rss(self, word, postings):
+        #ru_maxrss is the peak of the whole reducer process so far (KB on Linux, bytes on macOS)
+        if self.options.report_rss is not None and postings >= self.options.report_rss:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.increment_counter('peak reducer RSS after term', f"{word} ({postings} postings)", peak)
+
+if __name__ == '__main__':
+    MRUnigramIndex.run()